@@ -4,10 +4,17 @@ import logging
 import os
 import typing
 
-from PySide6.QtWidgets import QApplication, QWidget, QPushButton, QMenu, QLabel
-from PySide6.QtGui import (QPixmap, QPainter, QColor, QMouseEvent, 
-                           QBitmap, QTransform, QIcon, QPaintEvent, QKeyEvent, QFont)
-from PySide6.QtCore import Qt, QPoint, QRect, QSize, QTimer
+from PySide6.QtWidgets import QApplication, QWidget, QPushButton, QMenu, QTextEdit, QFrame
+from PySide6.QtGui import (QPixmap, QPainter, QColor, QMouseEvent, QImage, QTextCursor,
+                           QPaintEvent, QFont, QPixmapCache)
+from PySide6.QtCore import Qt, QPoint, QRect, QSize, QTimer, QObject, QRunnable, QThreadPool, Signal
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None # Mirroring falls back to QImage.mirrored
+    NUMPY_AVAILABLE = False
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -15,6 +22,61 @@ logging.basicConfig(
 )
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PIXMAP_CACHE_LIMIT_KB = 64 * 1024 # Avatar/display PNGs are large; keep every variant decoded in memory
+DIRECTION_SWITCH_HYSTERESIS_PX = 30 # Window center must be this far past the screen midline to flip while dragging
+DIRECTION_SWITCH_DEBOUNCE_MS = 50   # ...and the pointer must have stayed there this long
+TYPEWRITER_MAX_CHARS_PER_TICK = 12  # Typewriter emits up to the next whitespace per tick, capped for long tokens
+
+# Config keys read by the avatar window (with defaults). Snapshotted once into plain dicts at window init.
+AVATAR_CONFIG_KEYS: typing.Dict[str, typing.Any] = {
+    "avatar_initial_direction": "left",
+    "avatar_skin": "sherlox",
+    "display_element_type": "blackboard_green",
+}
+# Per-direction display profile keys, read as f"display_{type}_{state}_{direction}_{key}".
+DISPLAY_PROFILE_KEYS: typing.Dict[str, typing.Any] = {
+    "offset_x": 0, "offset_y": 0, "z_order": -1, "can_mirror": True,
+    "text_rect_x": 10, "text_rect_y": 10, "text_rect_width": 140, "text_rect_height": 70,
+}
+
+def _pixmap_cache_key(abs_path: str) -> typing.Optional[str]:
+    # Key by path + mtime so an edited asset on disk is picked up again. The single stat doubles as existence check.
+    try: return f"{abs_path}:{os.path.getmtime(abs_path)}"
+    except OSError: return None
+
+_DISPLAY_FONT: typing.Optional[QFont] = None
+
+def _get_display_font() -> QFont:
+    """Returns the shared display font; built on first use (needs a QApplication) to skip repeated font-DB lookups."""
+    global _DISPLAY_FONT
+    if _DISPLAY_FONT is None:
+        _DISPLAY_FONT = QFont("Segoe Print", 13) # EXAMPLE FONT - ADJUST
+    return _DISPLAY_FONT
+
+def fast_hmirror(img: QImage) -> QImage:
+    """Horizontally mirrors an image. With NumPy this is a vectorized per-row reversal of 32-bit pixels."""
+    if not NUMPY_AVAILABLE or img.isNull():
+        return img.mirrored(True, False)
+    img = img.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied) # Guarantees 4 bytes per pixel
+    w, h, bpl = img.width(), img.height(), img.bytesPerLine()
+    rows = np.frombuffer(img.constBits(), dtype=np.uint32, count=h * bpl // 4).reshape(h, bpl // 4)
+    flipped = np.ascontiguousarray(rows[:, :w][:, ::-1])
+    # .copy() detaches the QImage from the NumPy buffer, which is freed when this function returns.
+    return QImage(flipped.data, w, h, w * 4, QImage.Format.Format_ARGB32_Premultiplied).copy()
+
+class _ImageLoadSignals(QObject):
+    loaded = Signal(str, QImage) # (cache_key, decoded image; null QImage on failure)
+
+class _ImageLoadTask(QRunnable):
+    """Decodes an image file into a QImage on a QThreadPool worker. QPixmaps may only be created on the GUI thread."""
+    def __init__(self, abs_path: str, cache_key: str, signals: _ImageLoadSignals):
+        super().__init__()
+        self.abs_path = abs_path
+        self.cache_key = cache_key
+        self.signals = signals
+
+    def run(self):
+        self.signals.loaded.emit(self.cache_key, QImage(self.abs_path))
 
 class AvatarComponent:
     def __init__(self, component_name: str, image_folder_path: str,
@@ -26,46 +88,82 @@ class AvatarComponent:
         self.base_offset_y = offset_y
         self.z_order = z_order
         self.can_be_mirrored = can_be_mirrored
-        self.current_pixmap: QPixmap = QPixmap(1, 1) 
+        self._paths: typing.Dict[str, str] = { # file name -> absolute path, for every name update_visuals may probe
+            name: os.path.join(image_folder_path, name)
+            for name in (f"{component_name}_left.png", f"{component_name}_right.png", f"{component_name}.png")
+        }
+        self.current_pixmap = QPixmap(1, 1) 
         self.current_pixmap.fill(Qt.GlobalColor.transparent)
         self.current_draw_offset_x = offset_x
         self.current_draw_offset_y = offset_y
         self.loaded_image_was_mirrored = False
-
-    def _load_pixmap_from_file(self, file_name: str) -> QPixmap:
-        abs_path = os.path.join(self.image_folder_path, file_name)
-        if not os.path.exists(abs_path):
-            # logging.warning(f"AVATAR_COMP: Image file not found at: {abs_path}")
-            return QPixmap()
-        pixmap = QPixmap(abs_path)
-        if pixmap.isNull():
-            logging.error(f"AVATAR_COMP: Failed to load QPixmap from: {abs_path}")
+        # (direction, can_be_mirrored) -> (pixmap, was_mirrored, loaded_ok); filled by preload_all_directions
+        self._direction_pixmaps: typing.Dict[typing.Tuple[str, bool], typing.Tuple[QPixmap, bool, bool]] = {}
+        # (direction, can_be_mirrored, base offsets, base width) -> (pixmap, was_mirrored, draw_off_x, draw_off_y)
+        self._visual_cache: typing.Dict[tuple, typing.Tuple[QPixmap, bool, int, int]] = {}
+
+    def _load_pixmap_from_file(self, file_name: str, mirrored: bool = False) -> QPixmap:
+        abs_path = self._paths.get(file_name) or os.path.join(self.image_folder_path, file_name)
+        cache_key = _pixmap_cache_key(abs_path)
+        if cache_key is None: # File does not exist
             return QPixmap()
+        if mirrored: cache_key += ":mirrored"
+        cached = QPixmapCache.find(cache_key)
+        if cached is not None and not cached.isNull():
+            return cached
+        if mirrored:
+            pixmap = self._load_pixmap_from_file(file_name)
+            if pixmap.isNull(): return pixmap
+            # A horizontal flip is an exact per-row pixel reversal; no need for a smooth (filtered) transform.
+            pixmap = QPixmap.fromImage(fast_hmirror(pixmap.toImage()))
+        else:
+            pixmap = QPixmap(abs_path)
+            if pixmap.isNull():
+                logging.error(f"AVATAR_COMP: Failed to load QPixmap from: {abs_path}")
+                return QPixmap()
+        QPixmapCache.insert(cache_key, pixmap)
         return pixmap
 
-    def update_visuals(self, avatar_facing_direction: str, base_avatar_unmirrored_width: int):
-        loaded_successfully = False
-        self.loaded_image_was_mirrored = False
-        specific_image_name = f"{self.component_name}_{avatar_facing_direction}.png"
-        temp_pixmap = self._load_pixmap_from_file(specific_image_name)
+    def candidate_file_paths(self) -> typing.List[str]:
+        """Absolute paths of all existing image files update_visuals may load for either direction."""
+        return [p for p in self._paths.values() if os.path.exists(p)]
 
-        if not temp_pixmap.isNull() and temp_pixmap.width() > 1:
-            logging.debug(f"AVATAR_COMP [{self.component_name}]: Loaded specific '{specific_image_name}'.")
-            loaded_successfully = True
-        else:
-            base_image_name = f"{self.component_name}.png"
-            temp_pixmap = self._load_pixmap_from_file(base_image_name)
+    def _resolve_pixmap(self, avatar_facing_direction: str) -> typing.Tuple[QPixmap, bool, bool]:
+        """Picks the image for a direction: specific '_<dir>' file first, then the (possibly mirrored) base file."""
+        candidates = ( # (file name, mirror it?) in priority order
+            (f"{self.component_name}_{avatar_facing_direction}.png", False),
+            (f"{self.component_name}.png", avatar_facing_direction == "right" and self.can_be_mirrored),
+        )
+        for file_name, mirror in candidates:
+            temp_pixmap = self._load_pixmap_from_file(file_name, mirrored=mirror)
             if not temp_pixmap.isNull() and temp_pixmap.width() > 1:
-                logging.debug(f"AVATAR_COMP [{self.component_name}]: Loaded base '{base_image_name}'.")
-                if avatar_facing_direction == "right" and self.can_be_mirrored:
-                    temp_pixmap = temp_pixmap.transformed(QTransform().scale(-1, 1), Qt.TransformationMode.SmoothTransformation)
-                    self.loaded_image_was_mirrored = True
-                    logging.debug(f"AVATAR_COMP [{self.component_name}]: Mirrored base for 'right'.")
-                loaded_successfully = True
-            else:
-                logging.warning(f"AVATAR_COMP [{self.component_name}]: Could not load '{specific_image_name}' or '{base_image_name}'.")
-                temp_pixmap = QPixmap(1,1); temp_pixmap.fill(Qt.GlobalColor.transparent)
-        self.current_pixmap = temp_pixmap
+                logging.debug(f"AVATAR_COMP [{self.component_name}]: Loaded '{file_name}'{' (mirrored)' if mirror else ''}.")
+                return temp_pixmap, mirror, True
+        logging.warning(f"AVATAR_COMP [{self.component_name}]: Could not load any of {[c[0] for c in candidates]}.")
+        temp_pixmap = QPixmap(1,1); temp_pixmap.fill(Qt.GlobalColor.transparent)
+        return temp_pixmap, False, False
+
+    def preload_all_directions(self):
+        """Resolves the pixmaps for both facing directions once, so direction switches never touch disk."""
+        for direction in ("left", "right"):
+            self._direction_pixmaps[(direction, self.can_be_mirrored)] = self._resolve_pixmap(direction)
+
+    def invalidate_visual_cache(self):
+        """Drops memoized pixmaps/offsets; call when the skin or asset folder changes."""
+        self._direction_pixmaps.clear(); self._visual_cache.clear()
+
+    def update_visuals(self, avatar_facing_direction: str, base_avatar_unmirrored_width: int):
+        visual_key = (avatar_facing_direction, self.can_be_mirrored, self.base_offset_x, self.base_offset_y, base_avatar_unmirrored_width)
+        cached_visual = self._visual_cache.get(visual_key)
+        if cached_visual is not None:
+            pixmap, self.loaded_image_was_mirrored, self.current_draw_offset_x, self.current_draw_offset_y = cached_visual
+            if pixmap is not self.current_pixmap: self.current_pixmap = pixmap
+            return
+
+        key = (avatar_facing_direction, self.can_be_mirrored)
+        if key not in self._direction_pixmaps:
+            self._direction_pixmaps[key] = self._resolve_pixmap(avatar_facing_direction)
+        self.current_pixmap, self.loaded_image_was_mirrored, loaded_successfully = self._direction_pixmaps[key]
         
         self.current_draw_offset_x = self.base_offset_x # This is the offset from config for current avatar direction
         self.current_draw_offset_y = self.base_offset_y
@@ -76,6 +174,8 @@ class AvatarComponent:
         if avatar_facing_direction == "right" and self.loaded_image_was_mirrored:
             component_width = self.get_dimensions().width()
             self.current_draw_offset_x = base_avatar_unmirrored_width - self.base_offset_x - component_width
+        self._visual_cache[visual_key] = (self.current_pixmap, self.loaded_image_was_mirrored,
+                                          self.current_draw_offset_x, self.current_draw_offset_y)
         
         logging.debug(f"AVATAR_COMP '{self.component_name}': Dir '{avatar_facing_direction}', "
                       f"LoadedOK: {loaded_successfully}, ImgMirrored: {self.loaded_image_was_mirrored}, "
@@ -85,41 +185,113 @@ class AvatarComponent:
 
     def get_current_pixmap(self) -> QPixmap: return self.current_pixmap
     def get_dimensions(self) -> QSize: return self.current_pixmap.size() if not self.current_pixmap.isNull() else QSize(0,0)
-    def get_mask(self) -> typing.Optional[QBitmap]:
-        return self.current_pixmap.mask() if not self.current_pixmap.isNull() and self.current_pixmap.hasAlphaChannel() else None
 
 class SherloxAvatarWindow(QWidget):
+    setup_finished = Signal() # Emitted once the async image loads are done and the window is laid out
+
     def __init__(self, engine_ref=None):
         super().__init__()
         self.engine = engine_ref
-        self.avatar_facing_direction = self.engine.get_config_value("avatar_initial_direction", "left") if self.engine else "left"
+        self.is_setup_finished = False
+        QPixmapCache.setCacheLimit(PIXMAP_CACHE_LIMIT_KB)
+        self._cfg: typing.Dict[str, typing.Any] = {}
+        self._display_profiles: typing.Dict[str, typing.Dict[str, typing.Any]] = {} # direction -> display offsets/z/mirror/text rect
+        self._snapshot_config()
+        self.avatar_facing_direction = self._cfg["avatar_initial_direction"]
         self.window_drag_offset = QPoint()
+        self._pending_direction: typing.Optional[str] = None
+        self._direction_switch_timer = QTimer(self)
+        self._direction_switch_timer.setSingleShot(True)
+        self._direction_switch_timer.setInterval(DIRECTION_SWITCH_DEBOUNCE_MS)
+        self._direction_switch_timer.timeout.connect(self._apply_pending_direction)
         self.components: typing.List[AvatarComponent] = []
         self.base_avatar_component: typing.Optional[AvatarComponent] = None
         self.display_component: typing.Optional[AvatarComponent] = None
         self.window_render_width, self.window_render_height = 0, 0
         self.window_content_offset_x, self.window_content_offset_y = 0, 0
-
-        self.display_text_label: typing.Optional[QLabel] = None
+        self.avatar_skin: str = "sherlox"
+        self._base_unmirrored_width_cache: typing.Dict[typing.Tuple[str, str], int] = {} # (skin, component) -> width
+        self._composite_cache: typing.Dict[str, QPixmap] = {} # direction -> all components pre-rendered into one pixmap
+        self._pending_image_loads: typing.Set[str] = set() # cache keys still being decoded in the thread pool
+        self._image_load_signals = _ImageLoadSignals(self)
+        self._image_load_signals.loaded.connect(self._on_async_image_loaded)
+
+        self.display_text_label: typing.Optional[QTextEdit] = None
+        # The text area lives in its own transparent top-level window so typewriter repaints never
+        # recomposite the avatar (and vice versa). It is kept glued to the avatar at this offset.
+        self.display_text_window: typing.Optional[QWidget] = None
+        self._text_window_offset = QPoint()
         self.typewriter_timer: typing.Optional[QTimer] = None
+        self.typewriter_cursor: typing.Optional[QTextCursor] = None
         self.full_text_to_type: str = ""
-        self.current_typed_text: str = ""
         self.typewriter_char_index: int = 0
         self.typewriter_speed: int = 50 
 
+        # Window flags are set once: calling setWindowFlags again (e.g. per direction switch) hides and re-creates the window.
+        self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+        self.setAttribute(Qt.WA_TranslucentBackground, True)
+        self._batching_visual_update = False # True while switch_avatar_direction applies several geometry changes
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+
+        # Decode all images off the GUI thread first; the window is finished once they have arrived.
         self._load_and_setup_components()
+        if not self._start_async_asset_loads():
+            self._finish_initial_setup()
+
+    def _start_async_asset_loads(self) -> bool:
+        """Queues QImage decodes for all uncached component images. Returns True if any load is pending."""
+        pool = QThreadPool.globalInstance()
+        for comp in self.components:
+            for abs_path in comp.candidate_file_paths():
+                cache_key = _pixmap_cache_key(abs_path)
+                if cache_key is None or cache_key in self._pending_image_loads or QPixmapCache.find(cache_key) is not None: continue
+                self._pending_image_loads.add(cache_key)
+                pool.start(_ImageLoadTask(abs_path, cache_key, self._image_load_signals))
+        logging.debug(f"AVATAR_UI: Queued {len(self._pending_image_loads)} async image loads.")
+        return bool(self._pending_image_loads)
+
+    def _on_async_image_loaded(self, cache_key: str, image: QImage):
+        # Runs on the GUI thread (queued connection), where QPixmap.fromImage is allowed and cheap.
+        if not image.isNull():
+            QPixmapCache.insert(cache_key, QPixmap.fromImage(image))
+        else:
+            logging.error(f"AVATAR_UI: Async image load failed for: {cache_key}")
+        self._pending_image_loads.discard(cache_key)
+        if not self._pending_image_loads:
+            self._finish_initial_setup()
+
+    def _finish_initial_setup(self):
+        for comp in self.components: comp.preload_all_directions()
+        self._apply_component_visuals()
         self._setup_display_text_label() 
         self._initialize_ui_properties()
-        
-        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.customContextMenuRequested.connect(self.show_context_menu)
+        # No window mask: WA_TranslucentBackground already lets the compositor use the pixmaps' alpha channel.
+        self.clearMask()
         self.show()
         logging.info(f"AVATAR_UI: SherloxAvatarWindow initialized, facing {self.avatar_facing_direction}.")
+        self.is_setup_finished = True
+        self.setup_finished.emit()
+
+    def _snapshot_config(self):
+        """Reads all config values the window needs once; call again if skin or display type change."""
+        cfg_val = self.engine.get_config_value if self.engine else lambda k,d=None: d
+        self._cfg = {key: cfg_val(key, default) for key, default in AVATAR_CONFIG_KEYS.items()}
+        display_type_id = self._cfg["display_element_type"]
+        display_state_name = "min"
+        # Profiles for where the display (and its text area) sits relative to the avatar, one per facing direction
+        self._display_profiles = {}
+        for offset_profile_key_suffix in ("left", "right"):
+            offset_prefix = f"display_{display_type_id}_{display_state_name}_{offset_profile_key_suffix}"
+            self._display_profiles[offset_profile_key_suffix] = {
+                key: cfg_val(f"{offset_prefix}_{key}", default) for key, default in DISPLAY_PROFILE_KEYS.items()
+            }
 
     def _load_and_setup_components(self):
+        """Creates the components once; per-direction display settings are kept in profiles applied on switch."""
         self.components.clear()
-        cfg_val = self.engine.get_config_value if self.engine else lambda k,d=None: d
-        avatar_skin = cfg_val("avatar_skin", "sherlox")
+        avatar_skin = self._cfg["avatar_skin"]
+        self.avatar_skin = avatar_skin
         avatar_state = "idle"
         base_avatar_folder = os.path.join(BASE_DIR, "data", "avatar", avatar_skin)
         self.base_avatar_component = AvatarComponent(
@@ -128,77 +300,81 @@ class SherloxAvatarWindow(QWidget):
         )
         self.components.append(self.base_avatar_component)
 
-        display_type_id = cfg_val("display_element_type", "blackboard_green")
+        display_type_id = self._cfg["display_element_type"]
         display_state_name = "min"
         display_folder = os.path.join(BASE_DIR, "data", "display", display_type_id)
-        
-        # Get the offset profile key based on where the display should be relative to the avatar
-        offset_profile_key_suffix = "left" if self.avatar_facing_direction == "left" else "right"
-        offset_prefix = f"display_{display_type_id}_{display_state_name}_{offset_profile_key_suffix}"
-        
-        display_offset_x = cfg_val(f"{offset_prefix}_offset_x", 0)
-        display_offset_y = cfg_val(f"{offset_prefix}_offset_y", 0)
-        display_z_order  = cfg_val(f"{offset_prefix}_z_order", -1)
-        display_can_mirror = cfg_val(f"{offset_prefix}_can_mirror", True)
         # component_name for display is its state, e.g., "min". AvatarComponent handles _left/_right or mirroring.
         
         self.display_component = AvatarComponent(
             component_name=display_state_name, 
-            image_folder_path=display_folder,
-            offset_x=display_offset_x, 
-            offset_y=display_offset_y,
-            z_order=display_z_order,
-            can_be_mirrored=display_can_mirror
+            image_folder_path=display_folder
         )
         self.components.append(self.display_component)
+        self._apply_display_profile()
+
+    def _apply_display_profile(self):
+        """Applies the display offsets/z-order/mirroring configured for the current facing direction."""
+        if not self.display_component: return
+        profile = self._display_profiles.get(self.avatar_facing_direction, DISPLAY_PROFILE_KEYS)
+        self.display_component.base_offset_x = profile["offset_x"]
+        self.display_component.base_offset_y = profile["offset_y"]
+        self.display_component.z_order = profile["z_order"]
+        self.display_component.can_be_mirrored = profile["can_mirror"]
         self.components.sort(key=lambda c: c.z_order)
+
+    def _apply_component_visuals(self):
         self.update_component_visuals()
 
         if self.base_avatar_component and (self.base_avatar_component.get_current_pixmap().isNull() or self.base_avatar_component.get_current_pixmap().width() <=1):
-            logging.critical(f"AVATAR_UI: Base avatar '{avatar_skin}/{avatar_state}' NOT LOADED properly.")
+            logging.critical(f"AVATAR_UI: Base avatar '{self.avatar_skin}/{self.base_avatar_component.component_name}' NOT LOADED properly.")
             fb_pixmap = QPixmap(150,200); fb_pixmap.fill(QColor("darkred"))
             p = QPainter(fb_pixmap); p.setPen(Qt.GlobalColor.white); p.drawText(fb_pixmap.rect(), Qt.AlignmentFlag.AlignCenter, "AVATAR\nERROR!"); p.end()
             self.base_avatar_component.current_pixmap = fb_pixmap
         if self.display_component and (self.display_component.get_current_pixmap().isNull() or self.display_component.get_current_pixmap().width() <= 1):
-            logging.warning(f"AVATAR_UI: Display '{display_type_id}/{display_state_name}' (profile: {offset_profile_key_suffix}) not loaded properly.")
+            logging.warning(f"AVATAR_UI: Display '{self.display_component.image_folder_path}/{self.display_component.component_name}' (profile: {self.avatar_facing_direction}) not loaded properly.")
 
     def _setup_display_text_label(self):
         if not self.display_component or self.display_component.get_current_pixmap().isNull():
             logging.warning("AVATAR_UI: Cannot setup display text label, display_component (tafel) not loaded or invalid.")
-            if self.display_text_label: self.display_text_label.hide()
+            if self.display_text_window: self.display_text_window.hide()
             return
 
         if not self.display_text_label:
-            self.display_text_label = QLabel(self) 
+            self.display_text_window = QWidget(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+            self.display_text_window.setAttribute(Qt.WA_TranslucentBackground)
+            self.display_text_window.setAttribute(Qt.WA_TransparentForMouseEvents)
+            self.display_text_window.setAttribute(Qt.WA_ShowWithoutActivating)
+            # A read-only QTextEdit instead of a QLabel: the typewriter appends via a QTextCursor,
+            # which only relayouts the last block instead of the whole (growing) text on every tick.
+            self.display_text_label = QTextEdit(self.display_text_window) 
+            self.display_text_label.setReadOnly(True)
+            self.display_text_label.setFrameStyle(QFrame.Shape.NoFrame)
+            self.display_text_label.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+            self.display_text_label.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+            self.display_text_label.setTextInteractionFlags(Qt.NoTextInteraction)
+            self.display_text_label.setAttribute(Qt.WA_TransparentForMouseEvents) # Let drags reach the avatar window
             self.display_text_label.setAttribute(Qt.WA_TranslucentBackground)
-            self.display_text_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
-            self.display_text_label.setWordWrap(True)
-            font = QFont("Segoe Print", 13) # EXAMPLE FONT - ADJUST
-            self.display_text_label.setFont(font)
-            self.display_text_label.setStyleSheet("color: white; background-color: transparent; padding: 2px;")
+            self.display_text_label.viewport().setAutoFillBackground(False)
+            self.display_text_label.setFont(_get_display_font())
+            self.display_text_label.setStyleSheet("color: white; background-color: transparent; border: none; padding: 2px;")
             logging.debug("AVATAR_UI: Display text label created.")
         
         self._update_display_text_label_geometry()
-        self.display_text_label.setText("Willkommen bei LM Buddy!\n\nIch bin Sherlox und helfe dir gerne bei allen Fragen und Themen.") # Initial text
+        self.display_text_label.setPlainText("Willkommen bei LM Buddy!\n\nIch bin Sherlox und helfe dir gerne bei allen Fragen und Themen.") # Initial text
         self.display_text_label.show()
 
     def _update_display_text_label_geometry(self):
-        if not self.display_text_label or not self.display_component or \
+        if not self.display_text_label or not self.display_text_window or not self.display_component or \
            self.display_component.get_current_pixmap().isNull() or \
            self.display_component.get_current_pixmap().width() <= 1:
-            if self.display_text_label: self.display_text_label.hide()
+            if self.display_text_window: self.display_text_window.hide()
             return
 
-        cfg_val = self.engine.get_config_value if self.engine else lambda k,d=None: d
-        display_type_id = cfg_val("display_element_type", "blackboard_green")
-        display_state_name = "min"
-        offset_profile_key_suffix = "left" if self.avatar_facing_direction == "left" else "right"
-        text_rect_prefix = f"display_{display_type_id}_{display_state_name}_{offset_profile_key_suffix}"
-
-        text_rect_x_rel = cfg_val(f"{text_rect_prefix}_text_rect_x", 10)
-        text_rect_y_rel = cfg_val(f"{text_rect_prefix}_text_rect_y", 10)
-        text_rect_width = cfg_val(f"{text_rect_prefix}_text_rect_width", 140)
-        text_rect_height = cfg_val(f"{text_rect_prefix}_text_rect_height", 70)
+        profile = self._display_profiles.get(self.avatar_facing_direction, DISPLAY_PROFILE_KEYS)
+        text_rect_x_rel = profile["text_rect_x"]
+        text_rect_y_rel = profile["text_rect_y"]
+        text_rect_width = profile["text_rect_width"]
+        text_rect_height = profile["text_rect_height"]
 
         tafel_abs_x = self.window_content_offset_x + self.display_component.current_draw_offset_x
         tafel_abs_y = self.window_content_offset_y + self.display_component.current_draw_offset_y
@@ -208,18 +384,44 @@ class SherloxAvatarWindow(QWidget):
         label_width = max(10, int(text_rect_width))
         label_height = max(10, int(text_rect_height))
             
-        self.display_text_label.setGeometry(int(label_abs_x), int(label_abs_y), label_width, label_height)
-        self.display_text_label.show()
-        self.display_text_label.raise_()
+        self._text_window_offset = QPoint(int(label_abs_x), int(label_abs_y))
+        self.display_text_label.setGeometry(0, 0, label_width, label_height)
+        self.display_text_window.setGeometry(QRect(self.mapToGlobal(self._text_window_offset), QSize(label_width, label_height)))
+        if self.isVisible() and not self._batching_visual_update:
+            self.display_text_window.show()
+            self.display_text_window.raise_()
         logging.debug(f"AVATAR_UI: TextLabel Geom: X={label_abs_x},Y={label_abs_y},W={label_width},H={label_height}")
 
+    def _sync_text_window_position(self):
+        if self.display_text_window:
+            self.display_text_window.move(self.mapToGlobal(self._text_window_offset))
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        self._sync_text_window_position()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.display_text_window and self.display_text_label:
+            self._sync_text_window_position(); self.display_text_window.show(); self.display_text_window.raise_()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if self.display_text_window: self.display_text_window.hide()
+
     def update_component_visuals(self):
         base_avatar_unmirrored_width = 0
         if self.base_avatar_component:
-            temp_base_pm = self.base_avatar_component._load_pixmap_from_file(f"{self.base_avatar_component.component_name}.png")
-            if temp_base_pm.isNull() or temp_base_pm.width() <=1:
-                 temp_base_pm = self.base_avatar_component._load_pixmap_from_file(f"{self.base_avatar_component.component_name}_left.png")
-            if not temp_base_pm.isNull(): base_avatar_unmirrored_width = temp_base_pm.width()
+            width_key = (self.avatar_skin, self.base_avatar_component.component_name)
+            if width_key in self._base_unmirrored_width_cache:
+                base_avatar_unmirrored_width = self._base_unmirrored_width_cache[width_key]
+            else:
+                temp_base_pm = self.base_avatar_component._load_pixmap_from_file(f"{self.base_avatar_component.component_name}.png")
+                if temp_base_pm.isNull() or temp_base_pm.width() <=1:
+                     temp_base_pm = self.base_avatar_component._load_pixmap_from_file(f"{self.base_avatar_component.component_name}_left.png")
+                if not temp_base_pm.isNull():
+                    base_avatar_unmirrored_width = temp_base_pm.width()
+                    self._base_unmirrored_width_cache[width_key] = base_avatar_unmirrored_width
         for comp in self.components:
             comp.update_visuals(self.avatar_facing_direction, base_avatar_unmirrored_width)
 
@@ -244,30 +446,21 @@ class SherloxAvatarWindow(QWidget):
         logging.debug(f"AVATAR_UI: WinSize: {self.width()}x{self.height()}, ContentOffset: ({self.window_content_offset_x},{self.window_content_offset_y})")
 
     def _initialize_ui_properties(self):
-        self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
-        self.setAttribute(Qt.WA_TranslucentBackground, True)
         self._calculate_bounding_box_and_set_size()
         if self.display_text_label: self._update_display_text_label_geometry() # Update label after size calc
             
-        if self.base_avatar_component:
-            base_mask_bitmap = self.base_avatar_component.get_mask()
-            if base_mask_bitmap:
-                final_mask = QBitmap(self.size()); final_mask.fill(Qt.transparent)
-                p = QPainter(final_mask)
-                base_final_draw_x = self.window_content_offset_x + self.base_avatar_component.current_draw_offset_x
-                base_final_draw_y = self.window_content_offset_y + self.base_avatar_component.current_draw_offset_y
-                p.drawPixmap(QPoint(int(base_final_draw_x), int(base_final_draw_y)), base_mask_bitmap)
-                p.end(); self.setMask(final_mask)
-            else: self.clearMask()
-        else: self.clearMask()
+        if self.avatar_facing_direction not in self._composite_cache:
+            self._composite_cache[self.avatar_facing_direction] = self._render_composite_pixmap()
         if QApplication.instance():
             screen = QApplication.instance().primaryScreen().availableGeometry()
             x_pos = screen.width()-self.width()-20 if self.avatar_facing_direction=="left" else 20
             y_pos = screen.height()-self.height()-50 
             self.move(x_pos,y_pos)
 
-    def paintEvent(self, event: QPaintEvent):
-        painter = QPainter(self); painter.setRenderHint(QPainter.Antialiasing)
+    def _render_composite_pixmap(self) -> QPixmap:
+        """Draws all components once into a window-sized pixmap so paintEvent only needs a single blit."""
+        composite = QPixmap(self.size()); composite.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(composite) # Integer-offset pixmap blits gain nothing from render hints
         for component in self.components:
             pixmap = component.get_current_pixmap()
             if pixmap.isNull() or pixmap.width() <= 1: continue
@@ -275,7 +468,15 @@ class SherloxAvatarWindow(QWidget):
             final_y = self.window_content_offset_y + component.current_draw_offset_y
             painter.drawPixmap(QPoint(int(final_x), int(final_y)), pixmap)
         painter.end()
-        # QLabel (self.display_text_label) malt sich selbst, wenn es ein Kind des QWidget ist.
+        return composite
+
+    def paintEvent(self, event: QPaintEvent):
+        composite = self._composite_cache.get(self.avatar_facing_direction)
+        if composite is None: return
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, composite)
+        painter.end()
+        # Das Textfeld (self.display_text_label) liegt in einem eigenen Fenster und malt sich selbst.
 
     def switch_avatar_direction(self, new_direction: typing.Optional[str] = None):
         if new_direction:
@@ -284,8 +485,17 @@ class SherloxAvatarWindow(QWidget):
             self.avatar_facing_direction = new_direction
         else: self.avatar_facing_direction = "right" if self.avatar_facing_direction == "left" else "left"
         logging.info(f"AVATAR_UI: Switching avatar to face {self.avatar_facing_direction}.")
-        self._load_and_setup_components() 
-        self._initialize_ui_properties()  # This will also call _update_display_text_label_geometry
+        # Components and their pixmaps are preloaded for both directions; only swap profiles and offsets.
+        # Batch all state changes so Qt repaints (and the text window is re-shown) once at the end.
+        self.setUpdatesEnabled(False); self._batching_visual_update = True
+        try:
+            self._apply_display_profile()
+            self._apply_component_visuals()
+            self._initialize_ui_properties()  # This will also call _update_display_text_label_geometry
+        finally:
+            self._batching_visual_update = False; self.setUpdatesEnabled(True)
+        if self.display_text_window and self.display_text_label and self.isVisible():
+            self.display_text_window.show(); self.display_text_window.raise_()
         self.update()
 
     def mousePressEvent(self, event: QMouseEvent):
@@ -297,8 +507,14 @@ class SherloxAvatarWindow(QWidget):
                 screen_center = QApplication.instance().primaryScreen().availableGeometry().width()/2
                 window_center = new_pos.x() + self.width()/2
                 desired_dir = "left" if window_center > screen_center else "right"
-                if desired_dir != self.avatar_facing_direction: self.switch_avatar_direction(desired_dir)
+                if desired_dir == self.avatar_facing_direction:
+                    self._pending_direction = None; self._direction_switch_timer.stop()
+                elif abs(window_center - screen_center) > DIRECTION_SWITCH_HYSTERESIS_PX:
+                    self._pending_direction = desired_dir; self._direction_switch_timer.start() # (Re)arm debounce
             event.accept()
+    def _apply_pending_direction(self):
+        if self._pending_direction: self.switch_avatar_direction(self._pending_direction)
+        self._pending_direction = None
     def mouseReleaseEvent(self, event: QMouseEvent):
         if event.button()==Qt.LeftButton: self.window_drag_offset=QPoint(); event.accept()
 
@@ -310,26 +526,37 @@ class SherloxAvatarWindow(QWidget):
         menu.exec(self.mapToGlobal(position))
 
     def close_application(self):
-        logging.info("AVATAR_UI: Closing application."); self.close()
+        logging.info("AVATAR_UI: Closing application.")
+        if self.display_text_window: self.display_text_window.close()
+        self.close()
         if QApplication.instance(): QApplication.instance().quit()
 
     def start_typewriter_effect(self, text: str, speed: int = 50):
         if not self.display_text_label: logging.warning("AVATAR_UI: No display label for typewriter."); return
-        self.full_text_to_type = text; self.current_typed_text = ""; self.typewriter_char_index = 0
+        self.full_text_to_type = text; self.typewriter_char_index = 0
         self.typewriter_speed = speed
         if self.typewriter_timer: self.typewriter_timer.stop()
         if not self.typewriter_timer:
             self.typewriter_timer = QTimer(self)
             self.typewriter_timer.timeout.connect(self._typewriter_tick)
-        self.display_text_label.setText(""); self.typewriter_timer.start(self.typewriter_speed)
+        self.display_text_label.clear()
+        self.typewriter_cursor = QTextCursor(self.display_text_label.document())
+        self.typewriter_cursor.movePosition(QTextCursor.MoveOperation.End)
+        self.typewriter_timer.start(self.typewriter_speed)
         logging.debug(f"AVATAR_UI: Typewriter started: '{text[:30]}...'")
 
     def _typewriter_tick(self):
-        if not self.display_text_label or not self.typewriter_timer: return
-        if self.typewriter_char_index < len(self.full_text_to_type):
-            self.current_typed_text += self.full_text_to_type[self.typewriter_char_index]
-            self.display_text_label.setText(self.current_typed_text)
-            self.typewriter_char_index += 1
+        if not self.display_text_label or not self.typewriter_timer or not self.typewriter_cursor: return
+        text_len = len(self.full_text_to_type)
+        if self.typewriter_char_index < text_len:
+            # Emit a whole word (including its trailing whitespace) per tick to amortize the layout cost.
+            end = self.typewriter_char_index
+            limit = min(text_len, self.typewriter_char_index + TYPEWRITER_MAX_CHARS_PER_TICK)
+            while end < limit and not self.full_text_to_type[end].isspace(): end += 1
+            if end < text_len and end < limit: end += 1
+            end = max(end, self.typewriter_char_index + 1)
+            self.typewriter_cursor.insertText(self.full_text_to_type[self.typewriter_char_index:end])
+            self.typewriter_char_index = end
         else:
             self.typewriter_timer.stop(); logging.debug("AVATAR_UI: Typewriter finished.")
 
@@ -371,15 +598,21 @@ def run_avatar_ui_standalone():
 
     type_btn = QPushButton("Type Test", avatar_window)
     type_btn.setFixedSize(80,20)
-    if avatar_window.height() > 50 : type_btn.move(10, avatar_window.height() - 30)
-    else: type_btn.move(5,5)
     type_btn.clicked.connect(test_type) # type: ignore
     type_btn.setStyleSheet("background-color:rgba(150,200,150,180);color:black;border-radius:3px;")
-    type_btn.show()
+
+    def place_type_btn(): # The window only has its final size once the async image loads are done
+        if avatar_window.height() > 50 : type_btn.move(10, avatar_window.height() - 30)
+        else: type_btn.move(5,5)
+        type_btn.show()
+
+    if avatar_window.is_setup_finished: place_type_btn()
+    else: avatar_window.setup_finished.connect(place_type_btn)
     
     sys.exit(app.exec())
 
-if __name__ == "__main__":
+def _ensure_dummy_assets():
+    """Creates placeholder avatar/display PNGs with Pillow if they are missing (dev helper, `--generate-dummies`)."""
     sherlox_folder = os.path.join(BASE_DIR, "data", "avatar", "sherlox")
     display_folder = os.path.join(BASE_DIR, "data", "display", "blackboard_green")
     os.makedirs(sherlox_folder, exist_ok=True); os.makedirs(display_folder, exist_ok=True)
@@ -400,5 +633,10 @@ if __name__ == "__main__":
             d_t.text((15,15),"LM Buddy\nTafel",font=font,fill="white",align="center"); img_t.save(tafel_min_img_path)
     except ImportError: logging.error("Pillow not found for dummy images.")
     except Exception as e: logging.error(f"Error dummy images: {e}", exc_info=True)
+
+if __name__ == "__main__":
+    # Pillow is only imported when placeholder assets are explicitly requested; normal startup skips it.
+    if "--generate-dummies" in sys.argv:
+        _ensure_dummy_assets()
     
-    run_avatar_ui_standalone()
\ No newline at end of file
+    run_avatar_ui_standalone()
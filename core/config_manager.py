@@ -7,11 +7,39 @@ to configuration values, and saving changes back to the file.
 It uses a default configuration dictionary as a fallback and to ensure
 all expected keys are present.
 """
+import atexit
+import functools
+import hashlib
 import json
 import logging
+import mmap
+import operator
 import os
+import re
+import threading
+import types
 import typing # For type hinting
 
+try:
+    import orjson # type: ignore
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# JSON encoder used for config files. Both variants produce UTF-8 bytes with
+# 4-space indentation, so the file looks the same whichever backend wrote it.
+if ORJSON_AVAILABLE:
+    # orjson only supports 2-space indentation; doubling the leading spaces of each line
+    # is safe because JSON strings cannot contain raw newlines.
+    _LEADING_SPACES_RE = re.compile(rb"^( +)", re.MULTILINE)
+
+    def _dumps_config(config: typing.Mapping[str, typing.Any]) -> bytes:
+        payload = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+        return _LEADING_SPACES_RE.sub(lambda m: m.group(1) * 2, payload)
+else:
+    def _dumps_config(config: typing.Mapping[str, typing.Any]) -> bytes:
+        return json.dumps(config, indent=4, ensure_ascii=False).encode("utf-8")
+
 # --- Constants ---
 CONFIG_FILE_NAME: str = "config.json"  # Name of the configuration file
 
@@ -27,17 +55,29 @@ DEFAULT_CONFIG: typing.Dict[str, typing.Any] = {
 
     # --- Feature Configuration ---
     "ocr_language": "deu",               # Default OCR language (e.g., "eng", "deu+eng").
+    "ocr_max_height": 1600,              # Taller captures are downscaled to this height (px) before OCR; 0 disables.
+    "ocr_auto_crop": False,              # Recognize only the area containing text lines (needs tesserocr).
+    "ocr_batch_processes": 0,            # Worker processes for multi-image OCR (0 = one per CPU core, 1 = sequential).
+    "ocr_omp_thread_limit": 1,           # OpenMP threads per Tesseract recognition (0 = OpenMP default); read at startup.
     "enable_vision_if_available": True,  # Whether to attempt using vision capabilities of the LLM if supported.
+    "vision_max_image_dim": 1568,        # Longer image edge (px) is downscaled to this before encoding; 0 disables.
     "hotkey": "ctrl+shift+f",            # Global hotkey to trigger the application's main action.
+    "hotkey_debounce_seconds": 0.05,     # Presses within this time of the last one count once (filters key repeat/bounce).
 
     # --- LLM Interaction Parameters ---
     "max_tokens": 4096,                  # Max tokens the LLM should generate in a response.
     "temperature": 0.3,                  # LLM temperature (0.0 to 2.0). Lower is more deterministic.
     "llm_request_timeout": 180,          # Timeout in seconds for LLM API requests.
-    "screenshot_delay": 0.5,             # Delay in seconds after hiding GUI before taking a screenshot.
+    "screenshot_delay": 0.5,             # Max seconds to wait for the GUI to hide before taking a screenshot.
     "system_prompt_global": "You are LM Buddy, a helpful and friendly AI assistant. Format your answers clearly using Markdown. Be concise but helpful. Explain things simply.",
     "max_context_messages": 30,          # Max number of user/assistant message pairs to keep in history for context.
     "max_context_tokens_warning": 6000,  # Token threshold for context length warning in UI.
+    "max_history_tokens": 8000,          # History token budget; older turns are summarized beyond it (0 disables).
+    "history_keep_tail_messages": 6,     # Most recent history messages always kept verbatim when summarizing.
+    "history_summary_max_tokens": 512,   # Max tokens for a generated history summary.
+    "history_keep_images": 2,            # Newest history screenshots kept in memory; older ones are paged to disk.
+    "response_cache_size": 32,           # Max cached LLM replies for repeated identical requests (0 disables).
+    "worker_threads": 4,                 # Worker threads for LLM requests (screenshots/OCR use their own single worker).
 
     # --- UI Skin & Appearance (Classic Window) ---
     "active_ui_skin": "classic",         # Current active UI skin ("classic", "avatar").
@@ -61,11 +101,37 @@ DEFAULT_CONFIG: typing.Dict[str, typing.Any] = {
     "user_language": "auto",             # Preferred UI language ("auto", "en", "de", etc.). For i18n.
     "config_version": "1.0"              # Version of the config file structure (for future migrations).
 }
+# Precomputed once: the default key set, a read-only view for fallback lookups,
+# and the serialized defaults written on first run.
+_DEFAULT_KEYS: typing.FrozenSet[str] = frozenset(DEFAULT_CONFIG)
+_DEFAULT_VIEW: typing.Mapping[str, typing.Any] = types.MappingProxyType(DEFAULT_CONFIG)
+_DEFAULT_JSON_BYTES: bytes = _dumps_config(DEFAULT_CONFIG)
 
 # Module-level global variables to hold the current configuration and its path.
 # These are considered "private" to this module (by convention with underscore).
 _current_config: typing.Optional[typing.Dict[str, typing.Any]] = None
 _config_path: typing.Optional[str] = None
+# Last successfully parsed config, keyed by path + mtime + size, so repeated
+# load_configuration() calls on an unchanged file skip reading and parsing.
+_load_cache: typing.Dict[str, typing.Any] = {"path": None, "mtime_ns": None, "size": None, "cfg": None}
+# Whether the config file's directory has been created for the current path.
+_dir_ensured: bool = False
+# Digest of the last payload written and the file's mtime right after that write.
+# Lets save_configuration skip rewriting an unchanged config that nobody else touched.
+_last_saved_hash: typing.Optional[bytes] = None
+_last_saved_mtime_ns: typing.Optional[int] = None
+# Incremented whenever the in-memory configuration changes (load or set), so other
+# modules can cache values derived from it and rebuild them only when it moves.
+_config_revision: int = 0
+# Guards _current_config mutations/snapshots and serializes disk writes respectively.
+_config_lock = threading.Lock()
+_save_lock = threading.Lock()
+# Debounced saves: bursts of save_configuration(immediate=False) collapse into one write.
+SAVE_DEBOUNCE_SECONDS: float = 0.25
+_save_timer: typing.Optional[threading.Timer] = None
+_pending_save_geometry: typing.Optional[str] = None
+
+@functools.lru_cache(maxsize=1)
 def _get_project_root() -> str:
     """
     Determines the project's root directory.
@@ -82,7 +148,7 @@ def init_config_path(custom_path: typing.Optional[str] = None) -> str:
     If `custom_path` is provided, it's used. Otherwise, a default path
     relative to the project root is constructed.
 
-    This function is called automatically when the module is loaded.
+    This function is called lazily on the first load or save if no path was set.
 
     Args:
         custom_path (str, optional): A custom path to the configuration file.
@@ -90,7 +156,9 @@ def init_config_path(custom_path: typing.Optional[str] = None) -> str:
     Returns:
         str: The absolute path to the configuration file.
     """
-    global _config_path
+    global _config_path, _last_saved_hash, _dir_ensured
+    _last_saved_hash = None # A new target file must be written at least once
+    _dir_ensured = False
     if custom_path:
         _config_path = os.path.abspath(custom_path)
     else:
@@ -99,6 +167,46 @@ def init_config_path(custom_path: typing.Optional[str] = None) -> str:
     logging.debug(f"CONFIG_MANAGER: Configuration file path set to: {_config_path}")
     return _config_path
 
+def _read_config_file(path: str) -> typing.Any:
+    """
+    Reads and parses the JSON config file through a read-only memory map.
+
+    Uses orjson when available, otherwise the standard json module. Empty files
+    are not mapped and parse as invalid JSON, like before.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        json.JSONDecodeError: If the content is not valid JSON (orjson's error subclasses it).
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return json.loads(b"")
+        with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mm:
+            if ORJSON_AVAILABLE:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+            return json.loads(mm[:])
+    finally:
+        os.close(fd)
+
+def _remember_saved_payload(payload: bytes):
+    """Records the digest and resulting file mtime of a payload just written to disk."""
+    global _last_saved_hash, _last_saved_mtime_ns
+    _last_saved_hash = hashlib.blake2b(payload, digest_size=16).digest()
+    _last_saved_mtime_ns = os.stat(_config_path).st_mtime_ns
+
+def _write_default_config_file():
+    """Creates the config file from the pre-serialized `_DEFAULT_JSON_BYTES`."""
+    try:
+        with _save_lock:
+            _write_config_bytes_atomic(_DEFAULT_JSON_BYTES)
+            _remember_saved_payload(_DEFAULT_JSON_BYTES)
+        logging.info(f"CONFIG_MANAGER: Default configuration written to '{_config_path}'.")
+    except OSError as e:
+        logging.error(f"CONFIG_MANAGER: Error writing default configuration to '{_config_path}': {e}", exc_info=True)
+
 def load_configuration() -> typing.Dict[str, typing.Any]:
     """
     Loads the application configuration from the JSON file.
@@ -112,37 +220,45 @@ def load_configuration() -> typing.Dict[str, typing.Any]:
     Returns:
         dict: The loaded (or default) configuration dictionary.
     """
-    global _current_config
-    if not _config_path: # Should have been initialized on module import
+    global _current_config, _config_revision
+    if not _config_path: # Resolved lazily on first use
         init_config_path()
         assert _config_path is not None, "Config path could not be initialized"
 
-    # Start with a deep copy of defaults to ensure all keys are present
+    try:
+        st = os.stat(_config_path)
+    except OSError:
+        st = None # Missing file is handled (and created) below
+    if (st is not None and _load_cache["cfg"] is not None and _load_cache["path"] == _config_path
+            and _load_cache["mtime_ns"] == st.st_mtime_ns and _load_cache["size"] == st.st_size):
+        # Hand out a copy so unsaved in-memory edits are discarded, as a real reload would.
+        _current_config = _load_cache["cfg"].copy()
+        _config_revision += 1
+        logging.debug(f"CONFIG_MANAGER: '{_config_path}' unchanged since last load. Using cached configuration.")
+        return _current_config
+
+    # Start with a copy of defaults to ensure all keys are present
     # and to avoid modifying the original DEFAULT_CONFIG.
-    loaded_config = {k: v for k, v in DEFAULT_CONFIG.items()} # Simple deep copy
+    loaded_config = DEFAULT_CONFIG.copy()
 
     try:
-        with open(_config_path, "r", encoding="utf-8") as f:
-            user_config = json.load(f)
-            # Merge user settings: user_config values override defaults.
-            # This also preserves new default keys if the user's config file is older.
-            for key in loaded_config: # Iterate over default keys to ensure structure
-                if key in user_config:
-                    # Basic type check or more sophisticated merge could be added here
-                    # For now, direct override.
-                    loaded_config[key] = user_config[key]
-            # Optionally, handle unknown keys from user_config (e.g., log them, remove them)
-            for key_user in user_config:
-                if key_user not in loaded_config:
-                    logging.warning(f"CONFIG_MANAGER: Unknown key '{key_user}' found in config file. It will be ignored unless added to DEFAULT_CONFIG.")
-                    # Or, if you want to load them anyway: loaded_config[key_user] = user_config[key_user]
-
-
+        user_config = _read_config_file(_config_path)
+        # Merge user settings: user_config values override defaults.
+        # This also preserves new default keys if the user's config file is older.
+        user_keys = user_config.keys()
+        loaded_config.update({k: user_config[k] for k in user_keys & _DEFAULT_KEYS})
+        # Unknown keys from user_config are ignored and reported in one go.
+        unknown_keys = user_keys - _DEFAULT_KEYS
+        if unknown_keys:
+            logging.warning(f"CONFIG_MANAGER: Unknown key(s) {sorted(unknown_keys)} found in config file. They will be ignored unless added to DEFAULT_CONFIG.")
+
+        if st is not None:
+            _load_cache.update(path=_config_path, mtime_ns=st.st_mtime_ns, size=st.st_size, cfg=loaded_config.copy())
         logging.info(f"CONFIG_MANAGER: Configuration successfully loaded from '{_config_path}'.")
     except FileNotFoundError:
         logging.warning(f"CONFIG_MANAGER: '{_config_path}' not found. Using default settings and creating the file.")
         _current_config = loaded_config # Use defaults before saving
-        save_configuration() # This will save the current _current_config (which are defaults)
+        _write_default_config_file() # Writes the pre-serialized defaults, no re-encoding needed
         # No need to return _current_config here, it's set globally and returned at the end
     except json.JSONDecodeError:
         logging.error(f"CONFIG_MANAGER: Error reading '{_config_path}'. File is not valid JSON. Using default settings for this session.")
@@ -153,6 +269,7 @@ def load_configuration() -> typing.Dict[str, typing.Any]:
         # Defaults will be used.
 
     _current_config = loaded_config
+    _config_revision += 1
     
     # Placeholder for potential future config migration logic
     # file_config_version = _current_config.get("config_version", "0.0") # Version from loaded file
@@ -177,22 +294,56 @@ def get_config_value(key: str, default_override: typing.Any = None) -> typing.An
     Returns:
         Any: The configuration value, or the default if not found.
     """
-    if _current_config is None:
-        load_configuration() # Ensure config is loaded
+    cfg = _current_config # Local binding: one global lookup per call
+    if cfg is None:
+        cfg = load_configuration() # Ensure config is loaded
     
-    # Ensure _current_config is not None after load_configuration attempt
+    # Ensure the config is not None after load_configuration attempt
     # This should ideally not happen if load_configuration always sets _current_config
-    if _current_config is None:
+    if cfg is None:
         logging.error("CONFIG_MANAGER: _current_config is None even after load_configuration. Returning emergency default.")
         # Fallback to default_override or the master default for the key
         if default_override is not None:
             return default_override
-        return DEFAULT_CONFIG.get(key) # Can be None if key not in DEFAULT_CONFIG
+        return _DEFAULT_VIEW.get(key) # Can be None if key not in DEFAULT_CONFIG
+
+    # Only consult the defaults on a miss; the common case is a single dict lookup.
+    try:
+        return cfg[key]
+    except KeyError:
+        if default_override is not None:
+            return default_override
+        # Fallback to the master default defined in DEFAULT_CONFIG if key is missing in _current_config
+        return _DEFAULT_VIEW.get(key)
+
+def get_many(keys: typing.Tuple[str, ...]) -> typing.Tuple[typing.Any, ...]:
+    """
+    Retrieves several configuration values in one call.
+
+    Missing keys fall back to their DEFAULT_CONFIG value (or None), as in `get_config_value`.
+
+    Args:
+        keys (tuple[str, ...]): The configuration keys to retrieve.
 
-    if default_override is not None:
-        return _current_config.get(key, default_override)
-    # Fallback to the master default defined in DEFAULT_CONFIG if key is missing in _current_config
-    return _current_config.get(key, DEFAULT_CONFIG.get(key))
+    Returns:
+        tuple: The values in the same order as `keys`.
+    """
+    cfg = _current_config
+    if cfg is None:
+        cfg = load_configuration()
+    try:
+        if len(keys) == 1:
+            return (cfg[keys[0]],)
+        return operator.itemgetter(*keys)(cfg)
+    except KeyError:
+        return tuple(get_config_value(k) for k in keys)
+
+def get_revision() -> int:
+    """
+    Returns a counter that changes whenever the in-memory configuration is loaded or modified.
+    Lets callers cache values derived from the configuration until it changes.
+    """
+    return _config_revision
 
 def set_config_value(key: str, value: typing.Any):
     """
@@ -203,24 +354,102 @@ def set_config_value(key: str, value: typing.Any):
         key (str): The configuration key to set.
         value (Any): The new value for the key.
     """
+    global _config_revision
     if _current_config is None:
         load_configuration() # Ensure config is loaded
     
     if _current_config is not None: # Check again after load
-        _current_config[key] = value
+        with _config_lock:
+            _current_config[key] = value
+            _config_revision += 1
         logging.debug(f"CONFIG_MANAGER: Config value set (in memory): '{key}' = '{value}'")
     else:
         # This case should be rare if load_configuration works as expected
         logging.error(f"CONFIG_MANAGER: Failed to set config value for '{key}' because _current_config is still None.")
 
-def save_configuration(geometry_to_save: typing.Optional[str] = None):
+def _write_config_bytes_atomic(payload: bytes):
+    """
+    Writes the payload crash-safely: write a temp file next to the config,
+    fsync it, then atomically swap it in with os.replace.
+    The config directory is created once per process on first write.
+    """
+    global _dir_ensured
+    if not _dir_ensured:
+        config_dir = os.path.dirname(_config_path)
+        if config_dir: # Empty for a bare file name in the CWD
+            os.makedirs(config_dir, exist_ok=True)
+        _dir_ensured = True
+
+    tmp_path = _config_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, _config_path)
+
+def schedule_save(delay: float = SAVE_DEBOUNCE_SECONDS, geometry_to_save: typing.Optional[str] = None):
+    """
+    Schedules a debounced save. Each call restarts the countdown, so a burst of
+    updates (window moves, resizes, toggles) results in a single disk write.
+
+    Args:
+        delay (float): Seconds of quiet time before the save runs.
+        geometry_to_save (str, optional): Classic window geometry to persist with the save.
+                                          The most recent non-None value wins.
+    """
+    global _save_timer, _pending_save_geometry
+    with _config_lock:
+        if geometry_to_save:
+            _pending_save_geometry = geometry_to_save
+        if _save_timer is not None:
+            _save_timer.cancel()
+        _save_timer = threading.Timer(delay, _do_scheduled_save)
+        _save_timer.daemon = True
+        _save_timer.name = "ConfigSaveTimer"
+        _save_timer.start()
+
+def _take_pending_save() -> typing.Tuple[bool, typing.Optional[str]]:
+    """Cancels any pending debounced save and returns (was_pending, pending_geometry)."""
+    global _save_timer, _pending_save_geometry
+    with _config_lock:
+        was_pending = _save_timer is not None
+        if _save_timer is not None:
+            _save_timer.cancel()
+        geometry = _pending_save_geometry
+        _save_timer = None
+        _pending_save_geometry = None
+    return was_pending, geometry
+
+def _do_scheduled_save():
+    """Timer callback: performs the coalesced save."""
+    was_pending, geometry = _take_pending_save()
+    if was_pending:
+        _save_now(geometry)
+
+def _flush_pending_save():
+    """Writes a still-pending debounced save synchronously (registered with atexit)."""
+    was_pending, geometry = _take_pending_save()
+    if was_pending:
+        _save_now(geometry)
+
+def save_configuration(geometry_to_save: typing.Optional[str] = None, immediate: bool = True):
     """
     Saves the current in-memory configuration to the JSON file.
 
     Args:
         geometry_to_save (str, optional): Specific UI geometry string for the classic window.
                                           If provided, it updates "classic_ui_initial_geometry".
+        immediate (bool): If True (default), writes synchronously, folding in any pending
+                          debounced save. If False, defers to `schedule_save()`.
     """
+    if not immediate:
+        schedule_save(geometry_to_save=geometry_to_save)
+        return
+    _, pending_geometry = _take_pending_save()
+    _save_now(geometry_to_save or pending_geometry)
+
+def _save_now(geometry_to_save: typing.Optional[str] = None):
+    """Synchronous save implementation behind `save_configuration` and the debounce timer."""
     global _current_config # We are modifying the module-level _current_config if it was None
     if not _config_path:
         init_config_path()
@@ -233,35 +462,36 @@ def save_configuration(geometry_to_save: typing.Optional[str] = None):
             logging.error("CONFIG_MANAGER: CRITICAL - Cannot save configuration because _current_config is None even after attempting load.")
             return # Prevent further errors
 
-    # Create a copy to avoid modifying the in-memory _current_config during the save process
-    # if other parts of the save logic (like geometry) read from it.
-    config_to_save = _current_config.copy()
+    # The geometry is written into the authoritative in-memory config; no defensive copy
+    # is needed because serialization happens under the same lock that guards mutations.
+    store_geometry = bool(geometry_to_save) and get_config_value("classic_ui_save_window_geometry", True)
 
-    # Handle specific window geometry saving for the classic UI if provided
-    if get_config_value("classic_ui_save_window_geometry", True) and geometry_to_save:
-        config_to_save["classic_ui_initial_geometry"] = geometry_to_save # Key used for loading initial geometry
-    
     try:
-        # Ensure the directory for the config file exists (important for first run or custom paths)
-        config_dir = os.path.dirname(_config_path)
-        if not os.path.exists(config_dir) and config_dir: # Check if config_dir is not empty (root path case)
-            os.makedirs(config_dir, exist_ok=True)
-            logging.info(f"CONFIG_MANAGER: Created directory for config file: '{config_dir}'")
-
-        with open(_config_path, "w", encoding="utf-8") as f:
-            json.dump(config_to_save, f, indent=4, ensure_ascii=False) # Use indent=4 for better readability
+        with _save_lock:
+            with _config_lock:
+                if store_geometry:
+                    _current_config["classic_ui_initial_geometry"] = geometry_to_save # Key used for loading initial geometry
+                payload = _dumps_config(_current_config)
+            payload_hash = hashlib.blake2b(payload, digest_size=16).digest()
+            if payload_hash == _last_saved_hash:
+                try:
+                    if os.stat(_config_path).st_mtime_ns == _last_saved_mtime_ns:
+                        logging.debug("CONFIG_MANAGER: Configuration unchanged since last save. Skipping write.")
+                        return
+                except OSError:
+                    pass # File vanished; write it again below
+
+            _write_config_bytes_atomic(payload)
+            _remember_saved_payload(payload)
         logging.info(f"CONFIG_MANAGER: Configuration successfully saved to '{_config_path}'.")
     except Exception as e:
         logging.error(f"CONFIG_MANAGER: Error saving configuration to '{_config_path}': {e}", exc_info=True)
 
+atexit.register(_flush_pending_save)
+
 # --- Module Initialization ---
-# Initialize path and load configuration when the module is first imported.
-# This makes the configuration available immediately to any part of the app
-# that imports this manager.
-if _config_path is None:
-    init_config_path()
-if _current_config is None:
-    load_configuration()
+# Configuration is loaded lazily: the first get_config_value/set_config_value
+# (or an explicit load_configuration) resolves the path and reads the file.
 
 if __name__ == "__main__":
     # Configure logging for direct script execution test
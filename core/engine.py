@@ -10,11 +10,21 @@ This class orchestrates the main functionalities of the application, including:
 - Managing OCR operations via ocr_utils.
 - Controlling Text-to-Speech output via tts_utils.
 - Managing the global hotkey listener via hotkey_manager.
-- Communicating updates and results to the GUI via a queue.
+- Communicating updates and results to the GUI via a batched GuiChannel.
+
+Threading model: the engine owns a fixed set of long-lived threads and never
+starts a thread per task. LLM requests run on a small worker pool
+(`worker_threads`), screen capture and OCR on one pipelined worker each, and
+speech on one TTS thread. Results reach the GUI only through the GuiChannel.
 """
+import collections
+import concurrent.futures
+import functools
+import hashlib
 import logging
 import threading
-import queue
+import time
+import weakref
 from PIL import Image # For type hinting PIL.Image.Image
 import typing       # For extensive type hinting
 
@@ -24,20 +34,59 @@ from . import ocr_utils
 from . import tts_utils
 from . import llm_handler
 from . import hotkey_manager
+from .prompt_assembler import PromptAssembler
 from . import message_types as mt # For structured communication with the GUI
+from .gui_channel import GuiChannel
+from .image_pager import ImagePager, ImageRef
+
+# OCR actions whose reply depends only on the captured content, so a repeated
+# capture of the same content can be answered from the response cache.
+CACHEABLE_OCR_ACTIONS: typing.FrozenSet[str] = frozenset({"summarize", "bullet_points"})
+RESPONSE_CACHE_CONTEXT_TURNS: int = 6 # Trailing history turns that feed the context signature
+
+def _action_prompt_pair(prompt_with_image: str) -> typing.Tuple[str, str]:
+    """Returns (prompt used with an image, prompt used for text only) for an action prompt."""
+    return prompt_with_image, prompt_with_image.replace("(Text/Bild)", "(Text)")
+
+# {action_key: (prompt with image, prompt without image)}, built once at import.
+_ACTION_PROMPTS: typing.Dict[str, typing.Tuple[str, str]] = {
+    "summarize": _action_prompt_pair("Fasse den folgenden Inhalt (Text/Bild) prägnant zusammen."),
+    "help": _action_prompt_pair("Ich benötige Hilfe zum folgenden Inhalt (Text/Bild). Gib eine verständliche Hilfestellung."),
+    "improve_text": _action_prompt_pair("Bitte verbessere den folgenden Text:"),
+    "analyze_image": _action_prompt_pair("Analysiere das folgende Bild detailliert."),
+    "bullet_points": _action_prompt_pair("Extrahiere die wichtigsten Informationen aus dem folgenden Inhalt (Text/Bild) als Stichpunkte."),
+    "translate": _action_prompt_pair("Übersetze den folgenden Text (oder beschreibe das Bild und übersetze die Beschreibung) in die Sprache: {lang}."),
+    "set_context_for_question": _action_prompt_pair("Der folgende Inhalt (Text/Bild) dient als Kontext für meine nächste Frage:"),
+}
+_DEFAULT_ACTION_PROMPT = _action_prompt_pair("Analysiere den folgenden Inhalt (Text/Bild) und gib eine kurze Hilfestellung/Zusammenfassung.")
+_ACTION_REQUIRES_TEXT: typing.FrozenSet[str] = frozenset({"improve_text"}) # Fall back to the default prompt without OCR text
+_ACTION_REQUIRES_IMAGE: typing.FrozenSet[str] = frozenset({"analyze_image"})
+_NO_IMAGE_PROMPT = "Aktion nicht möglich, da kein Bild vorhanden."
+
+OCR_PIPELINE_DEPTH: int = 2 # Captures that may wait for/undergo OCR at once; further captures are dropped
+
+# Config keys the engine reads on hot paths; mirrored into attributes by _refresh_hot_config().
+_HOT_CONFIG_KEYS: typing.FrozenSet[str] = frozenset({
+    "enable_vision_if_available", "app_version", "classic_ui_title",
+    "response_cache_size", "history_keep_images",
+})
+
+def _normalize_for_cache(text: str) -> str:
+    """Case-folds and collapses whitespace so trivially different requests share a cache key."""
+    return " ".join(text.casefold().split()).rstrip(" ?!.")
 
 class LMBuddyCoreEngine:
     """
     The central processing engine for LM Buddy. It manages state,
     coordinates module interactions, and communicates with the GUI.
     """
-    def __init__(self, gui_queue: queue.Queue, app_stop_event: threading.Event):
+    def __init__(self, gui_queue: GuiChannel, app_stop_event: threading.Event):
         """
         Initializes the LMBuddyCoreEngine.
 
         Args:
-            gui_queue (queue.Queue): A queue for sending messages and updates
-                                     asynchronously to the GUI.
+            gui_queue (GuiChannel): The channel for sending messages and updates
+                                    asynchronously to the GUI.
             app_stop_event (threading.Event): An event that signals when the
                                               application is shutting down, allowing
                                               threads to terminate gracefully.
@@ -45,18 +94,13 @@ class LMBuddyCoreEngine:
         self.gui_queue = gui_queue
         self.app_stop_event = app_stop_event # Used by components like HotkeyManager
 
-        # Initialize core utility modules. Errors during init are logged by the modules.
-        if not tts_utils.initialize_tts():
-            logging.warning("ENGINE: TTS Engine could not be initialized during engine setup.")
-        if not llm_handler.initialize_tokenizer(): # Tokenizer is crucial for token counts
-            logging.warning("ENGINE: LLM Tokenizer could not be initialized during engine setup.")
-        
         # --- Application Core State ---
-        self.context_history: typing.List[typing.Tuple[str, typing.Union[str, list], typing.Optional[Image.Image]]] = []
+        self.context_history: typing.List[typing.Tuple[str, typing.Union[str, list], typing.Union[Image.Image, ImageRef, None]]] = []
         """
         Conversation history. List of tuples: (role, content, pil_image_object).
         'content' can be a string or a list of parts for multimodal messages.
-        'pil_image_object' is the PIL.Image if the user turn included an image.
+        'pil_image_object' is the PIL.Image if the user turn included an image, or an
+        ImageRef once the turn has aged out and its image was paged to disk.
         """
         self.ocr_text_buffer: typing.Optional[str] = None
         """Stores the most recently extracted OCR text."""
@@ -64,6 +108,55 @@ class LMBuddyCoreEngine:
         """Stores the most recently captured PIL Image object."""
         self.last_action_was_ocr_initiated: bool = False
         """Flag to indicate if the last LLM interaction was triggered by an OCR/image action."""
+        self._history_lock = threading.RLock()
+        """Guards every write to context_history. Worker threads only ever read tuple snapshots."""
+        self._history_generation: int = 0
+        """Bumped on every clear, so replies to a cleared conversation are not recorded."""
+        self._history_tokens: int = 0
+        """Text tokens of the first `_history_tokens_counted` history entries."""
+        self._history_tokens_counted: int = 0
+        self._image_pager = ImagePager()
+        """Disk heap for images of older history turns (see `_page_out_old_images`)."""
+        self.prompt_assembler = PromptAssembler()
+        """Builds cache-friendly API message lists (stable system prompt + history prefix)."""
+        self._prompt_lock = threading.Lock()
+        """Serializes prompt_assembler use between LLM workers."""
+        self._response_cache: "collections.OrderedDict[tuple, typing.Tuple[str, int, int, int]]" = collections.OrderedDict()
+        """LRU of {request key: (reply, prompt_tokens, completion_tokens, total_tokens)}."""
+        self._response_cache_lock = threading.Lock()
+        self._inflight: typing.Set[tuple] = set()
+        """Keys of requests that are queued or streaming; identical requests are dropped meanwhile."""
+        self._inflight_lock = threading.Lock()
+        self._b64_cache: typing.Dict[int, str] = {}
+        """{id(image): data URL} for images that are still alive (evicted via weakref.finalize)."""
+        self._b64_cache_lock = threading.Lock()
+        self._vision_enabled: bool = False
+        self._main_window_title: str = "LM Buddy"
+        self._response_cache_size: int = 32
+        self._history_keep_images: int = 2
+        self._refresh_hot_config() # Attributes above mirror config; kept current by set_config_value
+
+        # Reused worker threads instead of one new thread per action. Screen capture and OCR are
+        # two pipelined single-worker stages, so the next capture can run while Tesseract is still
+        # busy with the previous one, and neither waits behind a running LLM stream.
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, int(self.get_config_value("worker_threads", 4) or 4)),
+            thread_name_prefix="LMBuddyLLM"
+        )
+        self._capture_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="LMBuddyCapture")
+        self._ocr_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="LMBuddyOCR")
+        self._ocr_slots = threading.BoundedSemaphore(OCR_PIPELINE_DEPTH)
+        """Bounds the captures queued for or running OCR."""
+
+        # The TTS engine, the tokenizer and Tesseract's language data are slow to load. Load them in
+        # the background while the GUI comes up: the tokenizer on an LLM worker (first token counts
+        # wait for it via llm_handler's init lock), OCR on the OCR worker (a capture queues behind
+        # it), the TTS engine on tts_utils' own worker thread (started by initialize_tts).
+        self._submit(self._executor, self._initialize_tokenizer)
+        self._submit(self._executor, self._initialize_tts)
+        self._submit(self._ocr_executor, ocr_utils.initialize_ocr)
+        self._hotkey_busy = threading.Event()
+        """Set while a screenshot/OCR pass triggered by the hotkey is queued or running."""
 
         # Initialize and start the HotkeyManager
         self.hotkey_mgr = hotkey_manager.HotkeyManager(
@@ -73,7 +166,7 @@ class LMBuddyCoreEngine:
         if not self.hotkey_mgr.start_listener():
             logging.error("ENGINE: Failed to start the hotkey listener.")
             # Inform GUI about the failure if possible (queue might be used by GUI constructor later)
-            self.gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": "Critical: Hotkey listener failed to start. Check logs/config."})
+            self.gui_queue.post({"type": mt.MSG_TYPE_ERROR, "content": "Critical: Hotkey listener failed to start. Check logs/config."})
 
         logging.info("LMBuddyCoreEngine initialized successfully.")
 
@@ -88,25 +181,41 @@ class LMBuddyCoreEngine:
         By default, it saves the entire configuration immediately.
         """
         config_manager.set_config_value(key, value)
+        if key in _HOT_CONFIG_KEYS:
+            self._refresh_hot_config()
         if save_now:
             config_manager.save_configuration()
 
+    def _refresh_hot_config(self):
+        """Re-reads the config values used on hot paths (hotkey, OCR actions, caches) into attributes."""
+        self._vision_enabled = bool(self.get_config_value("enable_vision_if_available", False))
+        # Title of the main GUI window, which ocr_utils hides before taking a screenshot.
+        app_ver = self.get_config_value("app_version", "") # Default to empty if not set
+        base_title = self.get_config_value("classic_ui_title", "LM Buddy")
+        self._main_window_title = f"{base_title} {app_ver}".strip() # Construct and strip potential trailing space
+        self._response_cache_size = int(self.get_config_value("response_cache_size", 32) or 0)
+        self._history_keep_images = max(0, int(self.get_config_value("history_keep_images", 2) or 0))
+
     # --- State Management ---
     def clear_all_context_and_buffers(self):
         """Clears the conversation history and resets temporary buffers."""
-        self.context_history.clear()
+        with self._history_lock:
+            self.context_history = [] # Swap in a new list; in-flight snapshots stay untouched
+            self._history_generation += 1
+            self._history_tokens = 0
+            self._history_tokens_counted = 0
+            self._image_pager.clear()
+        self.prompt_assembler.reset()
         self.ocr_text_buffer = None
         self.last_image_buffer = None
         self.last_action_was_ocr_initiated = False
         logging.info("ENGINE: Conversation context history and internal buffers have been cleared.")
         
-        # Inform GUI about the clearance for UI updates
-        self.gui_queue.put({"type": mt.MSG_TYPE_INFO, "content": "Context and buffers cleared."})
-        # Reset token counts in GUI
-        self.gui_queue.put({"type": mt.MSG_TYPE_LLM_PROMPT_TOKENS_UPDATE, "count": 0})
-        self.gui_queue.put({
-            "type": mt.MSG_TYPE_LLM_FINAL_TOKEN_COUNTS,
-            "prompt_tokens":0, "completion_tokens":0, "total_tokens":0
+        # Inform GUI about the clearance and the token reset in a single message
+        self.gui_queue.post({
+            "type": mt.MSG_TYPE_CONTEXT_CLEARED,
+            "info": "Context and buffers cleared.",
+            "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0
         })
 
     # --- Hotkey Handling ---
@@ -115,23 +224,142 @@ class LMBuddyCoreEngine:
         Callback executed by HotkeyManager when the registered hotkey is pressed.
         Initiates the screenshot and OCR process.
         """
+        # Key repeat/bounce is already filtered by the HotkeyManager ('hotkey_debounce_seconds');
+        # here only a press during a running capture is dropped.
+        if self._hotkey_busy.is_set():
+            logging.debug("ENGINE: Hotkey press ignored (capture already in progress).")
+            return
+        self._hotkey_busy.set()
         logging.info("ENGINE: Hotkey press detected by manager, engine is now handling it.")
-        
-        # Determine the main GUI window title for the ocr_utils to attempt hiding it.
-        # This relies on the configuration being up-to-date with the GUI's actual title.
-        app_ver = self.get_config_value("app_version", "") # Default to empty if not set
-        base_title = self.get_config_value("classic_ui_title", "LM Buddy")
-        main_window_title = f"{base_title} {app_ver}".strip() # Construct and strip potential trailing space
-
-        # The perform_screenshot_and_ocr method is potentially blocking (file I/O, OCR).
-        # Run it in a new thread to keep the hotkey callback (and thus listener) responsive.
-        # Results (image, OCR text, or errors) will be put onto self.gui_queue.
-        threading.Thread(
-            target=self.perform_screenshot_and_ocr,
-            args=(main_window_title,),
-            daemon=True,
-            name="ScreenshotOCRThread"
-        ).start()
+
+        # Capturing is potentially blocking (window hiding, screen grab). Run it on the capture
+        # worker to keep the hotkey callback (and thus listener) responsive; it hands the image
+        # on to the OCR worker. Results (image, OCR text, or errors) will be put onto self.gui_queue.
+        if self._submit(self._capture_executor, self.perform_screenshot_and_ocr, self._main_window_title) is None:
+            self._hotkey_busy.clear()
+
+    # --- Background Work ---
+    @staticmethod
+    def _log_task_exception(future: concurrent.futures.Future):
+        """Done-callback: surfaces exceptions that would otherwise stay hidden in the future."""
+        if not future.cancelled() and future.exception() is not None:
+            exc = future.exception()
+            logging.error(f"ENGINE: Background task failed: {exc}", exc_info=(type(exc), exc, exc.__traceback__))
+
+    def _submit(self, executor: concurrent.futures.ThreadPoolExecutor, fn: typing.Callable, *args) -> typing.Optional[concurrent.futures.Future]:
+        """Submits `fn(*args)` to `executor`. Returns None if the engine is already shutting down."""
+        try:
+            future = executor.submit(fn, *args)
+        except RuntimeError: # Executor was shut down
+            logging.warning(f"ENGINE: Ignoring task '{getattr(fn, '__name__', fn)}' submitted after shutdown.")
+            return None
+        future.add_done_callback(self._log_task_exception)
+        return future
+
+    def _submit_llm_request(self, inflight_key: tuple, *args) -> bool:
+        """
+        Submits `_run_llm_request(*args)` unless an identical request is still in flight.
+        Returns False if the request was dropped as a duplicate; the GUI keeps showing the
+        running request, whose stream ends the "thinking" state as usual.
+        """
+        with self._inflight_lock:
+            if inflight_key in self._inflight:
+                duplicate = True
+            else:
+                duplicate = False
+                self._inflight.add(inflight_key)
+        if duplicate:
+            logging.info("ENGINE: Identical request is already in progress. Ignoring the duplicate.")
+            return False
+
+        future = self._submit(self._executor, self._run_llm_request, *args)
+        if future is None:
+            with self._inflight_lock:
+                self._inflight.discard(inflight_key)
+            return False
+        future.add_done_callback(lambda _f: self._release_inflight(inflight_key))
+        return True
+
+    def _release_inflight(self, inflight_key: tuple):
+        with self._inflight_lock:
+            self._inflight.discard(inflight_key)
+
+    # --- Response Cache ---
+    @staticmethod
+    def _turn_signature(message_parts: typing.Sequence[typing.Dict[str, typing.Any]]) -> typing.Tuple[str, bytes]:
+        """Normalized text of a turn's message parts and a digest of any attached image data."""
+        digest = hashlib.blake2b(digest_size=16)
+        texts = []
+        for part in message_parts:
+            if part.get("type") == "text":
+                texts.append(_normalize_for_cache(part.get("text") or ""))
+            elif part.get("type") == "image_url":
+                digest.update(part["image_url"]["url"].encode("ascii", "ignore"))
+        return "\n".join(texts), digest.digest()
+
+    def _response_cache_key(self, kind: str, message_parts: typing.List[typing.Dict[str, typing.Any]]) -> typing.Optional[tuple]:
+        """
+        Builds the cache key for a request: the turn's signature and a signature of the
+        trailing conversation context. Trailing earlier rounds of this same turn (and their
+        replies) are left out of the context, so asking the same question again hits the
+        entry stored the first time. Returns None if caching is disabled.
+        """
+        if self._response_cache_size <= 0:
+            return None
+        text, image_digest = signature = self._turn_signature(message_parts)
+        with self._history_lock:
+            history = self.context_history
+            end = len(history)
+            while end >= 2 and history[end - 1][0] == "assistant" and history[end - 2][0] == "user" \
+                    and isinstance(history[end - 2][1], list) and self._turn_signature(history[end - 2][1]) == signature:
+                end -= 2
+            context = history[max(0, end - RESPONSE_CACHE_CONTEXT_TURNS):end]
+        digest = hashlib.blake2b(image_digest, digest_size=16)
+        for role, content, _ in context:
+            digest.update(role.encode())
+            digest.update(repr(content).encode("utf-8", "ignore"))
+        return (kind, text, end, digest.digest())
+
+    def _store_cached_response(self, cache_key: tuple, reply: str, prompt_tokens: int, completion_tokens: int, total_tokens: int):
+        """on_complete callback from llm_handler: remembers a finished reply."""
+        if not reply.strip():
+            return
+        max_entries = self._response_cache_size
+        with self._response_cache_lock:
+            self._response_cache[cache_key] = (reply, prompt_tokens, completion_tokens, total_tokens)
+            self._response_cache.move_to_end(cache_key)
+            while len(self._response_cache) > max_entries:
+                self._response_cache.popitem(last=False)
+
+    def _replay_cached_response(self, cache_key: typing.Optional[tuple],
+                                current_message_parts: typing.List[typing.Dict[str, typing.Any]],
+                                image_pil: typing.Optional[Image.Image]) -> bool:
+        """
+        If a reply for `cache_key` is cached, records the turn in history and emits the
+        same GUI message sequence a live stream would. Returns True on a cache hit.
+        """
+        if cache_key is None:
+            return False
+        with self._response_cache_lock:
+            cached = self._response_cache.get(cache_key)
+            if cached is None:
+                return False
+            self._response_cache.move_to_end(cache_key)
+        reply, prompt_tokens, completion_tokens, total_tokens = cached
+        logging.info("ENGINE: Response cache hit. Replaying cached reply instead of querying the LLM.")
+
+        with self._history_lock:
+            self.context_history.extend([("user", current_message_parts, image_pil), ("assistant", reply, None)])
+        self._submit(self._executor, self._page_out_old_images) # Encoding screenshots is too slow for the GUI thread
+        self.gui_queue.post({"type": mt.MSG_TYPE_LLM_PROMPT_TOKENS_UPDATE, "count": prompt_tokens})
+        self.gui_queue.post({"type": mt.MSG_TYPE_LLM_CHUNK, "content": reply, "completion_tokens_live": completion_tokens})
+        self.gui_queue.post({
+            "type": mt.MSG_TYPE_LLM_FINAL_TOKEN_COUNTS,
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": total_tokens
+        })
+        self.gui_queue.post({"type": mt.MSG_TYPE_LLM_FULL_RESPONSE, "content": reply})
+        self.gui_queue.post(None) # End of sequence, as after a live stream
+        return True
 
     # --- Core Action Processing ---
     def process_direct_question(self, question_text: str):
@@ -140,30 +368,29 @@ class LMBuddyCoreEngine:
         """
         if not question_text or not question_text.strip():
             logging.warning("ENGINE: process_direct_question called with empty text.")
-            self.gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": "Cannot process an empty question."})
+            self.gui_queue.post({"type": mt.MSG_TYPE_ERROR, "content": "Cannot process an empty question."})
             return
 
         logging.debug(f"ENGINE: Processing direct question: '{question_text[:60]}...'")
         self.last_action_was_ocr_initiated = False # Update engine state
 
         current_message_parts = [{"type": "text", "text": question_text}]
+        cache_key = self._response_cache_key("direct", current_message_parts)
+        if self._replay_cached_response(cache_key, current_message_parts, None):
+            return
+        on_complete = functools.partial(self._store_cached_response, cache_key) if cache_key else None
         
-        # Call llm_handler in a new thread. llm_handler will use self.gui_queue.
-        threading.Thread(
-            target=llm_handler.stream_llm_response,
-            args=(
-                self.context_history,           # Shared, mutable history list
-                current_message_parts,
-                self.gui_queue,
-                self.app_stop_event,            # For graceful shutdown during stream
-                True,                           # is_direct_question
-                None,                           # specific_action
-                None,                           # pil_image_obj (no image for direct q)
-                None                            # target_language
-            ), 
-            daemon=True,
-            name="LLMDirectQuestionThread"
-        ).start()
+        # Run the request on a worker thread. llm_handler will use self.gui_queue.
+        inflight_key = ("direct", hashlib.blake2b(_normalize_for_cache(question_text).encode("utf-8"), digest_size=16).digest())
+        self._submit_llm_request(
+            inflight_key,
+            current_message_parts,
+            True,                           # is_direct_question
+            None,                           # specific_action
+            None,                           # pil_image_obj (no image for direct q)
+            None,                           # target_language
+            on_complete                     # Populates the response cache
+        )
 
     def process_ocr_action(self, action_key: str, ocr_text: typing.Optional[str], 
                            image_pil: typing.Optional[Image.Image], 
@@ -183,96 +410,268 @@ class LMBuddyCoreEngine:
         current_message_parts: typing.List[typing.Dict[str, typing.Any]] = []
         action_description_prompt = "" # This will be the main text part of the user's message
 
-        if image_pil and self.get_config_value("enable_vision_if_available", False):
-            base64_img_str = llm_handler.convert_image_to_base64_str(image_pil)
+        if image_pil and self._vision_enabled:
+            base64_img_str = self._b64_for(image_pil)
             current_message_parts.append({"type": "image_url", "image_url": {"url": base64_img_str}})
         
-        # Build the textual part of the prompt based on the action
-        # (This logic was previously in gui.py's _process_ocr_action_thread)
-        if action_key == "summarize": action_description_prompt = "Fasse den folgenden Inhalt (Text/Bild) prägnant zusammen."
-        elif action_key == "help": action_description_prompt = "Ich benötige Hilfe zum folgenden Inhalt (Text/Bild). Gib eine verständliche Hilfestellung."
-        elif action_key == "improve_text" and ocr_text: action_description_prompt = "Bitte verbessere den folgenden Text:"
-        elif action_key == "analyze_image": action_description_prompt = "Analysiere das folgende Bild detailliert."
-        elif action_key == "bullet_points": action_description_prompt = "Extrahiere die wichtigsten Informationen aus dem folgenden Inhalt (Text/Bild) als Stichpunkte."
-        elif action_key == "translate" and target_language: action_description_prompt = f"Übersetze den folgenden Text (oder beschreibe das Bild und übersetze die Beschreibung) in die Sprache: {target_language}."
-        elif action_key == "set_context_for_question":
-            action_description_prompt = "Der folgende Inhalt (Text/Bild) dient als Kontext für meine nächste Frage:"
-            if ocr_text: action_description_prompt += f"\n\nOCR-Text:\n---\n{ocr_text}\n---"
-        else: # Default action if key is unrecognized (should not happen with button UI)
-            action_description_prompt = "Analysiere den folgenden Inhalt (Text/Bild) und gib eine kurze Hilfestellung/Zusammenfassung."
-        
-        # Append OCR text to the prompt if available and not already part of a specific instruction (like set_context)
-        if ocr_text and action_key != "set_context_for_question":
-            action_description_prompt += f"\n\nExtrahierter Text:\n\"\"\"{ocr_text}\"\"\""
-        
-        # Adjust prompt wording if no image or no text was provided for a generic action
-        if not image_pil and "(Text/Bild)" in action_description_prompt:
-            action_description_prompt = action_description_prompt.replace("(Text/Bild)", "(Text)")
-        elif not image_pil and "Bild" in action_description_prompt and "Text" not in action_description_prompt: # e.g. "Analyze Image" but no image
-             action_description_prompt = "Aktion nicht möglich, da kein Bild vorhanden."
-             if ocr_text: action_description_prompt += f" Dennoch hier der extrahierte Text:\n\"\"\"{ocr_text}\"\"\""
-        
+        # Build the textual part of the prompt from the precomputed action table
+        prompt_pair = _ACTION_PROMPTS.get(action_key, _DEFAULT_ACTION_PROMPT)
+        if (action_key in _ACTION_REQUIRES_TEXT and not ocr_text) or (action_key == "translate" and not target_language):
+            prompt_pair = _DEFAULT_ACTION_PROMPT
+        action_description_prompt = prompt_pair[0] if image_pil else prompt_pair[1]
+        if prompt_pair is _ACTION_PROMPTS["translate"]:
+            action_description_prompt = action_description_prompt.format(lang=target_language)
+
+        if action_key in _ACTION_REQUIRES_IMAGE and not image_pil and not ocr_text:
+            action_description_prompt = _NO_IMAGE_PROMPT
+        elif ocr_text:
+            # Join once instead of growing the (possibly very long) OCR prompt with +=
+            if action_key == "set_context_for_question":
+                ocr_block = f"OCR-Text:\n---\n{ocr_text}\n---"
+            else:
+                ocr_block = f'Extrahierter Text:\n"""{ocr_text}"""'
+            action_description_prompt = "\n\n".join((action_description_prompt, ocr_block))
+
         current_message_parts.append({"type": "text", "text": action_description_prompt})
+        # "set_context_for_question" only records history, it never sends a request.
+        on_complete = None
+        if action_key != "set_context_for_question":
+            cache_key = self._response_cache_key(action_key, current_message_parts) \
+                if action_key in CACHEABLE_OCR_ACTIONS else None
+            if self._replay_cached_response(cache_key, current_message_parts, image_pil):
+                return
+            on_complete = functools.partial(self._store_cached_response, cache_key) if cache_key else None
         
-        # Call llm_handler in a new thread
-        threading.Thread(
-            target=llm_handler.stream_llm_response,
-            args=(
-                self.context_history, current_message_parts, self.gui_queue,
-                self.app_stop_event,
-                False, # is_direct_question = False for OCR actions
-                action_key, # Pass the specific action for context (e.g. "set_context")
-                image_pil,  # Pass the PIL image for this turn to be stored in history
-                target_language
-            ), 
-            daemon=True,
-            name=f"LLMOCRActionThread-{action_key}"
-        ).start()
+        # Run the request on a worker thread
+        inflight_key = (action_key, hash(ocr_text), id(image_pil), target_language)
+        self._submit_llm_request(
+            inflight_key,
+            current_message_parts,
+            False, # is_direct_question = False for OCR actions
+            action_key, # Pass the specific action for context (e.g. "set_context")
+            image_pil,  # Pass the PIL image for this turn to be stored in history
+            target_language,
+            on_complete
+        )
 
-    def perform_screenshot_and_ocr(self, main_gui_window_title: str):
+    def _b64_for(self, image_pil: Image.Image) -> str:
         """
-        Orchestrates capturing a screenshot, performing OCR, and then
-        sending the results (or errors) to the GUI queue for further action.
+        Returns the base64 data URL for `image_pil`, encoding it only once per image object.
         """
-        logging.debug(f"ENGINE: Performing screenshot and OCR. Attempting to hide window: '{main_gui_window_title}'.")
-        
-        image_pil, err_msg_screenshot = ocr_utils.capture_active_window_pil(main_gui_window_title=main_gui_window_title)
+        key = id(image_pil)
+        with self._b64_cache_lock:
+            cached = self._b64_cache.get(key)
+        if cached is not None:
+            return cached
+
+        data_url = llm_handler.convert_image_to_base64_str(image_pil) # Downscales oversized images itself
+
+        with self._b64_cache_lock:
+            if key not in self._b64_cache:
+                weakref.finalize(image_pil, self._b64_cache.pop, key, None) # id() is reused after the image dies
+            self._b64_cache[key] = data_url
+        return data_url
+
+    def _run_llm_request(self, current_message_parts: typing.List[typing.Dict[str, typing.Any]],
+                         is_direct_question: bool, action_key: typing.Optional[str],
+                         image_pil: typing.Optional[Image.Image], target_language: typing.Optional[str],
+                         on_complete: typing.Optional[typing.Callable] = None):
+        """
+        Worker-thread body for an LLM request: compacts the history if it grew past its
+        token budget, assembles the prompt and streams the response to the GUI.
+        """
+        api_messages = None
+        prompt_tokens = None
+        if action_key != "set_context_for_question":
+            self._maybe_compact_history()
+        with self._history_lock:
+            history_snapshot = tuple(self.context_history)
+            generation = self._history_generation
+        if action_key != "set_context_for_question":
+            with self._prompt_lock:
+                api_messages = self.prompt_assembler.build(history_snapshot, current_message_parts)
+                prompt_tokens = self.prompt_assembler.count_prompt_tokens(current_message_parts)
+        llm_handler.stream_llm_response(
+            history_snapshot,               # Immutable snapshot; new turns come back via callback
+            current_message_parts,
+            self.gui_queue,
+            self.app_stop_event,            # For graceful shutdown during stream
+            is_direct_question,
+            action_key,
+            image_pil,
+            target_language,
+            api_messages,                   # Pre-assembled, prefix-stable message list
+            on_complete,
+            functools.partial(self._append_history_turns, generation),
+            prompt_tokens                   # Cached history token counts + the new turn
+        )
+
+    def _append_history_turns(self, generation: int, turns: typing.List[tuple]):
+        """Records finished turns from a worker, unless the history was cleared since it started."""
+        with self._history_lock:
+            if generation != self._history_generation:
+                logging.info("ENGINE: Conversation was cleared during the request. Discarding its turns.")
+                return
+            self.context_history.extend(turns)
+        self._page_out_old_images()
 
-        if err_msg_screenshot or not image_pil:
-            error_to_send_to_gui = err_msg_screenshot or "Error: Screenshot capture failed (no image returned)."
-            self.gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": error_to_send_to_gui})
-            self.gui_queue.put({"type": mt.MSG_TYPE_OCR_ACTIONS_HIDE}) # Tell GUI to hide action buttons
+    def _page_out_old_images(self):
+        """
+        Keeps only the newest `history_keep_images` screenshots in memory. Images of older
+        turns are written to the disk heap and replaced by an ImageRef. The encoding runs
+        outside _history_lock; an entry is only swapped if it is still the same object.
+        """
+        keep = self._history_keep_images
+        candidates = []
+        with self._history_lock:
+            seen = 0
+            for entry in reversed(self.context_history):
+                image = entry[2]
+                if image is None:
+                    continue
+                seen += 1
+                if seen > keep and isinstance(image, Image.Image):
+                    candidates.append(entry)
+        if not candidates:
             return
 
-        ocr_text, err_msg_ocr = ocr_utils.extract_text_from_image(image_pil)
-        vision_is_enabled = self.get_config_value("enable_vision_if_available", False)
+        paged = []
+        for entry in candidates:
+            try:
+                paged.append((entry, self._image_pager.page_out(entry[2])))
+            except (OSError, ValueError) as e:
+                logging.warning(f"ENGINE: Could not page out history image: {e}. Keeping it in memory.")
+                break
+
+        with self._history_lock:
+            for entry, ref in paged:
+                for i, current in enumerate(self.context_history):
+                    if current is entry: # Skipped if the history was cleared or compacted meanwhile
+                        self.context_history[i] = (entry[0], entry[1], ref)
+                        break
 
-        if err_msg_ocr and not vision_is_enabled: # OCR failed, and no vision fallback
-            self.gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": err_msg_ocr})
-            self.gui_queue.put({"type": mt.MSG_TYPE_OCR_ACTIONS_HIDE})
+    # --- History Compaction ---
+    @staticmethod
+    def _count_entry_tokens(entry: tuple) -> int:
+        """Text tokens of one (role, content, pil_image) history entry; images are not counted."""
+        return llm_handler.count_text_tokens(llm_handler.history_content_to_text(entry[1]))
+
+    def _maybe_compact_history(self):
+        """
+        Replaces the oldest history turns with an LLM-written summary once the history's
+        text tokens exceed `max_history_tokens`. The newest `history_keep_tail_messages`
+        entries are always kept verbatim, so input size stays bounded as sessions grow.
+        """
+        max_tokens = int(self.get_config_value("max_history_tokens", 8000) or 0)
+        if max_tokens <= 0:
+            return
+        keep_tail = max(2, int(self.get_config_value("history_keep_tail_messages", 6) or 6))
+
+        with self._history_lock:
+            # Count only entries appended since the last check.
+            for entry in self.context_history[self._history_tokens_counted:]:
+                self._history_tokens += self._count_entry_tokens(entry)
+            self._history_tokens_counted = len(self.context_history)
+            if self._history_tokens <= max_tokens:
+                return
+            cut = len(self.context_history) - keep_tail
+            cut -= cut % 2 # Keep user/assistant pairs together
+            if cut < 2:
+                return
+            old_entries = list(self.context_history[:cut])
+
+        logging.info(f"ENGINE: History has ~{self._history_tokens} tokens (budget {max_tokens}). Summarizing the oldest {cut} messages.")
+        summary = llm_handler.summarize_conversation(old_entries)
+        if not summary:
             return
+
+        summary_entry = ("system", f"[Summary of earlier conversation]: {summary}", None)
+        with self._history_lock:
+            # Only replace the slice if nobody cleared or rewrote it meanwhile.
+            if len(self.context_history) >= cut and all(a is b for a, b in zip(self.context_history, old_entries)):
+                self.context_history = [summary_entry] + self.context_history[cut:]
+                self._history_tokens = sum(self._count_entry_tokens(e) for e in self.context_history)
+                self._history_tokens_counted = len(self.context_history)
+                logging.info(f"ENGINE: History compacted to {len(self.context_history)} messages (~{self._history_tokens} tokens).")
+
+    def perform_screenshot_and_ocr(self, main_gui_window_title: str):
+        """
+        Capture stage: takes a screenshot and hands it to the OCR worker (`_run_ocr_stage`),
+        which sends the results (or errors) to the GUI queue for further action.
+        """
+        logging.debug(f"ENGINE: Performing screenshot and OCR. Attempting to hide window: '{main_gui_window_title}'.")
         
-        if err_msg_ocr and vision_is_enabled: # OCR failed, but vision is on, so proceed with image
-            logging.warning(f"ENGINE: OCR process failed (error: {err_msg_ocr}), but vision is enabled. Proceeding with image only.")
-            ocr_text = "" # Ensure ocr_text is empty so only image is primary for vision prompt
-
-        # Send successful OCR/image data to GUI to display action choices
-        self.gui_queue.put({
-            "type": mt.MSG_TYPE_OCR_RESULT_FOR_ACTIONS,
-            "ocr_text": ocr_text if ocr_text is not None else "", # Ensure string
-            "image_pil": image_pil # GUI will need this for context if user picks an image action
-        })
+        try:
+            # Reserve the OCR slot first, so a capture is never taken (and the GUI hidden) just to be dropped.
+            if not self._ocr_slots.acquire(blocking=False):
+                logging.warning("ENGINE: OCR is still busy with earlier captures. Skipping this capture.")
+                self.gui_queue.post({"type": mt.MSG_TYPE_INFO, "content": "OCR still busy, capture skipped."})
+                return
+            slot_handed_off = False
+            try:
+                image_pil, err_msg_screenshot = ocr_utils.capture_active_window_pil(main_gui_window_title=main_gui_window_title)
+
+                if err_msg_screenshot or not image_pil:
+                    error_to_send_to_gui = err_msg_screenshot or "Error: Screenshot capture failed (no image returned)."
+                    self.gui_queue.post({"type": mt.MSG_TYPE_ERROR, "content": error_to_send_to_gui})
+                    self.gui_queue.post({"type": mt.MSG_TYPE_OCR_ACTIONS_HIDE}) # Tell GUI to hide action buttons
+                    return
+
+                slot_handed_off = self._submit(self._ocr_executor, self._run_ocr_stage, image_pil) is not None
+            finally:
+                if not slot_handed_off: # _run_ocr_stage releases the slot once it has run
+                    self._ocr_slots.release()
+        finally:
+            self._hotkey_busy.clear() # Allow the next hotkey capture while OCR runs
+
+    def _run_ocr_stage(self, image_pil: Image.Image):
+        """OCR stage: extracts text from a captured image and posts the result to the GUI."""
+        try:
+            ocr_text, err_msg_ocr = ocr_utils.extract_text_from_image(image_pil)
+            vision_is_enabled = self._vision_enabled
+
+            if err_msg_ocr and not vision_is_enabled: # OCR failed, and no vision fallback
+                self.gui_queue.post({"type": mt.MSG_TYPE_ERROR, "content": err_msg_ocr})
+                self.gui_queue.post({"type": mt.MSG_TYPE_OCR_ACTIONS_HIDE})
+                return
+
+            if err_msg_ocr and vision_is_enabled: # OCR failed, but vision is on, so proceed with image
+                logging.warning(f"ENGINE: OCR process failed (error: {err_msg_ocr}), but vision is enabled. Proceeding with image only.")
+                ocr_text = "" # Ensure ocr_text is empty so only image is primary for vision prompt
+
+            # Send successful OCR/image data to GUI to display action choices
+            result_msg = {
+                "type": mt.MSG_TYPE_OCR_RESULT_FOR_ACTIONS,
+                "ocr_text": ocr_text if ocr_text is not None else "", # Ensure string
+            }
+            if vision_is_enabled:
+                result_msg["image_pil"] = image_pil # GUI will need this for context if user picks an image action
+            else:
+                image_pil = None # Text-only actions never use the image; don't keep it alive through the GUI round-trip
+            self.gui_queue.post(result_msg)
+        finally:
+            self._ocr_slots.release()
 
     # --- TTS Control ---
+    @staticmethod
+    def _initialize_tokenizer():
+        if not llm_handler.initialize_tokenizer(): # Tokenizer is crucial for token counts
+            logging.warning("ENGINE: LLM Tokenizer could not be initialized during engine setup.")
+
+    @staticmethod
+    def _initialize_tts():
+        if not tts_utils.initialize_tts(): # Errors during init are logged by tts_utils
+            logging.warning("ENGINE: TTS Engine could not be initialized during engine setup.")
+
     def speak(self, text_to_speak: str):
-        """Delegates to tts_utils to speak the given text."""
+        """Hands the given text to the TTS worker (non-blocking). Replaces any ongoing or queued speech."""
         if not text_to_speak or not text_to_speak.strip():
             logging.debug("ENGINE: Speak called with empty text, ignoring.")
             return
         tts_utils.speak_text(text_to_speak)
 
     def stop_speech(self):
-        """Delegates to tts_utils to stop any ongoing speech."""
+        """Stops any ongoing speech and drops queued speech."""
         tts_utils.stop_speaking()
 
     # --- Hotkey Listener Control (delegated from GUI) ---
@@ -300,8 +699,14 @@ class LMBuddyCoreEngine:
         if hasattr(self, 'hotkey_mgr') and self.hotkey_mgr:
              self.hotkey_mgr.stop_listener() # This will attempt to join the thread
         
-        # Stop any ongoing TTS
-        self.stop_speech()
+        # Stop any ongoing TTS and end the TTS worker thread
+        tts_utils.shutdown_tts()
+
+        # Running LLM streams watch app_stop_event; queued work is dropped.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._capture_executor.shutdown(wait=False, cancel_futures=True)
+        self._ocr_executor.shutdown(wait=False, cancel_futures=True)
+        self._image_pager.clear()
         
         # Any other cleanup tasks for the engine can be added here.
         logging.info("ENGINE: Shutdown sequence complete.")
@@ -313,8 +718,8 @@ if __name__ == '__main__':
         format='%(asctime)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s'
     )
     
-    # Create a dummy queue and stop event for testing
-    test_gui_q = queue.Queue()
+    # Create a GUI channel and stop event for testing
+    test_gui_q = GuiChannel()
     test_app_stop_signal = threading.Event()
 
     print("--- LMBuddyCoreEngine Test Script ---")
@@ -331,9 +736,7 @@ if __name__ == '__main__':
     engine_instance.clear_all_context_and_buffers()
     print(f"  History after clear: {engine_instance.context_history}")
     print("  Messages sent to GUI queue by clear_all_context_and_buffers:")
-    try:
-        while not test_gui_q.empty(): print(f"    Queue item: {test_gui_q.get_nowait()}")
-    except queue.Empty: pass
+    for queued_msg in test_gui_q.drain(): print(f"    Queue item: {queued_msg}")
 
 
     # Simulate a direct question (LLM call is threaded, results go to queue)
@@ -345,16 +748,14 @@ if __name__ == '__main__':
     start_time = time.time()
     llm_response_complete = False
     while time.time() - start_time < 5: # Wait up to 5 seconds for messages
-        try:
-            msg = test_gui_q.get(timeout=0.1)
+        if not test_gui_q.has_messages.wait(timeout=0.1):
+            continue # No message yet
+        for msg in test_gui_q.drain():
             print(f"    Queue item (Direct Q): {msg}")
             if msg is None: # Sentinel for end of LLM stream sequence
                 print("    End of LLM response sequence received for Direct Q.")
                 llm_response_complete = True
                 break
-            # test_gui_q.task_done() # Not strictly needed for this test loop
-        except queue.Empty:
-            pass # No message yet
         if llm_response_complete: break
     if not llm_response_complete: print("    Test timeout waiting for full LLM response sequence for Direct Q.")
 
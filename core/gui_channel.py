@@ -0,0 +1,79 @@
+# core/gui_channel.py
+"""
+Message channel from the CoreEngine (and its worker threads) to the GUI.
+
+Replaces a `queue.Queue` for GUI updates: producers append to a deque and the
+GUI drains everything that is pending in one call, when woken by `on_wakeup`.
+Consecutive LLM text chunks that the GUI has not picked up yet are merged into
+a single message, so a fast token stream costs the GUI one update per drain
+instead of one per token.
+"""
+import collections
+import threading
+import typing
+
+from . import message_types as mt
+
+class GuiChannel:
+    """
+    Thread-safe, batched GUI message channel.
+
+    Producers call `put()` (alias `post()`); the GUI thread calls `drain()`.
+    Messages are dicts with a "type" key (see message_types) or None, which
+    marks the end of an LLM request sequence.
+    """
+    def __init__(self, maxlen: int = 4096):
+        """
+        Args:
+            maxlen (int): Upper bound on pending messages. When exceeded, the oldest
+                          pending messages are dropped (the GUI is not keeping up).
+        """
+        self._pending: typing.Deque[typing.Optional[dict]] = collections.deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.has_messages = threading.Event()
+        """Set while messages are pending; lets a consumer skip empty drains cheaply."""
+        self.on_wakeup: typing.Optional[typing.Callable[[], None]] = None
+        """Called (on the producer's thread) when a message arrives in an empty channel, so the
+        consumer can schedule a drain instead of polling. Exceptions are ignored."""
+
+    def put(self, message: typing.Optional[dict]):
+        """
+        Posts a message for the GUI. A text chunk that directly follows another,
+        not yet drained, chunk is merged into it.
+        """
+        with self._lock:
+            pending = self._pending
+            if (message is not None and message.get("type") == mt.MSG_TYPE_LLM_CHUNK
+                    and pending and pending[-1] is not None
+                    and pending[-1].get("type") == mt.MSG_TYPE_LLM_CHUNK):
+                merged = dict(pending[-1])
+                merged["content"] = merged.get("content", "") + message.get("content", "")
+                if "completion_tokens_live" in message:
+                    merged["completion_tokens_live"] = message["completion_tokens_live"]
+                pending[-1] = merged
+                return
+            was_empty = not pending
+            pending.append(message)
+            self.has_messages.set()
+        on_wakeup = self.on_wakeup
+        if was_empty and on_wakeup is not None:
+            try:
+                on_wakeup()
+            except Exception: # e.g. the GUI is already gone; the consumer's own polling still applies
+                pass
+
+    post = put
+
+    def drain(self) -> typing.List[typing.Optional[dict]]:
+        """Returns all pending messages in order and empties the channel (GUI thread)."""
+        with self._lock:
+            if not self._pending:
+                return []
+            messages = list(self._pending)
+            self._pending.clear()
+            self.has_messages.clear()
+        return messages
+
+    def empty(self) -> bool:
+        """True if no messages are pending."""
+        return not self._pending
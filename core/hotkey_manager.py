@@ -6,10 +6,16 @@ This module uses the 'keyboard' library to listen for a specific hotkey
 combination defined in the application's configuration. When the hotkey
 is pressed, a registered callback function is executed.
 
-The listener runs in a separate daemon thread to avoid blocking the main
-application. It also includes a debounce mechanism to prevent multiple
-triggers from a single long key press.
+The hotkey is registered as an OS keyboard hook (`keyboard.add_hotkey`), so
+nothing runs while no key is pressed and no listener thread of our own is
+needed; presses arrive on the keyboard library's hook thread. The hook is the
+platform's native mechanism: a low-level WH_KEYBOARD_LL hook on Windows,
+/dev/input events on Linux and a Quartz event tap on macOS. If the hook
+cannot be installed, a polling listener thread is used instead. A debounce
+mechanism prevents multiple triggers from a single long key press.
 """
+import queue
+import sys
 import threading
 import time
 import keyboard # type: ignore # Assuming 'keyboard' might not have perfect stubs
@@ -19,6 +25,23 @@ import typing # For type hinting
 # Relative import for configuration access
 from . import config_manager
 
+logger = logging.getLogger(__name__)
+
+_CALLBACK_QUEUE_SIZE = 4 # Room for a pending press plus the stop sentinel
+_STOP_SENTINEL = object() # Ends the callback worker thread
+
+# Listener errors that mean the keyboard backend is unusable (permissions/backend issue)
+_FATAL_ERROR_TYPES: typing.Tuple[type, ...] = (ImportError,)
+_FATAL_ERROR_MARKERS: typing.Tuple[str, ...] = ("hook", "permissions")
+_ERROR_LOG_EVERY = 20 # After the first error, log only every Nth repeated listener error
+
+def _is_fatal_listener_error(error: Exception) -> bool:
+    """True if a listener error means the keyboard backend cannot work at all."""
+    if isinstance(error, _FATAL_ERROR_TYPES):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _FATAL_ERROR_MARKERS)
+
 class HotkeyManager:
     """
     Manages the lifecycle of a global hotkey listener.
@@ -42,83 +65,177 @@ class HotkeyManager:
         self.app_stop_event = app_stop_event
         
         self._listener_thread: typing.Optional[threading.Thread] = None
+        """Polling fallback thread; unused while the keyboard hook is installed."""
+        self._listener_stop_event = threading.Event() # Stops only the polling thread (app keeps running)
+        self._listener_exited = threading.Event()     # Set by the polling thread when it has finished
+        self._hook_handle: typing.Any = None # Handle returned by keyboard.add_hotkey while hooked
         self._hotkey_str: typing.Optional[str] = None # Loaded from config
         self._is_valid_hotkey: bool = False # Flag to indicate if current _hotkey_str is valid
+        self._parsed_hotkey: typing.Any = None # keyboard.parse_hotkey() result, so polling never re-parses
+
+        # Debounce parameters to prevent multiple triggers for a single press. This is the only
+        # debounce; the engine just drops presses while a capture is still running.
+        self._debounce_time: float = 0.05  # Seconds; from 'hotkey_debounce_seconds' (see load_hotkey_from_config)
+        self._debounce_ns: int = 50_000_000 # _debounce_time in nanoseconds
+        self._last_pressed_ns: int = 0 # time.monotonic_ns() of the last accepted press
+        self._fire_lock = threading.Lock() # Makes check-and-update of _last_pressed_ns atomic across hook callbacks
 
-        # Debounce parameters to prevent multiple triggers for a single press
-        self._debounce_time: float = 1.2  # Seconds
-        self._last_pressed_time: float = 0.0
+        # Adaptive poll interval for the polling fallback: fast right after a press, backing off while idle
+        self._min_poll_interval: float = 0.005 # Seconds
+        self._max_poll_interval: float = 0.1   # Seconds
 
+        # One long-lived thread runs the callback for every press instead of a new thread per press.
+        self._callback_queue: queue.Queue = queue.Queue(maxsize=_CALLBACK_QUEUE_SIZE)
+        self._callback_sem = threading.BoundedSemaphore(1)
+        """Held from dispatch until the callback returns: at most one press is pending or running."""
+        self._callback_worker_thread = threading.Thread(target=self._callback_worker, name="HotkeyCallbackThread", daemon=True)
+        self._callback_worker_thread.start()
+
+        self._config_dirty: bool = True
+        """Set when the hotkey config may have changed since the last load_hotkey_from_config()."""
         self.load_hotkey_from_config() # Initial load and validation
 
     def load_hotkey_from_config(self) -> typing.Optional[str]:
         """
-        Loads the hotkey string from the application configuration and validates it.
-        Updates internal state `_hotkey_str` and `_is_valid_hotkey`.
+        Loads the hotkey string (and the debounce time) from the application configuration
+        and validates it. Updates internal state `_hotkey_str` and `_is_valid_hotkey`.
 
         Returns:
             str or None: The loaded and validated hotkey string, or None if invalid.
         """
-        self._hotkey_str = config_manager.get_config_value('hotkey', 'ctrl+shift+f')
+        self._config_dirty = False
+        hotkey_in_config = config_manager.get_config_value('hotkey', 'ctrl+shift+f')
+        try:
+            self._debounce_time = max(0.0, float(config_manager.get_config_value('hotkey_debounce_seconds', 0.05)))
+        except (TypeError, ValueError):
+            logger.warning("HOTKEY_MANAGER: Invalid 'hotkey_debounce_seconds' in configuration. Using 0.05 s.")
+            self._debounce_time = 0.05
+        self._debounce_ns = int(self._debounce_time * 1e9)
+
+        if self._is_valid_hotkey and hotkey_in_config == self._hotkey_str:
+            return self._hotkey_str # Unchanged: keep the parsed form, skip re-parsing and logging
+
+        self._hotkey_str = hotkey_in_config
         self._is_valid_hotkey = False # Assume invalid until successfully parsed
+        self._parsed_hotkey = None
         
         if not self._hotkey_str or not isinstance(self._hotkey_str, str):
-            logging.error("HOTKEY_MANAGER: Hotkey string is missing or not a string in configuration.")
+            logger.error("HOTKEY_MANAGER: Hotkey string is missing or not a string in configuration.")
             self._hotkey_str = None # Ensure it's None if invalid type
             return None
 
         try:
-            keyboard.parse_hotkey(self._hotkey_str) # Validate the hotkey string format
+            self._parsed_hotkey = keyboard.parse_hotkey(self._hotkey_str) # Validate the hotkey string format
             self._is_valid_hotkey = True
-            logging.info(f"HOTKEY_MANAGER: Hotkey loaded and validated: '{self._hotkey_str}'")
+            logger.info(f"HOTKEY_MANAGER: Hotkey loaded and validated: '{self._hotkey_str}'")
         except ValueError as e:
-            logging.error(f"HOTKEY_MANAGER: Invalid hotkey string '{self._hotkey_str}' in configuration: {e}. Listener will not function correctly.")
+            logger.error(f"HOTKEY_MANAGER: Invalid hotkey string '{self._hotkey_str}' in configuration: {e}. Listener will not function correctly.")
             self._hotkey_str = None # Mark as None to prevent listener from using invalid key
         return self._hotkey_str
 
+    def _on_hotkey(self):
+        """
+        Handles one detected hotkey press (from the keyboard hook or the polling fallback):
+        applies the debounce and dispatches the callback.
+        """
+        if self.app_stop_event.is_set(): # Shutting down; the hook is about to be removed
+            return
+        now_ns = time.monotonic_ns() # Immune to wall-clock jumps, no float rounding
+        with self._fire_lock:
+            if now_ns - self._last_pressed_ns <= self._debounce_ns:
+                return
+            self._last_pressed_ns = now_ns
+        logger.info("HOTKEY_MANAGER: Hotkey '%s' detected.", self._hotkey_str) # Formatted only if INFO is enabled
+
+        # Hand the callback to the callback worker, so the keyboard hook/listener never blocks on it.
+        if not self._callback_sem.acquire(blocking=False):
+            logger.debug("HOTKEY_MANAGER: Callback is still busy with an earlier press. Dropping this press.")
+            return
+        try:
+            self._callback_queue.put_nowait(True)
+        except queue.Full:
+            self._callback_sem.release()
+            logger.debug("HOTKEY_MANAGER: Callback queue is full. Dropping this press.")
+
+    def _callback_worker(self):
+        """Runs the hotkey callback once per queued press until the stop sentinel arrives."""
+        while True:
+            item = self._callback_queue.get()
+            if item is _STOP_SENTINEL or self.app_stop_event.is_set():
+                break
+            try:
+                self.hotkey_callback()
+            except Exception as e_cb:
+                logger.error(f"HOTKEY_MANAGER: Error executing hotkey callback: {e_cb}", exc_info=True)
+            finally:
+                self._callback_sem.release()
+
+    def _is_listening(self) -> bool:
+        """True while the keyboard hook is installed or the polling thread is running."""
+        return self._hook_handle is not None or bool(self._listener_thread and self._listener_thread.is_alive())
+
+    def _remove_hook(self):
+        """Unregisters the keyboard hook, if one is installed."""
+        if self._hook_handle is None:
+            return
+        try:
+            keyboard.remove_hotkey(self._hook_handle)
+        except (KeyError, ValueError) as e: # Already removed
+            logger.debug(f"HOTKEY_MANAGER: Hotkey hook was already removed: {e}")
+        self._hook_handle = None
+
     def _listener_worker(self):
         """
-        The worker function for the hotkey listener thread.
-        Continuously checks if the configured hotkey is pressed until
-        the `app_stop_event` is set.
+        Polling fallback for the hotkey listener thread, used when the keyboard hook
+        cannot be installed. Continuously checks if the configured hotkey is pressed
+        until `stop_listener` sets `_listener_stop_event` or the `app_stop_event` is set.
+        Sets `_listener_exited` when it returns.
         """
+        try:
+            self._poll_hotkey()
+        finally:
+            self._listener_exited.set()
+
+    def _poll_hotkey(self):
+        """The polling loop of `_listener_worker`."""
         if not self._is_valid_hotkey or not self._hotkey_str:
-            logging.error("HOTKEY_MANAGER: Listener thread cannot start, no valid hotkey is configured.")
+            logger.error("HOTKEY_MANAGER: Listener thread cannot start, no valid hotkey is configured.")
             return
 
-        logging.info(f"HOTKEY_MANAGER: Listener thread started for hotkey '{self._hotkey_str}'. Monitoring stop event.")
-        while not self.app_stop_event.is_set():
+        logger.info(f"HOTKEY_MANAGER: Polling listener thread started for hotkey '{self._hotkey_str}'. Monitoring stop event.")
+        # Locals for the hot loop; is_pressed() accepts the pre-parsed hotkey as-is.
+        is_pressed = keyboard.is_pressed
+        parsed = self._parsed_hotkey
+        min_wait, max_wait = self._min_poll_interval, self._max_poll_interval
+        poll_wait = max_wait
+        stop_wait = self._listener_stop_event.wait
+        app_stopped = self.app_stop_event.is_set
+        error_count = 0
+        # The listener's own stop event is checked by the wait that paces the loop.
+        while True:
             try:
-                if keyboard.is_pressed(self._hotkey_str):
-                    current_time = time.time()
-                    if current_time - self._last_pressed_time > self._debounce_time:
-                        self._last_pressed_time = current_time
-                        logging.info(f"HOTKEY_MANAGER: Hotkey '{self._hotkey_str}' detected.")
-                        
-                        # Execute the callback
-                        if self.hotkey_callback:
-                            try:
-                                # It's generally safer to run the callback in its own thread
-                                # if it might perform blocking operations (like GUI updates or file I/O).
-                                # The callback itself should be designed to handle this (e.g., put tasks on a queue).
-                                callback_thread = threading.Thread(target=self.hotkey_callback, daemon=True)
-                                callback_thread.start()
-                            except Exception as e_cb:
-                                logging.error(f"HOTKEY_MANAGER: Error executing hotkey callback: {e_cb}", exc_info=True)
+                if is_pressed(parsed):
+                    self._on_hotkey()
+                    poll_wait = min_wait # User is active: poll fast for a while
+                else:
+                    poll_wait = min(poll_wait * 1.2, max_wait) # Back off exponentially while idle
                 
-                # Adjust sleep time for responsiveness vs CPU usage.
-                # 0.05 seconds = 20 checks per second.
-                time.sleep(0.05)
+                # Unlike sleep(), the wait ends as soon as stop_listener() is called.
+                if stop_wait(timeout=poll_wait) or app_stopped():
+                    break
             except Exception as e: 
-                logging.error(f"HOTKEY_MANAGER: Error in listener worker loop for '{self._hotkey_str}': {e}", exc_info=True)
+                error_count += 1
+                if error_count == 1 or error_count % _ERROR_LOG_EVERY == 0: # Don't flood the log in an error loop
+                    logger.error(f"HOTKEY_MANAGER: Error in listener worker loop for '{self._hotkey_str}' (occurrence {error_count}): {e}", exc_info=error_count == 1)
                 # Handle critical errors that might require stopping the listener
-                if isinstance(e, ImportError) or "hook" in str(e).lower() or "permissions" in str(e).lower():
-                    logging.critical("HOTKEY_MANAGER: Critical error in keyboard library (permissions/backend issue?). Stopping listener thread.")
+                if _is_fatal_listener_error(e):
+                    logger.critical("HOTKEY_MANAGER: Critical error in keyboard library (permissions/backend issue?). Stopping listener thread.")
                     # Optionally, could try to inform the main app via a status update if a mechanism exists.
                     break # Exit the loop, effectively stopping this listener thread.
-                time.sleep(1) # Wait a bit before continuing after a non-critical error.
+                if stop_wait(timeout=1.0) or app_stopped(): # Wait a bit before continuing after a non-critical error.
+                    break
         
-        logging.info(f"HOTKEY_MANAGER: Listener thread for '{self._hotkey_str}' has been stopped.")
+        logger.info(f"HOTKEY_MANAGER: Listener thread for '{self._hotkey_str}' has been stopped.")
 
     def start_listener(self) -> bool:
         """
@@ -128,82 +245,119 @@ class HotkeyManager:
             bool: True if the listener was started or is already running, False otherwise.
         """
         if not self._is_valid_hotkey or not self._hotkey_str:
-            logging.warning("HOTKEY_MANAGER: Cannot start listener, no valid hotkey configured.")
+            logger.warning("HOTKEY_MANAGER: Cannot start listener, no valid hotkey configured.")
             return False
             
-        if self._listener_thread and self._listener_thread.is_alive():
-            logging.info("HOTKEY_MANAGER: Listener thread is already running.")
+        if self._is_listening():
+            logger.info("HOTKEY_MANAGER: Listener is already running.")
             return True
 
-        # Ensure the latest hotkey from config is used, in case it changed
-        # and start_listener is called again (e.g., by the engine).
-        current_hotkey_in_config = self.load_hotkey_from_config()
-        if not self._is_valid_hotkey or not current_hotkey_in_config:
-            logging.error("HOTKEY_MANAGER: Cannot start listener, hotkey became invalid or missing after config reload.")
-            return False
+        # Ensure the latest hotkey from config is used if it may have changed since it was
+        # last loaded; on the usual single start at boot, __init__ has just loaded it.
+        if self._config_dirty:
+            current_hotkey_in_config = self.load_hotkey_from_config()
+            if not self._is_valid_hotkey or not current_hotkey_in_config:
+                logger.error("HOTKEY_MANAGER: Cannot start listener, hotkey became invalid or missing after config reload.")
+                return False
 
+        # Prefer an event-driven OS hook; fall back to a polling thread if it cannot be installed.
+        try:
+            self._hook_handle = keyboard.add_hotkey(self._hotkey_str, self._on_hotkey, suppress=False, trigger_on_release=False)
+            logger.info(f"HOTKEY_MANAGER: Hotkey hook successfully installed for '{self._hotkey_str}'.")
+            return True
+        except Exception as e_hook: # e.g. missing permissions or unsupported backend
+            logger.warning(f"HOTKEY_MANAGER: Could not install keyboard hook for '{self._hotkey_str}' on {sys.platform} ({e_hook}). Falling back to polling.")
+            self._hook_handle = None
+
+        self._listener_stop_event.clear()
+        self._listener_exited.clear()
         self._listener_thread = threading.Thread(target=self._listener_worker, daemon=True)
         self._listener_thread.name = f"HotkeyListenerThread-{self._hotkey_str}" # Assign a name for easier debugging
         try:
             self._listener_thread.start()
-            logging.info(f"HOTKEY_MANAGER: Listener thread successfully started for '{self._hotkey_str}'.")
+            logger.info(f"HOTKEY_MANAGER: Listener thread successfully started for '{self._hotkey_str}'.")
             return True
         except Exception as e_start:
-            logging.error(f"HOTKEY_MANAGER: Failed to start listener thread: {e_start}", exc_info=True)
+            logger.error(f"HOTKEY_MANAGER: Failed to start listener thread: {e_start}", exc_info=True)
             self._listener_thread = None
             return False
 
     def stop_listener(self):
         """
-        Signals the listener thread to stop (by relying on the external `app_stop_event`)
-        and waits for it to join. This method is typically called during application shutdown.
+        Removes the keyboard hook, or, for the polling fallback, signals the listener thread
+        to stop and waits until it has exited. This method is typically called during
+        application shutdown, but also works while the application keeps running.
         """
-        logging.info("HOTKEY_MANAGER: stop_listener called. Listener termination relies on app_stop_event.")
+        logger.info("HOTKEY_MANAGER: stop_listener called.")
+        if self._hook_handle is not None:
+            self._remove_hook()
+            logger.info(f"HOTKEY_MANAGER: Hotkey hook for '{self._hotkey_str}' has been removed.")
         if self._listener_thread and self._listener_thread.is_alive():
-            # The app_stop_event should be set externally to signal shutdown.
-            # This join is to ensure this manager waits for its thread.
-            self._listener_thread.join(timeout=1.0) 
-            if self._listener_thread.is_alive():
-                logging.warning("HOTKEY_MANAGER: Listener thread did not terminate within timeout after app_stop_event was expected to be set.")
+            self._listener_stop_event.set()
+            # The worker sets _listener_exited in a finally block; the timeout only guards
+            # against a keyboard call that never returns.
+            if self._listener_exited.wait(timeout=2.0):
+                self._listener_thread.join()
+                logger.info("HOTKEY_MANAGER: Listener thread joined successfully.")
             else:
-                logging.info("HOTKEY_MANAGER: Listener thread joined successfully.")
+                logger.warning("HOTKEY_MANAGER: Listener thread did not exit within 2 s after being signalled to stop.")
         else:
-            logging.debug("HOTKEY_MANAGER: No active listener thread to stop/join.")
+            logger.debug("HOTKEY_MANAGER: No active listener thread to stop/join.")
         self._listener_thread = None # Clear the reference
+        self._config_dirty = True # The config may change before the next start_listener()
+
+        if self.app_stop_event.is_set():
+            # Shutting down: also end the callback worker (the queue may be full, so make room first).
+            try:
+                while True:
+                    self._callback_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._callback_queue.put_nowait(_STOP_SENTINEL)
+            except queue.Full: # A press slipped in; the worker still sees app_stop_event and exits
+                pass
+            self._callback_worker_thread.join(timeout=1.0)
 
     def update_hotkey_from_config(self) -> typing.Optional[str]:
         """
-        Reloads the hotkey from configuration.
-        
-        Note: This method currently DOES NOT restart the listener thread with the new hotkey
-        if it's already running. The running listener will continue with the old hotkey.
-        A full application restart or a more sophisticated stop/start mechanism for the
-        listener thread itself would be required for dynamic hotkey changes without restart.
-        This method primarily updates the internal `_hotkey_str` for future `start_listener` calls.
+        Reloads the hotkey from configuration and applies it to a running listener.
+
+        With the keyboard hook, the new hotkey is hooked before the old one is removed, so
+        there is no moment without an active hotkey. The polling fallback thread is stopped
+        and restarted with the new hotkey.
 
         Returns:
             str or None: The newly loaded hotkey string, or None if invalid.
         """
-        logging.info("HOTKEY_MANAGER: Updating hotkey from configuration.")
-        is_currently_running = self._listener_thread and self._listener_thread.is_alive()
+        logger.info("HOTKEY_MANAGER: Updating hotkey from configuration.")
+        is_currently_running = self._is_listening()
         
         old_hotkey = self._hotkey_str
         new_hotkey = self.load_hotkey_from_config() # This updates self._hotkey_str and self._is_valid_hotkey
 
-        if is_currently_running and old_hotkey != new_hotkey:
-            logging.warning(
-                f"HOTKEY_MANAGER: Hotkey configuration changed from '{old_hotkey}' to '{new_hotkey}'. "
-                "The currently active listener is still using the old hotkey. "
-                "A full application restart is recommended for the new hotkey to take effect."
-            )
-            # To truly update dynamically:
-            # 1. Need a dedicated stop event for just the listener thread.
-            # 2. Signal that event here.
-            # 3. Join the old thread.
-            # 4. Call self.start_listener() to start a new thread with the new hotkey.
-            # This adds complexity, so deferred for now.
-        elif not is_currently_running and self._is_valid_hotkey:
-             logging.info(f"HOTKEY_MANAGER: Hotkey updated to '{new_hotkey}'. Listener is not running; will use new key on next start.")
+        if not is_currently_running:
+            if self._is_valid_hotkey:
+                logger.info(f"HOTKEY_MANAGER: Hotkey updated to '{new_hotkey}'. Listener is not running; will use new key on next start.")
+        elif not new_hotkey:
+            logger.warning(f"HOTKEY_MANAGER: New hotkey configuration is invalid. The listener keeps using '{old_hotkey}'.")
+        elif new_hotkey != old_hotkey:
+            if self._hook_handle is not None:
+                try:
+                    new_handle = keyboard.add_hotkey(new_hotkey, self._on_hotkey, suppress=False, trigger_on_release=False)
+                except Exception as e_hook:
+                    logger.error(f"HOTKEY_MANAGER: Could not hook new hotkey '{new_hotkey}' ({e_hook}). The listener keeps using '{old_hotkey}'.")
+                    self._hotkey_str = old_hotkey # Reflect the hotkey that is actually hooked
+                    self._config_dirty = True     # Retry the configured hotkey on the next start
+                    return None
+                self._remove_hook()
+                self._hook_handle = new_handle
+            else:
+                self.stop_listener()
+                if not self.start_listener():
+                    logger.error(f"HOTKEY_MANAGER: Could not restart the listener with new hotkey '{new_hotkey}'.")
+                    return None
+            logger.info(f"HOTKEY_MANAGER: Listener now uses hotkey '{new_hotkey}' (was '{old_hotkey}').")
         
         return new_hotkey
 
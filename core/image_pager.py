@@ -0,0 +1,79 @@
+# core/image_pager.py
+"""
+Disk-backed storage for screenshots referenced by older conversation turns.
+
+Full-size screenshots are several megabytes each in memory. Once a turn is no
+longer among the most recent ones, the engine pages its image out to a
+temporary directory and keeps only a small `ImageRef` in the history; the
+image is loaded back lazily when it is needed again (history viewer, prompt
+rebuild).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import typing
+
+from PIL import Image
+
+class ImageRef:
+    """Lightweight stand-in for a paged-out PIL image."""
+    __slots__ = ("page_id", "path", "size")
+
+    def __init__(self, page_id: str, path: str, size: typing.Tuple[int, int]):
+        self.page_id = page_id
+        self.path = path
+        self.size = size # Original (width, height), available without loading
+
+    def resolve(self) -> typing.Optional[Image.Image]:
+        """Loads the image from disk. Returns None if the page file is gone."""
+        try:
+            with Image.open(self.path) as img:
+                img.load()
+                return img
+        except (OSError, ValueError) as e:
+            logging.warning(f"IMAGE_PAGER: Could not load paged image '{self.page_id}': {e}")
+            return None
+
+    def __repr__(self) -> str:
+        return f"ImageRef({self.page_id[:12]}, {self.size[0]}x{self.size[1]})"
+
+def resolve_image(image_or_ref: typing.Union[Image.Image, ImageRef, None]) -> typing.Optional[Image.Image]:
+    """Returns a PIL image for either a PIL image, an ImageRef or None."""
+    if isinstance(image_or_ref, ImageRef):
+        return image_or_ref.resolve()
+    return image_or_ref
+
+class ImagePager:
+    """Writes images to a private temporary directory and hands out `ImageRef`s."""
+    def __init__(self):
+        self._dir: typing.Optional[str] = None # Created lazily on first page-out
+        self._lock = threading.Lock()
+
+    def page_out(self, image: Image.Image) -> ImageRef:
+        """
+        Stores `image` on disk (lossless WEBP, falling back to PNG) and returns a reference to it.
+        Identical images share one page file.
+        """
+        page_id = hashlib.sha1(image.tobytes()).hexdigest()
+        with self._lock:
+            if self._dir is None:
+                self._dir = tempfile.mkdtemp(prefix="lmbuddy_images_")
+            path = os.path.join(self._dir, f"{page_id}.webp")
+            if not os.path.exists(path):
+                try:
+                    image.save(path, "WEBP", lossless=True)
+                except (OSError, ValueError, KeyError): # No WEBP support in this Pillow build
+                    path = os.path.join(self._dir, f"{page_id}.png")
+                    if not os.path.exists(path):
+                        image.save(path, "PNG")
+        return ImageRef(page_id, path, image.size)
+
+    def clear(self):
+        """Deletes all paged images."""
+        with self._lock:
+            if self._dir is not None:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir = None
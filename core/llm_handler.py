@@ -14,20 +14,41 @@ This module is responsible for:
 """
 import logging
 import json
+import queue
 import requests
+from requests.adapters import HTTPAdapter
 import base64
 from io import BytesIO
 from PIL import Image # For image type hinting and conversion
 import threading      # For threading.Event type hint
-import queue          # For queue.Queue type hint
+import time
 import typing         # For extensive type hinting
 
 # Relative imports from the same 'core' package
 from . import config_manager
 from . import message_types as mt 
+from .image_pager import resolve_image
+from .gui_channel import GuiChannel # For type hinting the GUI message channel
+
+try:
+    import orjson # type: ignore
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# JSON codec for request bodies and stream events. Both accept/produce UTF-8 bytes;
+# orjson is several times faster on the many small payloads of a token stream.
+if ORJSON_AVAILABLE:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+    def _json_dumps(obj: typing.Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
 # --- Tokenizer Setup ---
 _llm_tokenizer_instance: typing.Optional[typing.Any] = None # Holds the loaded tokenizer
+_tokenizer_init_lock = threading.Lock() # Lets concurrent first users wait for one load instead of loading twice
 TRANSFORMERS_AVAILABLE: bool = False # Flag indicating if 'transformers' library is installed
 
 try:
@@ -53,12 +74,15 @@ def initialize_tokenizer() -> bool:
               initialized, False otherwise (e.g., 'transformers' not found or
               model loading failed).
     """
-    global _llm_tokenizer_instance
     if not TRANSFORMERS_AVAILABLE:
         logging.warning("LLM_HANDLER: Cannot initialize tokenizer, 'transformers' library is unavailable.")
-        _llm_tokenizer_instance = None
         return False
-    
+    with _tokenizer_init_lock:
+        return _load_tokenizer_locked()
+
+def _load_tokenizer_locked() -> bool:
+    """Loads the configured tokenizer. Caller holds _tokenizer_init_lock."""
+    global _llm_tokenizer_instance
     if _llm_tokenizer_instance is not None:
         logging.debug("LLM_HANDLER: Tokenizer is already initialized.")
         return True
@@ -76,14 +100,55 @@ def initialize_tokenizer() -> bool:
     try:
         # trust_remote_code=True may be needed for some custom models from Hugging Face Hub
         assert AutoTokenizer is not None, "AutoTokenizer is None, should not happen if TRANSFORMERS_AVAILABLE is True"
-        _llm_tokenizer_instance = AutoTokenizer.from_pretrained(tokenizer_name_to_load, trust_remote_code=True)
-        logging.info(f"LLM_HANDLER: Successfully loaded tokenizer for '{tokenizer_name_to_load}'.")
+        # use_fast=True asks for the Rust implementation; models without one still get the Python tokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name_to_load, trust_remote_code=True, use_fast=True)
+        tokenizer.encode("warmup") # Triggers lazy internal setup now instead of on the first request
+        _llm_tokenizer_instance = tokenizer
+        with _token_len_cache_lock:
+            _token_len_cache.clear() # Cached counts belong to the previous tokenizer
+        is_fast = getattr(tokenizer, "is_fast", False)
+        logging.info(f"LLM_HANDLER: Successfully loaded tokenizer for '{tokenizer_name_to_load}' (fast: {is_fast}).")
+        if not is_fast:
+            logging.warning(f"LLM_HANDLER: No fast tokenizer available for '{tokenizer_name_to_load}'; token counting will be slower.")
         return True
     except Exception as e:
         logging.error(f"LLM_HANDLER: Error loading tokenizer for '{tokenizer_name_to_load}': {e}", exc_info=True)
         _llm_tokenizer_instance = None
         return False
 
+_TOKEN_LEN_CACHE_MAX = 10000 # Cleared entirely when full
+_token_len_cache: typing.Dict[str, int] = {}
+_token_len_cache_lock = threading.Lock()
+
+def _token_lengths(texts: typing.Sequence[str]) -> typing.List[int]:
+    """
+    Token counts of `texts` with the current tokenizer, memoized per string.
+    History turns, system prompts and common stream chunks repeat, so most lookups are hits.
+    Misses are counted in one call returning only lengths when the tokenizer is a fast (Rust) tokenizer.
+    The cache is cleared whenever a tokenizer is loaded (counts depend on the tokenizer).
+    """
+    tokenizer = _llm_tokenizer_instance
+    with _token_len_cache_lock:
+        misses = [t for t in dict.fromkeys(texts) if t not in _token_len_cache]
+        if not misses:
+            return [_token_len_cache[t] for t in texts]
+
+    if getattr(tokenizer, "is_fast", False):
+        # Only the lengths are needed: skip building attention masks and token type ids.
+        # Special tokens are added as encode() adds them, so counts match the slow path.
+        lengths = tokenizer(misses, return_length=True, return_attention_mask=False,
+                            return_token_type_ids=False)["length"]
+    else:
+        # Some tokenizers might return input_ids, others just a list of token IDs.
+        # Taking the length of the encoded output is generally reliable.
+        lengths = [len(tokenizer.encode(t)) for t in misses]
+
+    with _token_len_cache_lock:
+        if len(_token_len_cache) + len(misses) > _TOKEN_LEN_CACHE_MAX:
+            _token_len_cache.clear()
+        _token_len_cache.update(zip(misses, lengths))
+        return [_token_len_cache[t] for t in texts]
+
 def get_tokenizer() -> typing.Optional[typing.Any]:
     """
     Returns the current tokenizer instance. Initializes it if not already done.
@@ -110,10 +175,7 @@ def count_text_tokens(text_to_tokenize: str) -> int:
     tokenizer = get_tokenizer()
     if tokenizer and isinstance(text_to_tokenize, str):
         try:
-            # Some tokenizers might return input_ids, others just a list of token IDs.
-            # Taking the length of the encoded output is generally reliable.
-            encoded_output = tokenizer.encode(text_to_tokenize)
-            return len(encoded_output)
+            return _token_lengths((text_to_tokenize,))[0]
         except Exception as e:
             logging.error(f"LLM_HANDLER: Error tokenizing text with '{tokenizer.__class__.__name__}': {e}. Falling back to char count.")
             return len(text_to_tokenize) // 4 # Approximation
@@ -139,27 +201,75 @@ def count_tokens_for_api_messages(api_messages: typing.List[typing.Dict[str, typ
     """
     if not api_messages:
         return 0
-    total_tokens = 0
+    texts: typing.List[str] = []
+    append_text = texts.append # Hoisted; this loop runs over every part of the whole history
     for message in api_messages:
         content = message.get("content")
-        if isinstance(content, str):
-            total_tokens += count_text_tokens(content)
-        elif isinstance(content, list): # Handles multi-part content arrays
+        content_type = type(content)
+        if content_type is str:
+            append_text(content)
+        elif content_type is list: # Handles multi-part content arrays
             for part in content:
-                if isinstance(part, dict) and part.get("type") == "text" and isinstance(part.get("text"), str):
-                    total_tokens += count_text_tokens(part.get("text"))
+                # Exact type checks are cheaper than isinstance() for the plain dicts/strs used here
+                if type(part) is dict and part.get("type") == "text":
+                    text = part.get("text")
+                    if type(text) is str:
+                        append_text(text)
                 # Note: Image parts (type "image_url") are not token-counted here.
-    return total_tokens
+    if not texts:
+        return 0
+
+    tokenizer = get_tokenizer()
+    if tokenizer:
+        try:
+            return sum(_token_lengths(texts)) # One batched tokenizer call for all uncached texts
+        except Exception as e:
+            logging.error(f"LLM_HANDLER: Error tokenizing messages with '{tokenizer.__class__.__name__}': {e}. Falling back to char count.")
+    return sum(len(t) // 4 for t in texts) # Approximation
+
+JPEG_QUALITY_SEARCH_STEPS = 4 # Max re-encodes when shrinking an oversized JPEG to fit max_size_kb
+
+# torchvision's encode_jpeg (libjpeg-turbo with SIMD) is considerably faster than Pillow's
+# JPEG encoder. Looked up on first use rather than at import, since importing torch is slow.
+_torchvision_jpeg: typing.Optional[typing.Tuple[typing.Callable, typing.Callable]] = None
+_torchvision_jpeg_checked: bool = False
+
+def _get_torchvision_jpeg() -> typing.Optional[typing.Tuple[typing.Callable, typing.Callable]]:
+    """Returns (pil_to_tensor, encode_jpeg) if torchvision is installed, otherwise None."""
+    global _torchvision_jpeg, _torchvision_jpeg_checked
+    if not _torchvision_jpeg_checked:
+        try:
+            from torchvision.io import encode_jpeg # type: ignore
+            from torchvision.transforms.functional import pil_to_tensor # type: ignore
+            _torchvision_jpeg = (pil_to_tensor, encode_jpeg)
+            logging.debug("LLM_HANDLER: Using torchvision for JPEG encoding.")
+        except ImportError:
+            logging.debug("LLM_HANDLER: torchvision not available, using Pillow for JPEG encoding.")
+        _torchvision_jpeg_checked = True
+    return _torchvision_jpeg
+
+def _encode_jpeg(rgb_image: Image.Image, quality: int) -> bytes:
+    """Encodes an RGB image as JPEG, with torchvision if available and Pillow otherwise."""
+    torchvision_jpeg = _get_torchvision_jpeg()
+    if torchvision_jpeg is not None:
+        pil_to_tensor, encode_jpeg = torchvision_jpeg
+        try:
+            return encode_jpeg(pil_to_tensor(rgb_image), quality=quality).numpy().tobytes()
+        except Exception as e_tv:
+            logging.debug(f"LLM_HANDLER: torchvision JPEG encoding failed ({e_tv}), falling back to Pillow.")
+    with BytesIO() as output_buffer:
+        rgb_image.save(output_buffer, format="JPEG", quality=quality, optimize=True)
+        return output_buffer.getvalue()
 
 def convert_image_to_base64_str(pil_image: Image.Image, quality: int = 75, max_size_kb: int = 500) -> str:
     """
     Converts a PIL (Pillow) Image object to a base64 encoded data URL string.
 
-    It first attempts to save the image as JPEG for better compression of
-    photographic images. If the image has an alpha channel or JPEG conversion fails,
-    it falls back to PNG.
-    If the image is JPEG and exceeds `max_size_kb`, its quality is iteratively
-    reduced until the size constraint is met or a minimum quality is reached.
+    Images whose longer edge exceeds the "vision_max_image_dim" setting are downscaled
+    first. Images with transparency are saved as PNG; everything else is saved as JPEG
+    for better compression of photographic images.
+    If the image is JPEG and exceeds `max_size_kb`, the highest quality (down to a
+    minimum of 10) that meets the size constraint is found by bisection.
 
     Args:
         pil_image (PIL.Image.Image): The image to convert.
@@ -174,47 +284,81 @@ def convert_image_to_base64_str(pil_image: Image.Image, quality: int = 75, max_s
         # Return a placeholder or raise error, depending on desired handling
         return "data:text/plain;base64,ZXJyb3I=" # "error" in base64
 
-    output_buffer = BytesIO()
-    is_jpeg = False
-    image_format_used = "PNG" # Default if JPEG fails
+    # Downscale before anything else: halving the edge quarters the encoder work and the payload,
+    # and vision models would shrink an oversized image on their side anyway.
+    max_dim = int(config_manager.get_config_value("vision_max_image_dim", 1568))
+    if max_dim > 0 and max(pil_image.size) > max_dim:
+        scale = max_dim / max(pil_image.size)
+        target_size = (max(1, round(pil_image.width * scale)), max(1, round(pil_image.height * scale)))
+        logging.debug(f"LLM_HANDLER: Downscaling image from {pil_image.size} to {target_size} before encoding.")
+        pil_image = pil_image.resize(target_size, Image.Resampling.LANCZOS)
+
+    # Decide the format up front instead of trying JPEG and recovering from an exception.
+    # Only real transparency goes to PNG; an RGBA screenshot with an opaque alpha is still JPEG.
+    mode = pil_image.mode
+    has_alpha = (mode == "P" and "transparency" in pil_image.info) or \
+                (mode in ("RGBA", "LA", "PA") and pil_image.getchannel("A").getextrema()[0] < 255)
+    is_jpeg = not has_alpha
 
-    try:
-        # Try JPEG first. Convert to RGB as JPEG doesn't support alpha.
-        rgb_image = pil_image.convert("RGB")
-        rgb_image.save(output_buffer, format="JPEG", quality=quality, optimize=True)
-        is_jpeg = True
+    if is_jpeg:
+        rgb_image = pil_image if mode == "RGB" else pil_image.convert("RGB") # No copy for the common RGB case
+        img_bytes = _encode_jpeg(rgb_image, quality)
         image_format_used = "JPEG"
         logging.debug(f"LLM_HANDLER: Image initially saved as JPEG with quality {quality}.")
-    except Exception as e_jpeg:
-        logging.warning(f"LLM_HANDLER: Could not save image as JPEG (e.g., due to alpha channel or other issue: {e_jpeg}). Falling back to PNG.")
-        output_buffer = BytesIO() # Reset buffer
+    else:
+        logging.debug("LLM_HANDLER: Image has transparency, saving as PNG.")
         try:
-            pil_image.save(output_buffer, format="PNG", optimize=True)
+            with BytesIO() as output_buffer:
+                pil_image.save(output_buffer, format="PNG", optimize=True)
+                img_bytes = output_buffer.getvalue()
             image_format_used = "PNG"
         except Exception as e_png:
-            logging.error(f"LLM_HANDLER: Failed to save image as PNG after JPEG failure: {e_png}", exc_info=True)
+            logging.error(f"LLM_HANDLER: Failed to save image as PNG: {e_png}", exc_info=True)
             return "data:text/plain;base64,ZXJyb3I=" # "error"
 
-    img_byte_size = output_buffer.tell()
+    img_byte_size = len(img_bytes)
     current_quality = quality # Only relevant if it was JPEG
 
-    # If JPEG and too large, try to reduce quality
-    if is_jpeg:
-        while img_byte_size > max_size_kb * 1024 and current_quality > 10:
-            current_quality -= 10 # Reduce quality by 10
-            output_buffer = BytesIO() # Reset buffer for new save attempt
+    # If JPEG and too large, search for the highest quality that fits. JPEG size grows
+    # monotonically with quality, so a few bisection steps replace a linear walk down.
+    max_size_bytes = max_size_kb * 1024
+    if is_jpeg and img_byte_size > max_size_bytes:
+        low, high = 10, quality - 1
+        best_fit: typing.Optional[typing.Tuple[bytes, int]] = None
+        smallest: typing.Optional[typing.Tuple[bytes, int]] = None # Fallback if nothing fits
+        # First guess scales quality with the size overshoot; bisection refines it.
+        probe = max(low, min(high, int(quality * max_size_bytes / img_byte_size)))
+        for _ in range(JPEG_QUALITY_SEARCH_STEPS):
+            if low > high:
+                break
             try:
-                # Ensure we use the RGB converted image for JPEG saving
-                rgb_image.save(output_buffer, format="JPEG", quality=current_quality, optimize=True)
-                img_byte_size = output_buffer.tell()
-                logging.debug(f"LLM_HANDLER: Image re-saved as JPEG. Size: {img_byte_size / 1024:.2f} KB, Quality: {current_quality}")
+                candidate = _encode_jpeg(rgb_image, probe)
             except Exception as e_reduce:
                 logging.error(f"LLM_HANDLER: Error during JPEG quality reduction: {e_reduce}. Using last successful version.")
                 break # Stop if reducing quality causes an error
+            logging.debug(f"LLM_HANDLER: Image re-saved as JPEG. Size: {len(candidate) / 1024:.2f} KB, Quality: {probe}")
+            if len(candidate) <= max_size_bytes:
+                best_fit = (candidate, probe)
+                low = probe + 1
+            else:
+                smallest = (candidate, probe)
+                high = probe - 1
+            probe = (low + high) // 2
+
+        if best_fit is None and low <= 10 <= high:
+            # Nothing fit yet; settle for the minimum quality.
+            try:
+                smallest = (_encode_jpeg(rgb_image, 10), 10)
+            except Exception as e_reduce:
+                logging.error(f"LLM_HANDLER: Error during JPEG quality reduction: {e_reduce}. Using last successful version.")
+        chosen = best_fit or smallest
+        if chosen is not None:
+            img_bytes, current_quality = chosen
+            img_byte_size = len(img_bytes)
     
     logging.info(f"LLM_HANDLER: Final image size for base64: {img_byte_size / 1024:.2f} KB, Format: {image_format_used}{f', Quality: {current_quality}' if is_jpeg and image_format_used == 'JPEG' else ''}")
     
-    base64_encoded_str = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
+    base64_encoded_str = base64.b64encode(img_bytes).decode('ascii') # Base64 output is pure ASCII
     
     # Determine mime type based on the format successfully used
     mime_type = f"image/{image_format_used.lower()}"
@@ -222,32 +366,249 @@ def convert_image_to_base64_str(pil_image: Image.Image, quality: int = 75, max_s
 
 
 # --- LLM Communication ---
+LIVE_TOKEN_COUNT_BATCH_CHARS = 256 # Streamed characters collected before the live completion count is re-tokenized
+GUI_CHUNK_FLUSH_CHARS = 64 # Streamed characters collected before they are posted to the GUI as one chunk
+GUI_CHUNK_FLUSH_INTERVAL = 0.016 # Seconds after which collected characters are posted regardless of size
+SSE_READ_CHUNK_SIZE = 4096 # Bytes read from the response socket per iteration of the stream loop
+SSE_READ_AHEAD = 64 # Stream events buffered between the socket reader thread and the parsing loop
+_READ_AHEAD_END = object() # Marks the end of a read-ahead stream
+HISTORY_SUMMARY_PROMPT: str = (
+    "Summarize the following conversation between a user and an AI assistant. "
+    "Keep all facts, decisions, names and open questions that later turns may refer to. "
+    "Be concise and write in the language of the conversation."
+)
+
+# Shared HTTP session so consecutive requests reuse the open TCP/TLS connection
+# to the LLM endpoint instead of reconnecting for every turn.
+_http_session = requests.Session()
+_http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+class _ProviderProfile(typing.NamedTuple):
+    """Request settings derived from the configuration, already coerced to their types."""
+    provider: str
+    url: typing.Optional[str]
+    headers: typing.Dict[str, str] # Shared; copy before modifying
+    timeout: int
+    model: typing.Any
+    temperature: float
+    max_tokens: int
+
+_provider_profile_cache: typing.Optional[typing.Tuple[int, _ProviderProfile]] = None # (config revision, profile)
+
+def _get_provider_profile() -> _ProviderProfile:
+    """Returns the request settings for the configured provider, rebuilt only when the configuration changed."""
+    global _provider_profile_cache
+    revision = config_manager.get_revision() # Read first: a change while building just forces another rebuild
+    cached = _provider_profile_cache
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+
+    provider, api_key, llm_endpoint_url, model, temperature, max_tokens, timeout = config_manager.get_many(
+        ("llm_provider", "llm_api_key", "llm_endpoint", "llm_model", "temperature", "max_tokens", "llm_request_timeout"))
+    request_headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+    # Provider-specific header/endpoint adjustments
+    if provider == "openai" and api_key:
+        request_headers["Authorization"] = f"Bearer {api_key}"
+        # OpenAI standard endpoint, but config might override if user wants to use a proxy
+        # if not llm_endpoint_url or "127.0.0.1" in llm_endpoint_url or "localhost" in llm_endpoint_url:
+        #    llm_endpoint_url = "https://api.openai.com/v1/chat/completions"
+    # Add elif blocks for other providers like "google_vertexai", "anthropic"
+
+    profile = _ProviderProfile(
+        provider=provider or "custom",
+        url=llm_endpoint_url,
+        headers=request_headers,
+        timeout=int(timeout if timeout is not None else 180),
+        model=model,
+        temperature=float(temperature if temperature is not None else 0.3),
+        max_tokens=int(max_tokens if max_tokens is not None else 4096)
+    )
+    _provider_profile_cache = (revision, profile)
+    return profile
+
+_system_prompt_cache: typing.Optional[typing.Tuple[int, str]] = None # (config revision, final system prompt)
+
+def get_system_prompt() -> str:
+    """Returns the effective system prompt (avatar override or global), recomputed only when the configuration changed."""
+    global _system_prompt_cache
+    revision = config_manager.get_revision()
+    cached = _system_prompt_cache
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    sys_prompt_global, sys_prompt_avatar = config_manager.get_many(("system_prompt_global", "avatar_system_prompt_override"))
+    sys_prompt_global = (sys_prompt_global or "").strip()
+    sys_prompt_avatar = (sys_prompt_avatar or "").strip()
+    final_system_prompt = sys_prompt_avatar if sys_prompt_avatar else sys_prompt_global
+    _system_prompt_cache = (revision, final_system_prompt)
+    return final_system_prompt
+
+def _get_request_target() -> typing.Tuple[str, typing.Dict[str, str]]:
+    """
+    Resolves the endpoint URL and HTTP headers for the configured provider.
+
+    Raises:
+        ValueError: If no endpoint URL is configured.
+    """
+    profile = _get_provider_profile()
+    if not profile.url:
+        raise ValueError(f"LLM endpoint URL is not configured for provider '{profile.provider}'.")
+    return profile.url, dict(profile.headers)
+
+def _iter_sse_data(response: requests.Response) -> typing.Iterator[bytes]:
+    """
+    Yields the payload of every `data:` line of a server-sent-events response as raw bytes.
+
+    Lines are split here on top of `iter_content()`, which is much cheaper than
+    `iter_lines()`; empty lines and keep-alive comments are skipped without decoding.
+    """
+    buffer = bytearray()
+    for blob in response.iter_content(chunk_size=SSE_READ_CHUNK_SIZE):
+        if not blob:
+            continue
+        buffer.extend(blob)
+        line_start = 0
+        while (line_end := buffer.find(b"\n", line_start)) != -1:
+            if buffer.startswith(b"data:", line_start):
+                yield bytes(buffer[line_start + 5:line_end]).strip()
+            line_start = line_end + 1
+        del buffer[:line_start]
+    if buffer.startswith(b"data:"): # Last event without a trailing newline
+        yield bytes(buffer[5:]).strip()
+
+def _read_ahead(items: typing.Iterator[bytes], depth: int = SSE_READ_AHEAD) -> typing.Iterator[bytes]:
+    """
+    Pulls `items` on a helper thread and yields them through a bounded queue, so the
+    socket keeps being drained while the caller parses and tokenizes. An exception
+    raised while reading is re-raised in the caller.
+    """
+    handoff: queue.Queue = queue.Queue(maxsize=depth)
+    abandoned = threading.Event() # Set when the caller stops consuming (break, error, cancel)
+
+    def _offer(item: typing.Any) -> bool:
+        while not abandoned.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _reader():
+        try:
+            for item in items:
+                if not _offer(item):
+                    return
+        except Exception as e:
+            _offer(e)
+            return
+        _offer(_READ_AHEAD_END)
+
+    threading.Thread(target=_reader, name="LLMStreamReader", daemon=True).start()
+    try:
+        while (item := handoff.get()) is not _READ_AHEAD_END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        abandoned.set()
+
+def _parse_stream_event(payload: bytes) -> typing.Tuple[typing.Optional[str], typing.Optional[typing.Dict[str, typing.Any]]]:
+    """
+    Extracts (content delta, usage stats) from one SSE data payload of a chat completion stream.
+    Either value is None if the event does not carry it.
+
+    Raises:
+        json.JSONDecodeError: If the payload is not valid JSON.
+    """
+    json_data = _json_loads(payload) # Parsed straight from bytes, no decode step
+    if type(json_data) is not dict:
+        return None, None
+    choices = json_data.get("choices")
+    content_chunk = choices[0].get("delta", {}).get("content") if choices else None
+    return content_chunk, json_data.get("usage")
+
+def history_content_to_text(content: typing.Union[str, list, None]) -> str:
+    """Returns the plain text of a history entry's content (string or list of API parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(p["text"] for p in content if isinstance(p, dict) and p.get("type") == "text" and p.get("text"))
+    return ""
+
+def summarize_conversation(history_entries: typing.Sequence[tuple]) -> typing.Optional[str]:
+    """
+    Condenses conversation turns into a short summary with a single, non-streaming LLM call.
+    Only the text of the turns is sent; images are not included.
+
+    Args:
+        history_entries: (role, content, pil_image) tuples, oldest first.
+
+    Returns:
+        str or None: The summary, or None if there was nothing to summarize or the request failed.
+    """
+    transcript = "\n\n".join(
+        f"{role.upper()}: {text}" for role, content, _ in history_entries
+        if (text := history_content_to_text(content).strip())
+    )
+    if not transcript:
+        return None
+
+    try:
+        profile = _get_provider_profile()
+        llm_endpoint_url, request_headers = _get_request_target()
+        request_payload = {
+            "model": profile.model,
+            "messages": [
+                {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+                {"role": "user", "content": transcript}
+            ],
+            "temperature": 0.0,
+            "max_tokens": int(config_manager.get_config_value("history_summary_max_tokens", 512)),
+            "stream": False
+        }
+        response = _http_session.post(
+            llm_endpoint_url, headers=request_headers, data=_json_dumps(request_payload),
+            timeout=profile.timeout
+        )
+        response.raise_for_status()
+        summary = response.json()["choices"][0]["message"]["content"]
+        return summary.strip() or None
+    except Exception as e:
+        logging.error(f"LLM_HANDLER: Could not summarize conversation history: {e}", exc_info=True)
+        return None
+
 def stream_llm_response(
         context_history: list,
         current_user_message_parts: list,
-        gui_queue: queue.Queue,
+        gui_queue: GuiChannel,
         stop_event: threading.Event,
         # Removed ocr_text_buffer_ref and last_image_buffer_ref
         is_direct_question: bool = False,
         specific_action: typing.Optional[str] = None,
         pil_image_obj: typing.Optional[Image.Image] = None, # Image for the current turn, to be stored in history
-        target_language: typing.Optional[str] = None
+        target_language: typing.Optional[str] = None,
+        api_payload_messages: typing.Optional[typing.List[typing.Dict[str, typing.Any]]] = None,
+        on_complete: typing.Optional[typing.Callable[[str, int, int, int], None]] = None,
+        on_history_append: typing.Optional[typing.Callable[[typing.List[tuple]], None]] = None,
+        prompt_token_count: typing.Optional[int] = None
     ):
     """
     Handles the entire process of forming a request, sending it to an LLM,
     and streaming the response back to the GUI via a queue.
 
-    It updates the `context_history` list (passed by reference) with the new
-    user message and the LLM's assistant response.
+    The new user message and the LLM's assistant response are recorded via
+    `on_history_append` if given, otherwise appended to `context_history`.
 
     Args:
-        context_history (list): A list of tuples representing the conversation.
+        context_history (list or tuple): The conversation so far (a list, or an immutable
+                                snapshot when `on_history_append` is used).
                                 Each tuple is (role, content_parts_or_string, pil_image_or_None).
-                                This list is modified by appending new turns.
         current_user_message_parts (list): A list of content parts for the current
                                            user message (e.g., text, image_url).
-        gui_queue (queue.Queue): The queue used to send messages (chunks, tokens,
-                                 errors, info) back to the GUI thread.
+        gui_queue (GuiChannel): The channel used to send messages (chunks, tokens,
+                                  errors, info) back to the GUI thread.
         stop_event (threading.Event): An event monitored to gracefully interrupt
                                       the streaming process if the application is shutting down.
         is_direct_question (bool): True if the query is a direct text question,
@@ -260,15 +621,36 @@ def stream_llm_response(
                                                    with the current user turn, if any. This is
                                                    stored in history for potential later display.
         target_language (str, optional): The target language code if the action is "translate".
+        api_payload_messages (list, optional): A complete, pre-assembled message list
+                                               (e.g. from `PromptAssembler.build`). If given,
+                                               it is sent as-is instead of being built here
+                                               from `context_history`.
+        on_complete (callable, optional): Called as `on_complete(full_response_text, prompt_tokens,
+                                          completion_tokens, total_tokens)` after a stream
+                                          finished successfully (not on errors or cancellation).
+        on_history_append (callable, optional): Receives the list of new (role, content, image)
+                                                turns to record. Lets the caller own all history
+                                                writes instead of this function mutating `context_history`.
+        prompt_token_count (int, optional): Precomputed text token count of the request (e.g. from
+                                            `PromptAssembler.count_prompt_tokens`). Avoids re-tokenizing
+                                            the whole history on every request.
     """
+    def _record_turns(turns: typing.List[tuple]):
+        if on_history_append is not None:
+            on_history_append(turns)
+        else:
+            context_history.extend(turns)
+
     # --- Special handling for "set_context_for_question" ---
-    # This action modifies context_history and informs GUI without a full LLM call.
+    # This action records the turn in the history and informs GUI without a full LLM call.
     if specific_action == "set_context_for_question":
         # The current_user_message_parts (containing context description, OCR, image URL)
         # and the pil_image_obj are added to history.
-        context_history.append(("user", current_user_message_parts, pil_image_obj if pil_image_obj else None))
         info_msg = "[Context set. Please type your question to the LLM.]"
-        context_history.append(("assistant", info_msg, None)) # Assistant turn is just an info message
+        _record_turns([
+            ("user", current_user_message_parts, pil_image_obj if pil_image_obj else None),
+            ("assistant", info_msg, None) # Assistant turn is just an info message
+        ])
         
         gui_queue.put({"type": mt.MSG_TYPE_INFO, "content": info_msg})
         # Calculate tokens for the context-setting message itself for UI display
@@ -284,51 +666,51 @@ def stream_llm_response(
         return
 
     # --- Construct API Payload (Messages for LLM) ---
-    api_payload_messages: typing.List[typing.Dict[str, typing.Any]] = []
-    
-    # System Prompt Handling
-    sys_prompt_global = config_manager.get_config_value("system_prompt_global", "").strip()
-    sys_prompt_avatar = config_manager.get_config_value("avatar_system_prompt_override", "").strip()
-    final_system_prompt = sys_prompt_avatar if sys_prompt_avatar else sys_prompt_global
-
-    # Determine if this is the start of a new logical conversation to include system prompt
-    is_new_logical_convo = not context_history or \
-                           (len(context_history) > 0 and isinstance(context_history[-1][1], str) and \
-                            context_history[-1][1].startswith("[")) # e.g., last was "[Context set...]"
-
-    if final_system_prompt and is_new_logical_convo:
-        api_payload_messages.append({"role": "system", "content": final_system_prompt})
-        logging.debug(f"LLM_HANDLER: Using system prompt: '{final_system_prompt[:100]}...'")
-
-    # Add existing conversation history to the payload
-    for role, hist_content_parts_or_str, hist_pil_image in context_history:
-        current_message_api_parts: typing.List[typing.Dict[str, typing.Any]] = []
-        if isinstance(hist_content_parts_or_str, list): # Content is already in API parts format
-            current_message_api_parts.extend(hist_content_parts_or_str)
-        elif isinstance(hist_content_parts_or_str, str): # Simple string content
-            current_message_api_parts.append({"type": "text", "text": hist_content_parts_or_str})
-        
-        # If there's a PIL image associated with this user history turn, add its base64 representation
-        # if not already present in hist_content_parts_or_str (e.g. from a vision call).
-        if role == "user" and hist_pil_image:
-            if not any(p.get("type") == "image_url" for p in current_message_api_parts):
-                base64_img_hist = convert_image_to_base64_str(hist_pil_image)
-                current_message_api_parts.append({"type": "image_url", "image_url": {"url": base64_img_hist}})
-        
-        if current_message_api_parts: # Only add if there's valid content
-            api_payload_messages.append({"role": role, "content": current_message_api_parts})
-
-    # Add the current user's message (already in parts format)
-    if current_user_message_parts:
-        api_payload_messages.append({"role": "user", "content": current_user_message_parts})
-    else:
+    if not current_user_message_parts:
         # This should ideally be caught by the caller (Engine)
         logging.error("LLM_HANDLER: stream_llm_response called with empty current_user_message_parts.")
         gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": "Internal error: No user message content to send."})
         gui_queue.put(None); return # Signal end of this failed sequence
 
+    if api_payload_messages is None:
+        api_payload_messages = []
+
+        # System Prompt Handling
+        final_system_prompt = get_system_prompt()
+
+        # Determine if this is the start of a new logical conversation to include system prompt
+        is_new_logical_convo = not context_history or \
+                               (len(context_history) > 0 and isinstance(context_history[-1][1], str) and \
+                                context_history[-1][1].startswith("[")) # e.g., last was "[Context set...]"
+
+        if final_system_prompt and is_new_logical_convo:
+            api_payload_messages.append({"role": "system", "content": final_system_prompt})
+            logging.debug(f"LLM_HANDLER: Using system prompt: '{final_system_prompt[:100]}...'")
+
+        # Add existing conversation history to the payload
+        for role, hist_content_parts_or_str, hist_pil_image in context_history:
+            current_message_api_parts: typing.List[typing.Dict[str, typing.Any]] = []
+            if isinstance(hist_content_parts_or_str, list): # Content is already in API parts format
+                current_message_api_parts.extend(hist_content_parts_or_str)
+            elif isinstance(hist_content_parts_or_str, str): # Simple string content
+                current_message_api_parts.append({"type": "text", "text": hist_content_parts_or_str})
+
+            # If there's a PIL image associated with this user history turn, add its base64 representation
+            # if not already present in hist_content_parts_or_str (e.g. from a vision call).
+            if role == "user" and hist_pil_image:
+                if not any(p.get("type") == "image_url" for p in current_message_api_parts):
+                    base64_img_hist = convert_image_to_base64_str(resolve_image(hist_pil_image))
+                    current_message_api_parts.append({"type": "image_url", "image_url": {"url": base64_img_hist}})
+
+            if current_message_api_parts: # Only add if there's valid content
+                api_payload_messages.append({"role": role, "content": current_message_api_parts})
+
+        # Add the current user's message (already in parts format)
+        api_payload_messages.append({"role": "user", "content": current_user_message_parts})
+
     # Calculate and send initial prompt token count to GUI
-    prompt_tokens = count_tokens_for_api_messages(api_payload_messages)
+    prompt_tokens = prompt_token_count if prompt_token_count is not None \
+        else count_tokens_for_api_messages(api_payload_messages)
     gui_queue.put({"type": mt.MSG_TYPE_LLM_PROMPT_TOKENS_UPDATE, "count": prompt_tokens})
     logging.debug(f"LLM_HANDLER: Sending {len(api_payload_messages)} messages to LLM. Prompt tokens: {prompt_tokens}.")
     if logging.getLogger().isEnabledFor(logging.DEBUG) and api_payload_messages:
@@ -338,82 +720,87 @@ def stream_llm_response(
     # --- Perform LLM API Call ---
     full_response_text = ""
     completion_tokens_calculated = 0
+    pending_chunk_chars = 0 # Streamed characters not yet run through the tokenizer
+    unsent_chunk_chars = 0 # Streamed characters not yet posted to the GUI
+    last_gui_post = time.monotonic()
     server_reported_total_tokens = 0 # For potential server-side token count in stream
+    profile: typing.Optional[_ProviderProfile] = None # Also read by the error handlers below
+    response: typing.Optional[requests.Response] = None # Closed in the finally block below
 
     try:
-        llm_model_name = config_manager.get_config_value("llm_model")
+        profile = _get_provider_profile() # Cached until the configuration changes
+        llm_model_name = profile.model
         request_payload = {
             "model": llm_model_name,
             "messages": api_payload_messages,
-            "temperature": float(config_manager.get_config_value("temperature", 0.3)),
-            "max_tokens": int(config_manager.get_config_value("max_tokens", 4096)),
+            "temperature": profile.temperature,
+            "max_tokens": profile.max_tokens,
             "stream": True
         }
         
-        request_headers = {"Content-Type": "application/json"}
-        provider = config_manager.get_config_value("llm_provider", "custom")
-        api_key = config_manager.get_config_value("llm_api_key", "")
-        llm_endpoint_url = config_manager.get_config_value("llm_endpoint")
-
-        # Provider-specific header/endpoint adjustments
-        if provider == "openai" and api_key:
-            request_headers["Authorization"] = f"Bearer {api_key}"
-            # OpenAI standard endpoint, but config might override if user wants to use a proxy
-            # if not llm_endpoint_url or "127.0.0.1" in llm_endpoint_url or "localhost" in llm_endpoint_url:
-            #    llm_endpoint_url = "https://api.openai.com/v1/chat/completions"
-        # Add elif blocks for other providers like "google_vertexai", "anthropic"
-        
-        if not llm_endpoint_url:
-            raise ValueError(f"LLM endpoint URL is not configured for provider '{provider}'.")
+        llm_endpoint_url, request_headers = _get_request_target()
 
         logging.info(f"LLM_HANDLER: Sending request to LLM at '{llm_endpoint_url}' for model '{llm_model_name}'.")
         
-        response = requests.post(
-            llm_endpoint_url, headers=request_headers, json=request_payload,
-            timeout=int(config_manager.get_config_value("llm_request_timeout", 180)),
+        response = _http_session.post(
+            llm_endpoint_url, headers=request_headers, data=_json_dumps(request_payload),
+            timeout=profile.timeout,
             stream=True
         )
         response.raise_for_status() # Raises HTTPError for bad responses (4XX or 5XX)
 
-        for line in response.iter_lines():
+        # Socket reads run ahead on their own thread while this loop parses and tokenizes
+        for sse_payload in _read_ahead(_iter_sse_data(response)):
             if stop_event.is_set(): # Check if application is trying to shut down
                 logging.info("LLM_HANDLER: LLM stream processing interrupted by application stop_event.")
                 break 
-            if line:
-                decoded_line = line.decode('utf-8')
-                if decoded_line.startswith("data: "):
-                    json_data_str = decoded_line[len("data: "):].strip()
-                    if json_data_str == "[DONE]":
-                        logging.debug("LLM_HANDLER: Stream [DONE] marker received.")
-                        break
-                    try:
-                        json_data = json.loads(json_data_str)
-                        if 'choices' in json_data and len(json_data['choices']) > 0:
-                            delta = json_data['choices'][0].get('delta', {})
-                            content_chunk = delta.get('content')
-                            if content_chunk: # Ensure there's actual content
-                                full_response_text += content_chunk
-                                chunk_tok_count = count_text_tokens(content_chunk)
-                                completion_tokens_calculated += chunk_tok_count
-                                gui_queue.put({
-                                    "type": mt.MSG_TYPE_LLM_CHUNK,
-                                    "content": content_chunk,
-                                    "completion_tokens_live": completion_tokens_calculated
-                                })
-                        # Some streaming APIs might include 'usage' data in non-delta messages or final message
-                        if 'usage' in json_data:
-                             usage_stats = json_data.get("usage", {})
-                             current_server_total = usage_stats.get("total_tokens", 0)
-                             if current_server_total > server_reported_total_tokens: # Keep the highest value seen
-                                 server_reported_total_tokens = current_server_total
-                             logging.debug(f"LLM_HANDLER: Mid-stream server usage stats: {usage_stats}")
-                    except json.JSONDecodeError:
-                        logging.warning(f"LLM_HANDLER: Could not decode JSON from stream data: '{json_data_str}'")
+            if sse_payload:
+                if sse_payload == b"[DONE]":
+                    logging.debug("LLM_HANDLER: Stream [DONE] marker received.")
+                    break
+                try:
+                    content_chunk, usage_stats = _parse_stream_event(sse_payload)
+                    if content_chunk: # Ensure there's actual content
+                        full_response_text += content_chunk
+                        pending_chunk_chars += len(content_chunk)
+                        if pending_chunk_chars > LIVE_TOKEN_COUNT_BATCH_CHARS:
+                            # Tokenize deltas in batches rather than once per (few-byte) chunk
+                            completion_tokens_calculated += count_text_tokens(full_response_text[-pending_chunk_chars:])
+                            pending_chunk_chars = 0
+                        # Deltas are often a few characters; post them to the GUI in small batches
+                        unsent_chunk_chars += len(content_chunk)
+                        now = time.monotonic()
+                        if unsent_chunk_chars > GUI_CHUNK_FLUSH_CHARS or now - last_gui_post >= GUI_CHUNK_FLUSH_INTERVAL:
+                            gui_queue.put({
+                                "type": mt.MSG_TYPE_LLM_CHUNK,
+                                "content": full_response_text[-unsent_chunk_chars:],
+                                "completion_tokens_live": completion_tokens_calculated + pending_chunk_chars // 4
+                            })
+                            unsent_chunk_chars = 0
+                            last_gui_post = now
+                    # Some streaming APIs might include 'usage' data in non-delta messages or final message
+                    if usage_stats is not None:
+                        current_server_total = usage_stats.get("total_tokens", 0)
+                        if current_server_total > server_reported_total_tokens: # Keep the highest value seen
+                            server_reported_total_tokens = current_server_total
+                        logging.debug(f"LLM_HANDLER: Mid-stream server usage stats: {usage_stats}")
+                except json.JSONDecodeError: # orjson's error subclasses it
+                    logging.warning(f"LLM_HANDLER: Could not decode JSON from stream data: '{sse_payload.decode('utf-8', 'replace')}'")
+
+        if unsent_chunk_chars: # Text still held back by the batching above
+            gui_queue.put({
+                "type": mt.MSG_TYPE_LLM_CHUNK,
+                "content": full_response_text[-unsent_chunk_chars:],
+                "completion_tokens_live": completion_tokens_calculated + pending_chunk_chars // 4
+            })
         
         if stop_event.is_set(): # If loop was broken by stop_event
              gui_queue.put({"type": mt.MSG_TYPE_INFO, "content": "LLM stream was cancelled by application."})
              gui_queue.put(None); return # Signal end and exit
 
+        # The live count was batched/estimated; count the complete response once for the final figure
+        completion_tokens_calculated = count_text_tokens(full_response_text) if full_response_text else 0
+
         if not full_response_text.strip() and response.status_code == 200:
             logging.warning("LLM_HANDLER: LLM stream finished, but no textual content was aggregated from chunks.")
             # Optionally send an info message to GUI:
@@ -421,9 +808,11 @@ def stream_llm_response(
 
         # --- Finalize and Update History ---
         # Append the user's message (current_user_message_parts) and the associated raw PIL image (pil_image_obj)
-        # along with the LLM's full response to the shared context_history list.
-        context_history.append(("user", current_user_message_parts, pil_image_obj if pil_image_obj else None))
-        context_history.append(("assistant", full_response_text, None)) # Assistant response has no image
+        # along with the LLM's full response to the conversation history.
+        _record_turns([
+            ("user", current_user_message_parts, pil_image_obj if pil_image_obj else None),
+            ("assistant", full_response_text, None) # Assistant response has no image
+        ])
 
         # Send final token counts to GUI
         calculated_total_tokens = prompt_tokens + completion_tokens_calculated
@@ -442,9 +831,14 @@ def stream_llm_response(
         })
         # Optionally, send the full response again if GUI needs it explicitly beyond chunks
         gui_queue.put({"type": mt.MSG_TYPE_LLM_FULL_RESPONSE, "content": full_response_text})
+        if on_complete:
+            try:
+                on_complete(full_response_text, prompt_tokens, completion_tokens_calculated, final_tokens_to_report)
+            except Exception as e_cb:
+                logging.error(f"LLM_HANDLER: Error in on_complete callback: {e_cb}", exc_info=True)
 
     except requests.exceptions.Timeout:
-        timeout_val = config_manager.get_config_value('llm_request_timeout', 180)
+        timeout_val = profile.timeout if profile is not None else config_manager.get_config_value('llm_request_timeout', 180)
         logging.error(f"LLM_HANDLER: LLM request timed out after {timeout_val}s.", exc_info=True)
         gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": f"LLM request timed out ({timeout_val}s)." })
         gui_queue.put({"type": mt.MSG_TYPE_LLM_FINAL_TOKEN_COUNTS, "prompt_tokens": prompt_tokens, "completion_tokens":0, "total_tokens":prompt_tokens})
@@ -457,6 +851,9 @@ def stream_llm_response(
         gui_queue.put({"type": mt.MSG_TYPE_ERROR, "content": f"Unexpected LLM Error: {str(e)[:150]}"})
         gui_queue.put({"type": mt.MSG_TYPE_LLM_FINAL_TOKEN_COUNTS, "prompt_tokens": prompt_tokens, "completion_tokens":0, "total_tokens":prompt_tokens})
     finally:
+        if response is not None:
+            # Unblocks the read-ahead thread and returns the connection to the session's pool
+            response.close()
         gui_queue.put(None) # Crucial: Signal to the GUI queue processor that this request sequence is done.
 
 # --- Example Usage for Direct Testing of this Module ---
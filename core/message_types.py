@@ -63,6 +63,17 @@ Payload typically includes:
     - "content": (str) The informational message.
 """
 
+MSG_TYPE_CONTEXT_CLEARED = "context_cleared"
+"""
+Message type sent once after the conversation context and buffers were cleared.
+Replaces separate info and token-reset messages so the GUI can update in one redraw.
+Payload typically includes:
+    - "info": (str) The informational message to display.
+    - "prompt_tokens": (int) Reset prompt token count (0).
+    - "completion_tokens": (int) Reset completion token count (0).
+    - "total_tokens": (int) Reset total token count (0).
+"""
+
 # --- OCR & Action Related Messages ---
 # These messages are typically generated by the CoreEngine after OCR processing
 # or when GUI actions related to OCR need to be managed.
@@ -74,6 +85,7 @@ are ready for the GUI to display action buttons to the user.
 Payload typically includes:
     - "ocr_text": (str) The extracted OCR text.
     - "image_pil": (PIL.Image.Image) The PIL Image object that was processed.
+                   Omitted when vision is disabled (the actions then use the OCR text only).
 """
 
 MSG_TYPE_OCR_ACTIONS_HIDE = "ocr_actions_hide"
@@ -83,6 +95,16 @@ typically reverting to the main set of buttons or an idle state.
 No specific payload usually needed.
 """
 
+# --- GUI-Internal Messages ---
+# Posted by GUI helper threads onto the same channel, so results reach the Tk thread.
+
+MSG_TYPE_CLIPBOARD_COPIED = "clipboard_copied"
+"""
+Message type sent when copying a response to the clipboard (on a helper thread) finished.
+Payload typically includes:
+    - "error": (str or None) The error message if copying failed, else None.
+"""
+
 # Future message types could be added here, e.g.:
 # MSG_TYPE_TTS_EVENT = "tts_event" # For TTS started/finished, with sub-type in payload
 # MSG_TYPE_CONFIG_UPDATED = "config_updated" # If core needs to tell GUI about a config change
\ No newline at end of file
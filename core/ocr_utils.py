@@ -4,7 +4,13 @@ Utility functions for Optical Character Recognition (OCR) tasks, including
 capturing screenshots of the active window and extracting text from images
 using Tesseract OCR.
 """
+import atexit
+import collections
+import concurrent.futures
+import hashlib
 import logging
+import os
+import threading
 import typing
 import time
 from PIL import Image, ImageGrab # Pillow for image manipulation and screenshots
@@ -14,6 +20,279 @@ import pygetwindow as gw         # To get active window details and manage windo
 # Relative import for configuration access
 from . import config_manager
 
+def _apply_omp_thread_limit():
+    """
+    Caps Tesseract's OpenMP threads per recognition (config: "ocr_omp_thread_limit").
+    Tesseract otherwise starts a thread per core for every call, and concurrent recognitions
+    (batch OCR, OCR next to other work) then oversubscribe the CPU and get slower, not faster.
+    Must run before tesserocr is imported, as OpenMP reads the limit when it is loaded;
+    pytesseract's tesseract processes inherit it. An OMP_THREAD_LIMIT already set is kept.
+    """
+    try:
+        limit = int(config_manager.get_config_value("ocr_omp_thread_limit", 1) or 0)
+    except (TypeError, ValueError):
+        limit = 1
+    if limit > 0:
+        os.environ.setdefault("OMP_THREAD_LIMIT", str(limit))
+
+_apply_omp_thread_limit()
+
+# Optional: DXcam captures through the Windows Desktop Duplication API, which is much
+# faster than ImageGrab's GDI BitBlt. Not available (or needed) on other platforms.
+DXCAM_AVAILABLE: bool = False
+try:
+    import dxcam # type: ignore
+    DXCAM_AVAILABLE = True
+    logging.debug("OCR_UTILS: 'dxcam' library successfully imported.")
+except ImportError:
+    dxcam = None
+
+# Optional: tesserocr runs Tesseract in-process, so an OCR call does not spawn a
+# tesseract process and round-trip the image through temp files as pytesseract does.
+TESSEROCR_AVAILABLE: bool = False
+try:
+    import tesserocr # type: ignore
+    TESSEROCR_AVAILABLE = True
+    logging.debug("OCR_UTILS: 'tesserocr' library successfully imported.")
+except ImportError:
+    tesserocr = None
+
+class _OcrSettings(typing.NamedTuple):
+    """OCR and capture settings derived from the configuration, already coerced to their types."""
+    ocr_lang: str
+    max_height: int
+    auto_crop: bool
+    screenshot_delay: float
+    batch_processes: int
+
+_ocr_settings_cache: typing.Optional[typing.Tuple[int, _OcrSettings]] = None # (config revision, settings)
+
+def _get_ocr_settings() -> _OcrSettings:
+    """Returns the OCR settings, re-read only when the configuration changed."""
+    global _ocr_settings_cache
+    revision = config_manager.get_revision() # Read first: a change while building just forces another rebuild
+    cached = _ocr_settings_cache
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+
+    ocr_lang, max_height, auto_crop, screenshot_delay, batch_processes = config_manager.get_many(
+        ("ocr_language", "ocr_max_height", "ocr_auto_crop", "screenshot_delay", "ocr_batch_processes"))
+    if not ocr_lang: # Fallback if config value is empty
+        ocr_lang = "deu"
+        logging.warning(f"OCR_UTILS: OCR language not configured or empty, defaulting to '{ocr_lang}'.")
+    settings = _OcrSettings(
+        ocr_lang=ocr_lang,
+        max_height=int(max_height or 0),
+        auto_crop=bool(auto_crop),
+        screenshot_delay=float(screenshot_delay if screenshot_delay is not None else 0.5),
+        batch_processes=int(batch_processes or 0)
+    )
+    _ocr_settings_cache = (revision, settings)
+    return settings
+
+_dxcam_camera: typing.Optional[typing.Any] = None # Created on first capture
+_dxcam_failed: bool = False # Set if creating the camera failed; ImageGrab is used from then on
+_dxcam_lock = threading.Lock()
+
+def _get_dxcam_camera() -> typing.Optional[typing.Any]:
+    """Returns the shared DXcam camera for the primary output, or None if DXcam is unusable."""
+    global _dxcam_camera, _dxcam_failed
+    if not DXCAM_AVAILABLE or _dxcam_failed:
+        return None
+    with _dxcam_lock:
+        if _dxcam_camera is None and not _dxcam_failed:
+            try:
+                _dxcam_camera = dxcam.create(output_color="RGB")
+                logging.info("OCR_UTILS: Using DXcam (Desktop Duplication) for screen capture.")
+            except Exception as e:
+                _dxcam_failed = True
+                logging.warning(f"OCR_UTILS: Could not create DXcam camera ({e}). Falling back to ImageGrab.")
+    return _dxcam_camera
+
+def _grab_region(left: int, top: int, right: int, bottom: int) -> Image.Image:
+    """
+    Captures the screen region (left, top, right, bottom) as a PIL image.
+    Uses DXcam when available and the region lies on the primary output, otherwise ImageGrab.
+    """
+    camera = _get_dxcam_camera()
+    if camera is not None and left >= 0 and top >= 0 and right <= camera.width and bottom <= camera.height:
+        try:
+            region = (left, top, right, bottom)
+            frame = camera.grab(region=region)
+            if frame is None: # DXcam only returns new frames; ask once more before falling back
+                frame = camera.grab(region=region)
+            if frame is not None:
+                return Image.fromarray(frame)
+            logging.debug("OCR_UTILS: DXcam returned no new frame, using ImageGrab.")
+        except Exception as e:
+            logging.debug(f"OCR_UTILS: DXcam capture failed ({e}), using ImageGrab.")
+    return ImageGrab.grab(bbox=(left, top, right, bottom), all_screens=True) # all_screens=True for multi-monitor
+
+_tess_api_cache: typing.Dict[str, typing.Any] = {} # ocr language -> initialized PyTessBaseAPI
+_tess_api_failed_langs: typing.Set[str] = set() # Languages tesserocr could not initialize; pytesseract is used for them
+_tess_api_lock = threading.Lock() # A PyTessBaseAPI must not be used from two threads at once
+
+def _tesserocr_image_to_string(pil_image: Image.Image, ocr_lang: str, auto_crop: bool = False) -> typing.Optional[str]:
+    """
+    Runs OCR with a cached in-process tesserocr API for `ocr_lang`.
+    With `auto_crop`, recognition is restricted to the area that contains text lines.
+    Returns None if no API could be initialized for that language (caller falls back to pytesseract).
+    """
+    with _tess_api_lock:
+        api = _get_tess_api_locked(ocr_lang)
+        if api is None:
+            return None
+        _set_tess_image_locked(api, pil_image)
+        if auto_crop:
+            text_box = _text_bounding_box_locked(api, pil_image.size)
+            if text_box is not None:
+                api.SetRectangle(*text_box)
+        return api.GetUTF8Text()
+
+def _set_tess_image_locked(api: typing.Any, pil_image: Image.Image):
+    """
+    Hands the image to `api`. Grayscale and RGB pixels are passed as raw bytes, which skips
+    the in-memory image file tesserocr's SetImage encodes and Leptonica decodes again.
+    Caller holds _tess_api_lock.
+    """
+    bytes_per_pixel = {"L": 1, "RGB": 3}.get(pil_image.mode)
+    if bytes_per_pixel is None:
+        api.SetImage(pil_image)
+        return
+    width, height = pil_image.size
+    api.SetImageBytes(pil_image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+OCR_AUTO_CROP_MARGIN: int = 8 # Pixels added around the detected text area
+OCR_AUTO_CROP_MAX_COVERAGE: float = 0.8 # Not worth restricting recognition above this share of the image
+
+def _text_bounding_box_locked(api: typing.Any, image_size: typing.Tuple[int, int]) -> typing.Optional[typing.Tuple[int, int, int, int]]:
+    """
+    Finds the (left, top, width, height) box around all text lines of the image set on `api`,
+    using layout analysis only (no recognition). Returns None if there is no worthwhile crop.
+    Caller holds _tess_api_lock.
+    """
+    try:
+        api.SetPageSegMode(tesserocr.PSM.SPARSE_TEXT)
+        lines = api.GetComponentImages(tesserocr.RIL.TEXTLINE, True)
+    except Exception as e:
+        logging.debug(f"OCR_UTILS: Text line detection failed ({e}); recognizing the whole image.")
+        return None
+    finally:
+        api.SetPageSegMode(tesserocr.PSM.AUTO) # Default mode for the actual recognition
+    if not lines:
+        return None
+
+    boxes = [box for _, box, _, _ in lines]
+    left = max(0, min(b["x"] for b in boxes) - OCR_AUTO_CROP_MARGIN)
+    top = max(0, min(b["y"] for b in boxes) - OCR_AUTO_CROP_MARGIN)
+    right = min(image_size[0], max(b["x"] + b["w"] for b in boxes) + OCR_AUTO_CROP_MARGIN)
+    bottom = min(image_size[1], max(b["y"] + b["h"] for b in boxes) + OCR_AUTO_CROP_MARGIN)
+    if (right - left) * (bottom - top) > OCR_AUTO_CROP_MAX_COVERAGE * image_size[0] * image_size[1]:
+        return None
+    logging.debug(f"OCR_UTILS: Restricting OCR to text area ({left}, {top}, {right}, {bottom}) of {image_size}.")
+    return left, top, right - left, bottom - top
+
+def _get_tess_api_locked(ocr_lang: str) -> typing.Optional[typing.Any]:
+    """Returns the cached tesserocr API for `ocr_lang`, creating it on first use. Caller holds _tess_api_lock."""
+    api = _tess_api_cache.get(ocr_lang)
+    if api is None:
+        if ocr_lang in _tess_api_failed_langs:
+            return None
+        try:
+            api = tesserocr.PyTessBaseAPI(lang=ocr_lang)
+        except Exception as e: # e.g. RuntimeError when the language data is not found
+            _tess_api_failed_langs.add(ocr_lang)
+            logging.warning(f"OCR_UTILS: tesserocr could not be initialized for '{ocr_lang}' ({e}). Using pytesseract.")
+            return None
+        _tess_api_cache[ocr_lang] = api
+    return api
+
+# Recently recognized images: (content digest, language) -> text. Re-pressing the hotkey on an
+# unchanged window then skips Tesseract entirely.
+OCR_CACHE_SIZE: int = 64
+_ocr_cache: "collections.OrderedDict[typing.Tuple[bytes, str, int, bool], str]" = collections.OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+def _ocr_cache_key(pil_image: Image.Image, ocr_lang: str, max_height: int, auto_crop: bool) -> typing.Tuple[bytes, str, int, bool]:
+    """Content-addressed cache key: digest of mode, size and pixel data, plus the OCR settings."""
+    digest = hashlib.sha1(f"{pil_image.mode}{pil_image.size}".encode("ascii"))
+    digest.update(pil_image.tobytes())
+    return digest.digest(), ocr_lang, max_height, auto_crop
+
+def _prepare_for_ocr(pil_image: Image.Image, max_height: int) -> Image.Image:
+    """
+    Converts the image to 8-bit grayscale and caps its height at `max_height` (0 = no cap).
+    Tesseract binarizes internally anyway; one channel and fewer pixels cut recognition time.
+    """
+    img = pil_image if pil_image.mode == "L" else pil_image.convert("L")
+    if max_height > 0 and img.height > max_height:
+        target_width = max(1, img.width * max_height // img.height)
+        logging.debug(f"OCR_UTILS: Downscaling {img.size} image to {(target_width, max_height)} for OCR.")
+        img = img.resize((target_width, max_height), Image.Resampling.LANCZOS)
+    return img
+
+def _end_tesserocr_apis():
+    """Releases the cached tesserocr APIs (registered with atexit)."""
+    with _tess_api_lock:
+        for api in _tess_api_cache.values():
+            try:
+                api.End()
+            except Exception:
+                pass
+        _tess_api_cache.clear()
+
+atexit.register(_end_tesserocr_apis)
+
+_HIDE_POLL_INTERVAL: float = 0.01 # Seconds between checks while waiting for the GUI to get out of the way
+
+def _wait_until_hidden(window: "gw.Window", timeout: float):
+    """
+    Returns as soon as `window` is minimized (or hidden) and no longer the active window,
+    or after `timeout` seconds at the latest.
+    """
+    window_handle = getattr(window, "_hWnd", None)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if window.isMinimized or not window.visible:
+                active = gw.getActiveWindow()
+                if active is None or (getattr(active, "_hWnd", None) != window_handle if window_handle is not None
+                                      else active.title != window.title):
+                    return
+        except Exception as e: # Window state queries can fail while the window is changing
+            logging.debug(f"OCR_UTILS: Error while waiting for window to hide: {e}")
+        time.sleep(_HIDE_POLL_INTERVAL)
+    logging.debug(f"OCR_UTILS: Window '{window.title}' not confirmed hidden within {timeout:.2f}s; capturing anyway.")
+
+def initialize_ocr() -> bool:
+    """
+    Warms up OCR for the configured language, so the first capture does not pay
+    for loading Tesseract's language data.
+
+    With tesserocr, the language's API is created and kept for later calls;
+    otherwise a small blank image is recognized once via pytesseract.
+
+    Returns:
+        bool: True if OCR is ready, False if Tesseract is missing or failed.
+    """
+    ocr_lang = _get_ocr_settings().ocr_lang
+    try:
+        if TESSEROCR_AVAILABLE:
+            with _tess_api_lock:
+                api = _get_tess_api_locked(ocr_lang)
+            if api is not None:
+                logging.info(f"OCR_UTILS: tesserocr initialized for '{ocr_lang}'.")
+                return True
+        pytesseract.image_to_string(Image.new("L", (32, 32), 255), lang=ocr_lang)
+        logging.info(f"OCR_UTILS: Tesseract warmed up for '{ocr_lang}'.")
+        return True
+    except pytesseract.TesseractNotFoundError:
+        logging.error("OCR_UTILS: Tesseract OCR engine not found. Please ensure Tesseract is installed and its executable is in the system's PATH.")
+        return False
+    except Exception as e:
+        logging.error(f"OCR_UTILS: OCR warm-up failed for '{ocr_lang}': {e}", exc_info=True)
+        return False
+
 def capture_active_window_pil(main_gui_window_title: str = "LM Buddy", 
                               hide_delay_override: typing.Optional[float] = None) -> typing.Tuple[typing.Optional[Image.Image], typing.Optional[str]]:
     """
@@ -28,7 +307,7 @@ def capture_active_window_pil(main_gui_window_title: str = "LM Buddy",
         main_gui_window_title (str): The title of the main application window.
                                      This is used to identify and minimize the app's own GUI.
                                      It should match the title set in the GUI.
-        hide_delay_override (float, optional): If provided, overrides the default delay
+        hide_delay_override (float, optional): If provided, overrides the default maximum delay
                                                (from config: "screenshot_delay")
                                                to wait after minimizing the main GUI.
 
@@ -42,9 +321,14 @@ def capture_active_window_pil(main_gui_window_title: str = "LM Buddy",
     original_overlay_was_minimized = False
 
     try:
-        # Attempt to find the main application window by its title.
+        # One window enumeration per capture: the same snapshot is used to find our own window
+        # and, if needed, a fallback window below. Window state (minimized, visible) is queried live.
+        all_windows = gw.getAllWindows()
+        # Attempt to find the main application window by its title (case-insensitive substring,
+        # as gw.getWindowsWithTitle matches).
         # Note: Title matching can be fragile if the window title is very dynamic.
-        app_windows = gw.getWindowsWithTitle(main_gui_window_title)
+        title_upper = main_gui_window_title.upper()
+        app_windows = [w for w in all_windows if title_upper in w.title.upper()]
         if app_windows:
             overlay_window = app_windows[0] # Assume the first match is our window
             original_overlay_was_visible = overlay_window.visible
@@ -58,10 +342,10 @@ def capture_active_window_pil(main_gui_window_title: str = "LM Buddy",
             else: # Was not visible
                 logging.debug(f"OCR_UTILS: Main GUI window '{main_gui_window_title}' was not visible initially.")
             
-            # Wait for the window to minimize and for focus to potentially shift.
+            # Wait for the window to minimize and for focus to shift; the delay is an upper bound.
             delay = hide_delay_override if hide_delay_override is not None \
-                    else float(config_manager.get_config_value("screenshot_delay", 0.5))
-            time.sleep(delay)
+                    else _get_ocr_settings().screenshot_delay
+            _wait_until_hidden(overlay_window, delay)
         else:
             logging.warning(f"OCR_UTILS: Main GUI window with title '{main_gui_window_title}' not found. Proceeding to capture active window.")
 
@@ -75,15 +359,19 @@ def capture_active_window_pil(main_gui_window_title: str = "LM Buddy",
         # Check if the active window is still our application's main GUI.
         if overlay_window and active_win.title == overlay_window.title:
             logging.warning("OCR_UTILS: Main GUI is still the active window. Attempting to find another window.")
-            all_windows = gw.getAllWindows()
             # Filter for other visible, non-minimized windows with valid dimensions.
-            candidate_windows = [
-                w for w in all_windows if w.title != overlay_window.title and \
-                w.visible and not w.isMinimized and w.width > 0 and w.height > 0
-            ]
+            # Each size query reads the window rectangle, so the area is computed once per window.
+            overlay_title = overlay_window.title
+            candidate_windows: typing.List[typing.Tuple[int, gw.Window]] = []
+            for w in all_windows:
+                if w.title == overlay_title or not w.visible or w.isMinimized:
+                    continue
+                width, height = w.size
+                if width > 0 and height > 0:
+                    candidate_windows.append((width * height, w))
             if candidate_windows:
                 # Simple heuristic: pick the largest of the candidates.
-                active_win = sorted(candidate_windows, key=lambda w_sort: w_sort.width * w_sort.height, reverse=True)[0]
+                active_win = max(candidate_windows, key=lambda candidate: candidate[0])[1]
                 logging.info(f"OCR_UTILS: Fallback capture to window: '{active_win.title}' (Size: {active_win.size}).")
             else:
                 logging.warning("OCR_UTILS: No other suitable window found to capture.")
@@ -98,9 +386,7 @@ def capture_active_window_pil(main_gui_window_title: str = "LM Buddy",
         # Pillow's ImageGrab.grab expects bbox=(left, top, right, bottom).
         # pygetwindow's box is (left, top, width, height).
         left, top, width, height = active_win.left, active_win.top, active_win.width, active_win.height
-        bbox_to_capture = (left, top, left + width, top + height)
-        
-        img = ImageGrab.grab(bbox=bbox_to_capture, all_screens=True) # all_screens=True for multi-monitor
+        img = _grab_region(left, top, left + width, top + height)
         return img, None
 
     except Exception as e:
@@ -121,13 +407,17 @@ def capture_active_window_pil(main_gui_window_title: str = "LM Buddy",
             except Exception as e_restore:
                 logging.warning(f"OCR_UTILS: Error restoring main GUI window '{main_gui_window_title}': {e_restore}")
                 
-def extract_text_from_image(pil_image: typing.Optional[Image.Image]) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+def extract_text_from_image(pil_image: typing.Optional[Image.Image],
+                            auto_crop: typing.Optional[bool] = None) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
     """
     Extracts text from a given PIL Image object using Tesseract OCR.
+    Uses an in-process tesserocr API when available, otherwise pytesseract.
 
     Args:
         pil_image (PIL.Image.Image or None): The image to process. If None,
                                              an error is returned.
+        auto_crop (bool, optional): Restrict recognition to the area containing text lines
+                                    (tesserocr only). Defaults to the "ocr_auto_crop" setting.
 
     Returns:
         tuple: A tuple containing:
@@ -139,14 +429,33 @@ def extract_text_from_image(pil_image: typing.Optional[Image.Image]) -> typing.T
         return None, "No image provided for OCR."
     
     try:
-        # Get OCR language(s) from configuration.
-        ocr_lang = config_manager.get_config_value("ocr_language", "deu")
-        if not ocr_lang: # Fallback if config value is empty
-            ocr_lang = "deu"
-            logging.warning(f"OCR_UTILS: OCR language not configured or empty, defaulting to '{ocr_lang}'.")
-
-        # Perform OCR using pytesseract.
-        text = pytesseract.image_to_string(pil_image, lang=ocr_lang).strip()
+        # Get OCR language(s) and preprocessing settings from configuration.
+        settings = _get_ocr_settings()
+        ocr_lang = settings.ocr_lang
+        max_height = settings.max_height
+        if auto_crop is None:
+            auto_crop = settings.auto_crop
+        cache_key = _ocr_cache_key(pil_image, ocr_lang, max_height, auto_crop)
+        with _ocr_cache_lock:
+            cached_text = _ocr_cache.get(cache_key)
+            if cached_text is not None:
+                _ocr_cache.move_to_end(cache_key)
+        if cached_text is not None:
+            logging.info(f"OCR_UTILS: Identical image recognized before; reusing {len(cached_text)} cached characters.")
+            return cached_text, None
+
+        ocr_image = _prepare_for_ocr(pil_image, max_height)
+        # Perform OCR in-process with tesserocr if possible, otherwise via pytesseract.
+        text = _tesserocr_image_to_string(ocr_image, ocr_lang, auto_crop) if TESSEROCR_AVAILABLE else None
+        if text is None:
+            text = pytesseract.image_to_string(ocr_image, lang=ocr_lang)
+        text = text.strip()
+
+        with _ocr_cache_lock:
+            _ocr_cache[cache_key] = text
+            _ocr_cache.move_to_end(cache_key)
+            while len(_ocr_cache) > OCR_CACHE_SIZE:
+                _ocr_cache.popitem(last=False)
         
         logging.info(f"OCR_UTILS: Extracted {len(text)} characters using language(s) '{ocr_lang}'.")
         if not text:
@@ -162,6 +471,46 @@ def extract_text_from_image(pil_image: typing.Optional[Image.Image]) -> typing.T
         logging.error(f"OCR_UTILS: An unexpected error occurred during OCR: {e}", exc_info=True)
         return None, f"OCR processing error: {str(e)}"
 
+def extract_text_from_images(images: typing.Sequence[typing.Optional[Image.Image]]) -> typing.List[typing.Tuple[typing.Optional[str], typing.Optional[str]]]:
+    """
+    Extracts text from several images, e.g. multiple captures or pages.
+
+    With more than one image, the images are recognized in parallel worker
+    processes (config: "ocr_batch_processes"; 0 = one per CPU core, 1 = sequential).
+    Threads would not help here: pytesseract/tesserocr work contends for the GIL and
+    Tesseract's own threads, while separate processes scale with the cores.
+
+    Args:
+        images (sequence of PIL.Image.Image or None): The images to process.
+
+    Returns:
+        list: One (text, error message) tuple per image, in the same order and
+              format as returned by `extract_text_from_image`.
+    """
+    processes = _get_ocr_settings().batch_processes or (os.cpu_count() or 1)
+    processes = min(processes, len(images))
+    if processes <= 1:
+        return [extract_text_from_image(img) for img in images]
+
+    logging.info(f"OCR_UTILS: Running OCR on {len(images)} images in {processes} worker processes.")
+    # One Tesseract thread per worker, forced even if "ocr_omp_thread_limit" is off: the processes
+    # already use every core. Set in this process's environment while the pool starts workers, so
+    # they inherit it before they import this module (and tesserocr) to unpickle the OCR function.
+    previous_omp_limit = os.environ.get("OMP_THREAD_LIMIT")
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+                return list(pool.map(extract_text_from_image, images))
+        finally:
+            if previous_omp_limit is None:
+                os.environ.pop("OMP_THREAD_LIMIT", None)
+            else:
+                os.environ["OMP_THREAD_LIMIT"] = previous_omp_limit
+    except Exception as e: # e.g. BrokenProcessPool if a worker died
+        logging.error(f"OCR_UTILS: Batch OCR in worker processes failed ({e}). Processing sequentially.", exc_info=True)
+        return [extract_text_from_image(img) for img in images]
+
 # --- Example Usage for Direct Testing of this Module ---
 if __name__ == '__main__':
     # Configure logging for direct script execution test
@@ -0,0 +1,144 @@
+# core/prompt_assembler.py
+"""
+Assembles the message list sent to the LLM in a prompt-cache-friendly order.
+
+Layout of every request:
+    [system prompt | committed history | current turn]
+
+The system prompt is only included at the start of a new logical
+conversation (empty history, or the last turn is a "[...]" context marker).
+Committed history turns are converted to API messages once and never
+reordered or re-encoded. This keeps the request prefix byte-identical between
+turns, so providers with prompt caching only have to process the newly added
+tokens.
+"""
+import logging
+import typing
+
+from . import config_manager
+from . import llm_handler
+from .image_pager import resolve_image
+
+class PromptAssembler:
+    """
+    Builds API message lists from the engine's context history, keeping a
+    cached, append-only list of already converted history messages.
+    """
+    def __init__(self):
+        self.committed_history: typing.List[typing.Dict[str, typing.Any]] = []
+        """API messages for the history turns converted so far. Never reordered."""
+        self._committed_sources: typing.List[tuple] = []
+        """The context_history tuples `committed_history` was built from (content identity-checked)."""
+        self.committed_tokens: int = 0
+        """Text tokens of `committed_history`, counted once per message as it is committed."""
+        self._sent_system_prompt: typing.Optional[typing.Tuple[int, str]] = None
+        """(config revision, system prompt) of the request last assembled by `build`; None if it had none."""
+        self._system_prompt_tokens: typing.Optional[typing.Tuple[int, int]] = None
+        """(config revision, token count) of the system prompt; recounted when the configuration changed."""
+
+    def reset(self):
+        """Drops all committed history, e.g. after the conversation was cleared."""
+        self.committed_history = []
+        self._committed_sources = []
+        self.committed_tokens = 0
+
+    @staticmethod
+    def _history_entry_to_message(entry: tuple) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Converts a (role, content, pil_image) history tuple to an API message, or None if empty."""
+        role, hist_content_parts_or_str, hist_pil_image = entry
+        message_parts: typing.List[typing.Dict[str, typing.Any]] = []
+        if isinstance(hist_content_parts_or_str, list): # Content is already in API parts format
+            message_parts.extend(hist_content_parts_or_str)
+        elif isinstance(hist_content_parts_or_str, str): # Simple string content
+            message_parts.append({"type": "text", "text": hist_content_parts_or_str})
+
+        # If there's a PIL image associated with this user history turn, add its base64 representation
+        # if not already present in the content parts (e.g. from a vision call).
+        if role == "user" and hist_pil_image:
+            if not any(p.get("type") == "image_url" for p in message_parts):
+                base64_img_hist = llm_handler.convert_image_to_base64_str(resolve_image(hist_pil_image))
+                message_parts.append({"type": "image_url", "image_url": {"url": base64_img_hist}})
+
+        if not message_parts:
+            return None
+        return {"role": role, "content": message_parts}
+
+    def _sync_committed_history(self, context_history: typing.Sequence[tuple]):
+        """
+        Brings `committed_history` up to date with `context_history`.
+        Only newly appended turns are converted; if the history was cleared or
+        rewritten (prefix no longer matches) everything is rebuilt. Entries are compared by
+        their content, so paging out an entry's image does not force a rebuild.
+        """
+        sources = self._committed_sources
+        n_known = len(sources)
+        if len(context_history) < n_known or any(context_history[i][1] is not sources[i][1] for i in range(n_known)):
+            logging.debug("PROMPT_ASSEMBLER: Context history was rewritten. Rebuilding committed history.")
+            self.reset()
+            sources = self._committed_sources
+            n_known = 0
+
+        for entry in context_history[n_known:]:
+            sources.append(entry)
+            message = self._history_entry_to_message(entry)
+            if message is not None:
+                self.committed_history.append(message)
+                self.committed_tokens += llm_handler.count_tokens_for_api_messages([message])
+
+    def count_prompt_tokens(self, current_user_message_parts: typing.List[typing.Dict[str, typing.Any]]) -> int:
+        """
+        Text tokens of the request last assembled by `build` for these message parts.
+        Only the current turn is tokenized; system prompt and history counts are cached.
+        """
+        system_tokens = 0
+        if self._sent_system_prompt is not None:
+            revision, system_prompt = self._sent_system_prompt
+            if self._system_prompt_tokens is None or self._system_prompt_tokens[0] != revision:
+                self._system_prompt_tokens = (revision, llm_handler.count_text_tokens(system_prompt))
+            system_tokens = self._system_prompt_tokens[1]
+        current_tokens = llm_handler.count_tokens_for_api_messages([{"role": "user", "content": current_user_message_parts}])
+        return system_tokens + self.committed_tokens + current_tokens
+
+    def build(self, context_history: typing.Sequence[tuple],
+              current_user_message_parts: typing.List[typing.Dict[str, typing.Any]]) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Builds the full API message list for the next request.
+
+        Args:
+            context_history: The engine's history of (role, content, pil_image) tuples.
+            current_user_message_parts: Content parts of the current user turn.
+
+        Returns:
+            list: API messages (system, committed history, current turn). The list is new,
+                  but the committed message dicts are shared and must not be mutated.
+        """
+        self._sync_committed_history(context_history)
+
+        api_messages: typing.List[typing.Dict[str, typing.Any]] = []
+        # The system prompt is only sent at the start of a new logical conversation
+        is_new_logical_convo = not context_history or \
+                               (isinstance(context_history[-1][1], str) and context_history[-1][1].startswith("[")) # e.g., last was "[Context set...]"
+        self._sent_system_prompt = None
+        if is_new_logical_convo:
+            revision = config_manager.get_revision() # Read first: a change meanwhile only forces a recount
+            system_prompt = llm_handler.get_system_prompt() # Same source as llm_handler's legacy path
+            if system_prompt:
+                self._sent_system_prompt = (revision, system_prompt)
+                api_messages.append({"role": "system", "content": system_prompt})
+        api_messages.extend(self.committed_history)
+
+        # Anthropic needs an explicit breakpoint at the end of the stable prefix;
+        # OpenAI-compatible servers cache matching prefixes automatically.
+        if api_messages and config_manager.get_config_value("llm_provider", "custom") == "anthropic":
+            last = api_messages[-1]
+            content = last["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            else:
+                content = [dict(p) for p in content]
+            content[-1]["cache_control"] = {"type": "ephemeral"}
+            api_messages[-1] = {"role": last["role"], "content": content}
+
+        if current_user_message_parts:
+            api_messages.append({"role": "user", "content": current_user_message_parts})
+        return api_messages
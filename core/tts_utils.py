@@ -3,12 +3,13 @@
 Text-to-Speech (TTS) utilities for the application.
 
 This module initializes and manages a TTS engine (currently pyttsx3)
-to speak text aloud. It handles speech in a separate thread to prevent
-blocking the main application GUI. It also includes text cleaning
-functionality to improve speech output.
+to speak text aloud. The engine lives on one long-lived worker thread that
+speaks queued texts, so callers (e.g. the GUI) never block on speech. It also
+includes text cleaning functionality to improve speech output.
 """
 import pyttsx3
 import logging
+import queue
 import threading
 import re
 import html
@@ -17,48 +18,107 @@ import typing # For type hinting
 # Module-level global variables for the TTS engine instance and its control.
 # These are considered "private" to this module.
 _tts_engine: typing.Optional[pyttsx3.Engine] = None
-_tts_thread: typing.Optional[threading.Thread] = None
-_tts_stop_event: threading.Event = threading.Event() # Event to signal the TTS worker to stop
+_tts_thread: typing.Optional[threading.Thread] = None # Worker that owns the engine and speaks queued texts
+_tts_queue: "queue.SimpleQueue[typing.Optional[typing.Tuple[int, str]]]" = queue.SimpleQueue() # (generation, text); None ends the worker
+_tts_generation: int = 0 # Bumped by stop_speaking(); queued texts from older generations are skipped
+_tts_ready: threading.Event = threading.Event() # Set once the worker has tried to create the engine
+_tts_speaking: threading.Event = threading.Event() # Set while the worker is speaking
+_tts_init_lock = threading.Lock()
+
+# Markup removed by _clean_text_for_speech, matched in a single pass over the text:
+# full URLs, Markdown emphasis (*, _, **, __, ***, ___), links [text](url) and
+# inline code/code blocks (`code` or ```code```, may span lines).
+_RE_SPEECH_MARKUP = re.compile(
+    r'(?P<url>http[s]?://\S+)'
+    r'|(?<!\\)(?P<mark>\*|_){1,3}(?P<emph>.+?)(?<!\\)(?P=mark){1,3}'
+    r'|\[(?P<link>.*?)\]\(.*?\)'
+    r'|(?s:`{1,3}(?P<code>.*?)`{1,3})'
+)
+
+# Sentence boundaries at which a long text is split, so speech can be cancelled between sentences
+_RE_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\s*\n\s*')
+
+def _speech_markup_replacement(match: re.Match) -> str:
+    """Replacement for a _RE_SPEECH_MARKUP match: the cleaned inner text, or "link" for a URL."""
+    for group_name in ("emph", "link", "code"):
+        inner_text = match.group(group_name)
+        if inner_text is not None:
+            # Markup nested inside (e.g. a URL in inline code) is cleaned as well
+            return _RE_SPEECH_MARKUP.sub(_speech_markup_replacement, inner_text)
+    return "link" # Read "link" instead of a long URL
 
 def initialize_tts() -> bool:
     """
     Initializes the Text-to-Speech (TTS) engine.
 
     This function should be called once at application startup.
-    It sets up the pyttsx3 engine and configures default properties like rate.
+    It starts the TTS worker thread, which creates the pyttsx3 engine (so the engine
+    is used only from the thread that created it) and configures default properties
+    like rate. Blocks until the engine has been created or creation failed.
     If already initialized, it does nothing and returns True.
 
     Returns:
         bool: True if the engine was initialized successfully or is already initialized,
               False otherwise.
     """
-    global _tts_engine
-    if _tts_engine is not None:
-        logging.debug("TTS_UTILS: TTS engine is already initialized.")
-        return True
+    global _tts_thread
+    with _tts_init_lock:
+        if _tts_engine is not None:
+            logging.debug("TTS_UTILS: TTS engine is already initialized.")
+            return True
+        if _tts_thread is None or not _tts_thread.is_alive():
+            _tts_ready.clear()
+            _tts_thread = threading.Thread(target=_tts_loop, name="TTSWorker", daemon=True)
+            _tts_thread.start()
+    _tts_ready.wait()
+    return _tts_engine is not None
+
+def _create_tts_engine() -> typing.Optional[pyttsx3.Engine]:
+    """Creates and configures the pyttsx3 engine. Returns None on failure."""
     try:
-        _tts_engine = pyttsx3.init()
-        if _tts_engine:
-            _tts_engine.setProperty('rate', 180)  # Default speaking rate
+        engine = pyttsx3.init()
+        if engine:
+            engine.setProperty('rate', 180)  # Default speaking rate
             # Example: Set a specific voice if needed and available
-            # voices = _tts_engine.getProperty('voices')
+            # voices = engine.getProperty('voices')
             # if voices:
             #     # Attempt to find a preferred voice (e.g., by name or language)
             #     # For now, just logs available voices if in DEBUG mode.
             #     if logging.getLogger().isEnabledFor(logging.DEBUG):
             #         for voice in voices:
             #             logging.debug(f"TTS_UTILS: Available voice: ID='{voice.id}', Name='{voice.name}', Langs='{voice.languages}'")
-            #     # _tts_engine.setProperty('voice', voices[0].id) # Example: set first available voice
+            #     # engine.setProperty('voice', voices[0].id) # Example: set first available voice
             logging.info("TTS_UTILS: TTS engine initialized successfully.")
-            return True
+            return engine
         else: # pyttsx3.init() can return None on some systems if it fails
             logging.error("TTS_UTILS: pyttsx3.init() returned None, TTS engine not available.")
-            _tts_engine = None # Ensure it's None
-            return False
+            return None
     except Exception as e:
         logging.error(f"TTS_UTILS: TTS Engine Initialization Failed: {e}", exc_info=True)
-        _tts_engine = None
-        return False
+        return None
+
+def _tts_loop():
+    """
+    Body of the TTS worker thread: creates the engine, then speaks queued texts
+    one after another until a None sentinel arrives. Exits right away if the
+    engine could not be created.
+    """
+    global _tts_engine
+    try:
+        _tts_engine = _create_tts_engine()
+    finally:
+        _tts_ready.set()
+    if _tts_engine is None:
+        return
+    while True:
+        item = _tts_queue.get()
+        if item is None:
+            break
+        generation, text_to_speak = item
+        if generation != _tts_generation: # Cancelled by stop_speaking() while queued
+            continue
+        _speak_now(text_to_speak, generation)
+    logging.debug("TTS_UTILS: TTS worker thread finished.")
 
 def _clean_text_for_speech(text_to_clean: str) -> str:
     """
@@ -75,38 +135,28 @@ def _clean_text_for_speech(text_to_clean: str) -> str:
         logging.warning("TTS_UTILS: _clean_text_for_speech received non-string input.")
         return ""
         
-    text = text_to_clean
-    # Remove Markdown bold/italic markers (*, _, also multiple like **, __, ***, ___)
-    text = re.sub(r'(?<!\\)(\*|_){1,3}(.+?)(?<!\\)\1{1,3}', r'\2', text) # More robust removal
-    # Keep only link text from Markdown links [text](url)
-    text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)
-    # Keep only code content from Markdown code blocks/inline code (`code` or ```code```)
-    text = re.sub(r'`{1,3}(.*?)`{1,3}', r'\1', text, flags=re.DOTALL)
+    # Strip Markdown emphasis/links/code and replace full URLs with "link" in one pass
+    text = _RE_SPEECH_MARKUP.sub(_speech_markup_replacement, text_to_clean)
     # Decode HTML entities (e.g., & -> &, < -> <)
     text = html.unescape(text)
-    # Replace full URLs with the word "link" to avoid reading long URLs.
-    text = re.sub(r'http[s]?://\S+', 'link', text)
     # Remove or replace other characters/patterns that are bad for TTS as needed
     # e.g., text = text.replace("#", " hashtag ")
     return text.strip()
 
-def _tts_worker(text_to_speak: str, stop_event: threading.Event):
+def _split_sentences(text: str) -> typing.List[str]:
+    """Splits text at sentence ends and line breaks, dropping empty pieces."""
+    return [sentence for sentence in _RE_SENTENCE_BOUNDARY.split(text) if sentence]
+
+def _speak_now(text_to_speak: str, generation: int):
     """
-    The actual worker function that runs in a separate thread for TTS.
-    It uses the initialized _tts_engine to speak the cleaned text.
-    This function blocks until speech is finished or `_tts_engine.stop()` is called
-    (triggered by `stop_event` or direct `stop_speaking` call).
+    Speaks the cleaned text on the worker thread, one sentence per `runAndWait()`.
+    Returns when speech is finished, or at the next sentence boundary once
+    `stop_speaking` has moved on from `generation`.
 
     Args:
         text_to_speak (str): The text to be spoken.
-        stop_event (threading.Event): An event to signal this worker to stop.
-                                      While pyttsx3's stop() is the primary mechanism,
-                                      this event can be used for cooperative cancellation.
+        generation (int): The `_tts_generation` the text was queued in.
     """
-    if not _tts_engine:
-        logging.warning("TTS_UTILS: TTS worker cannot speak, engine not initialized.")
-        return
-
     try:
         cleaned_text = _clean_text_for_speech(text_to_speak)
         if not cleaned_text:
@@ -114,15 +164,14 @@ def _tts_worker(text_to_speak: str, stop_event: threading.Event):
             return
 
         logging.debug(f"TTS_UTILS: TTS worker starting to speak: '{cleaned_text[:70]}...'")
-        _tts_engine.say(cleaned_text)
-        _tts_engine.runAndWait()  # This blocks until speech is done or stop() is called.
-                                  # The stop_event is more for external check before starting long operations.
-        
-        if stop_event.is_set():
-            logging.debug("TTS_UTILS: TTS worker finished speaking but stop_event was set during speech.")
-        else:
-            logging.debug("TTS_UTILS: TTS worker finished speaking normally.")
-            
+        _tts_speaking.set()
+        for sentence in _split_sentences(cleaned_text):
+            if generation != _tts_generation: # Cancelled by stop_speaking()
+                logging.debug("TTS_UTILS: TTS worker stopped speaking at a sentence boundary.")
+                return
+            _tts_engine.say(sentence)
+            _tts_engine.runAndWait()  # This blocks until the sentence is done or stop() is called.
+        logging.debug("TTS_UTILS: TTS worker finished speaking.")
     except RuntimeError as e:
         # This can happen if stop() is called while the engine is in certain states,
         # or if the engine loop is interrupted.
@@ -130,106 +179,78 @@ def _tts_worker(text_to_speak: str, stop_event: threading.Event):
     except Exception as e:
         logging.error(f"TTS_UTILS: TTS worker unexpected error: {e}", exc_info=True)
     finally:
-        # Clear the stop event if this worker was responsible for it,
-        # or let the caller manage it if it's a shared event.
-        # For now, assuming this worker clears its own completion signal.
-        if stop_event.is_set(): # If it was told to stop
-            pass # The event is already set, indicating it was stopped.
-        # stop_event.clear() # Let the caller (speak_text/stop_speaking) manage the event state primarily.
-        logging.debug("TTS_UTILS: TTS worker thread finished.")
+        _tts_speaking.clear()
 
 
 def speak_text(text: str, force_new: bool = True) -> bool:
     """
-    Speaks the given text using the TTS engine in a separate thread.
+    Queues the given text for the TTS worker thread and returns immediately.
 
     By default (`force_new=True`), it stops any currently speaking text
-    before starting the new one.
+    and discards queued texts before queueing the new one.
 
     Args:
         text (str): The text to speak.
         force_new (bool): If True (default), stops current speech and starts new.
-                          If False, this implementation currently still stops previous speech.
-                          A more complex queueing system would be needed to truly allow
-                          non-forced additions if already speaking.
+                          If False, the text is spoken after everything already queued.
 
     Returns:
         bool: True if speech was initiated, False if the TTS engine is not available
               or text is empty.
     """
-    global _tts_thread, _tts_stop_event, _tts_engine
-
     if not _tts_engine:
         if not initialize_tts(): # Attempt to initialize if not already
             logging.error("TTS_UTILS: Cannot speak text, TTS engine failed to initialize.")
             return False
-        # Check again after attempt
-        if not _tts_engine:
-             logging.error("TTS_UTILS: TTS engine still not available after init attempt.")
-             return False
         
     if not text or not text.strip():
         logging.info("TTS_UTILS: No text provided to speak_text function.")
         return True # No action needed, considered successful in not failing.
 
     if force_new:
-        stop_speaking() # Stop any previously ongoing speech.
+        stop_speaking() # Stop any previously ongoing or queued speech.
 
-    # _tts_stop_event.clear() # Ensure stop event is clear before starting new speech.
-    # This is now handled more carefully in stop_speaking and the worker.
-    # If stop_speaking was effective, the event should be clear or the old thread gone.
-
-    _tts_thread = threading.Thread(target=_tts_worker, args=(text, _tts_stop_event), daemon=True)
-    _tts_thread.start()
-    logging.debug(f"TTS_UTILS: Initiated speech for: '{text[:70]}...'")
+    _tts_queue.put((_tts_generation, text))
+    logging.debug(f"TTS_UTILS: Queued speech for: '{text[:70]}...'")
     return True
 
 def stop_speaking():
     """
-    Stops any currently playing speech.
-
-    It signals the TTS worker thread to stop and commands the TTS engine to stop.
-    It then waits for the TTS thread to terminate.
+    Stops any currently playing speech and discards texts that are still queued.
+    Does not wait for the worker thread: it stops at the next sentence boundary at the
+    latest, and the engine's stop() usually ends the current sentence right away.
     """
-    global _tts_thread, _tts_stop_event, _tts_engine
+    global _tts_generation
     
     if not _tts_engine:
         logging.debug("TTS_UTILS: stop_speaking called but TTS engine not initialized.")
         return
 
-    if _tts_thread and _tts_thread.is_alive():
+    _tts_generation += 1 # Queued texts from before this call are skipped by the worker
+    if _tts_speaking.is_set():
         logging.debug("TTS_UTILS: Attempting to stop ongoing speech...")
-        _tts_stop_event.set()  # Signal the worker thread that a stop is requested.
-        
         try:
             _tts_engine.stop()  # Command the engine to stop its current utterance.
-                                # This might be blocking or raise an error on some platforms/states.
         except RuntimeError as e:
             logging.warning(f"TTS_UTILS: RuntimeError while calling _tts_engine.stop(): {e}")
         except Exception as e_stop: # Catch other potential errors from engine.stop()
             logging.error(f"TTS_UTILS: Error calling _tts_engine.stop(): {e_stop}", exc_info=True)
-
-        _tts_thread.join(timeout=1.5)  # Wait a bit longer for the thread to finish.
-        if _tts_thread.is_alive():
-            logging.warning("TTS_UTILS: TTS thread did not terminate in the expected time after stop signal.")
-        else:
-            logging.debug("TTS_UTILS: TTS thread terminated.")
-        _tts_thread = None # Clear the thread reference
     else:
-        logging.debug("TTS_UTILS: No active TTS thread to stop.")
-    
-    # Always clear the event after attempting a stop, so it's ready for the next speak_text call.
-    _tts_stop_event.clear()
+        logging.debug("TTS_UTILS: No ongoing speech to stop.")
 
+def shutdown_tts():
+    """Stops speech and ends the TTS worker thread."""
+    stop_speaking()
+    _tts_queue.put(None)
 
 def is_speaking() -> bool:
     """
-    Checks if the TTS is currently active (i.e., a speech thread is alive).
+    Checks if the TTS is currently active (speaking, or texts are queued).
 
     Returns:
         bool: True if speaking, False otherwise.
     """
-    return _tts_thread is not None and _tts_thread.is_alive()
+    return _tts_speaking.is_set() or not _tts_queue.empty()
 
 # --- Example Usage for Direct Testing of this Module ---
 if __name__ == '__main__':
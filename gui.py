@@ -8,7 +8,7 @@ LMBuddyCoreEngine for all core functionalities like LLM communication,
 OCR, TTS, and hotkey management. Communication with the engine for
 asynchronous operations is handled via a queue.
 """
-import functools # Added for functools.partial
+import functools # For functools.partial and lru_cache
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, simpledialog, font as tkFont, Listbox, END, Frame, Menu, Toplevel, Label
 from PIL import Image, ImageTk # For displaying images in GUI (e.g., from history)
@@ -22,12 +22,13 @@ import logging
 import os
 from tkhtmlview import HTMLLabel # For rendering HTML/Markdown content
 import markdown2 # For Markdown to HTML conversion
-import queue      # For the GUI update queue
 import typing     # For type hinting
 
 # Import from our new core package
 from core import config_manager 
 from core.engine import LMBuddyCoreEngine
+from core.gui_channel import GuiChannel
+from core.image_pager import resolve_image
 from core import message_types as mt # For interpreting messages from the engine
 
 # --- Global Application Stop Event ---
@@ -38,6 +39,11 @@ long-running threads like the hotkey listener or LLM streaming) to shut down.
 It's set by the GUI's on_closing method.
 """
 
+HISTORY_USER_FG: str = "blue"         # History row colors; the assistant color is the listbox default
+HISTORY_ASSISTANT_FG: str = "#006400"
+STATUS_FLASH_MS: int = 2500           # How long confirmations like "Copied to clipboard." stay in the status bar
+GUI_QUEUE_WATCHDOG_MS: int = 200      # Fallback poll of the engine message channel; normally woken by <<EngineMsg>>
+
 # --- Logging Setup ---
 logging.basicConfig(
     level=logging.DEBUG,
@@ -50,7 +56,8 @@ class ToolTip:
     def __init__(self, widget, text: str):
         self.widget = widget
         self.text = text
-        self.tooltip_window: typing.Optional[tk.Toplevel] = None
+        self.tooltip_window: typing.Optional[tk.Toplevel] = None # Created on first show, then withdrawn/shown
+        self.visible: bool = False
         self.id: typing.Optional[str] = None # Stores the .after() id
         self.widget.bind("<Enter>", self.enter)
         self.widget.bind("<Leave>", self.leave)
@@ -67,29 +74,53 @@ class ToolTip:
             self.widget.after_cancel(scheduled_id)
 
     def show_tooltip(self, event=None):
-        if self.tooltip_window: return
+        if self.visible: return
         x, y = self.widget.winfo_rootx() + 20, self.widget.winfo_rooty() + self.widget.winfo_height() + 5
-        self.tooltip_window = tk.Toplevel(self.widget)
-        self.tooltip_window.wm_overrideredirect(True) # No window decorations
-        self.tooltip_window.attributes("-topmost", True)
+        if self.tooltip_window is None:
+            # The window is kept after the first show; later shows only move and deiconify it
+            self.tooltip_window = tk.Toplevel(self.widget)
+            self.tooltip_window.wm_overrideredirect(True) # No window decorations
+            self.tooltip_window.attributes("-topmost", True)
+            lbl = tk.Label(self.tooltip_window, text=self.text, justify='left',
+                           background="#ffffe0", relief='solid', borderwidth=1,
+                           wraplength=300, font=("tahoma", "8", "normal"))
+            lbl.pack(ipadx=2, ipady=2)
         self.tooltip_window.wm_geometry(f"+{x}+{y}")
-        lbl = tk.Label(self.tooltip_window, text=self.text, justify='left',
-                       background="#ffffe0", relief='solid', borderwidth=1,
-                       wraplength=300, font=("tahoma", "8", "normal"))
-        lbl.pack(ipadx=2, ipady=2)
+        self.tooltip_window.deiconify()
+        self.visible = True
 
     def hide_tooltip(self):
-        if self.tooltip_window:
-            self.tooltip_window.destroy()
-        self.tooltip_window = None
+        if self.visible and self.tooltip_window:
+            self.tooltip_window.withdraw()
+        self.visible = False
 
 # --- Markdown to HTML Conversion ---
+# One converter for the whole GUI: markdown2.markdown() builds a new one (and sets up
+# the extras) on every call. Only used from the Tk main thread.
+_MARKDOWN_EXTRAS = [
+    "fenced-code-blocks", "tables", "nofollow", "cuddled-lists",
+    "break-on-newline", "code-friendly", "smarty-pants"
+]
+_MARKDOWN_CONVERTER = markdown2.Markdown(extras=_MARKDOWN_EXTRAS)
+
+def _prewarm_markdown():
+    """
+    Converts a sample with every extra on a throwaway converter (background thread at startup),
+    so lazy imports (e.g. pygments for fenced code) and regex compilation do not delay the first response.
+    Uses its own converter because _MARKDOWN_CONVERTER is not thread-safe.
+    """
+    try:
+        markdown2.Markdown(extras=_MARKDOWN_EXTRAS).convert(
+            "# Warm\n\n**bold** _it_ \"quotes\" [link](http://example.com)\n\n"
+            "| a | b |\n|---|---|\n| 1 | 2 |\n\n- item\n- item\n\n```python\nprint('x')\n```\n")
+        logging.debug("GUI: Markdown renderer warmed up.")
+    except Exception as e:
+        logging.debug(f"GUI: Markdown warm-up failed: {e}")
+
+@functools.lru_cache(maxsize=128)
 def markdown_to_html_custom(md_text: str) -> str:
-    """Converts Markdown text to HTML using custom extras."""
-    return markdown2.markdown(md_text, extras=[
-        "fenced-code-blocks", "tables", "nofollow", "cuddled-lists",
-        "break-on-newline", "code-friendly", "smarty-pants"
-    ])
+    """Converts Markdown text to HTML using custom extras. Results are cached, as the same responses are re-rendered."""
+    return str(_MARKDOWN_CONVERTER.convert(md_text))
 
 # --- Main Application GUI Class (Classic Window) ---
 class LMBuddyOverlay(tk.Tk):
@@ -98,27 +129,47 @@ class LMBuddyOverlay(tk.Tk):
     It provides UI elements for interacting with the LMBuddyCoreEngine.
     """
 
+    HISTORY_TOOLTIP_DELAY_MS: int = 120 # The pointer must rest on a history row this long before its tooltip shows
+
     # --- Method Definitions (Callbacks & UI Updaters are now defined before __init__) ---
-    def on_history_motion(self, event):
-        """Handles mouse motion over the history listbox to show tooltips."""
+    def _cancel_history_tooltip(self):
+        """Hides the history tooltip and cancels a scheduled one."""
+        if self._hist_motion_after is not None:
+            self.after_cancel(self._hist_motion_after)
+            self._hist_motion_after = None
         if self.history_tooltip_active:
-            self.history_tooltip_active.destroy()
+            self.history_tooltip_active.withdraw()
             self.history_tooltip_active = None
+        self._hist_motion_last_idx = -1
+
+    def on_history_motion(self, event):
+        """Handles mouse motion over the history listbox: schedules the tooltip of the row under the pointer."""
         try:
             idx = self.hist_lb.nearest(event.y)
             box = self.hist_lb.bbox(idx)
             if not(box and 0 <= idx < self.hist_lb.size() and box[1] <= event.y < box[1] + box[3]):
+                self._cancel_history_tooltip()
+                return
+        except tk.TclError:
+            return
+        if idx == self._hist_motion_last_idx: # Still on the same row: keep the shown or scheduled tooltip
+            return
+        self._cancel_history_tooltip()
+        self._hist_motion_last_idx = idx
+        self._hist_motion_after = self.after(self.HISTORY_TOOLTIP_DELAY_MS,
+                                             functools.partial(self._show_history_tooltip, idx, event.x_root, event.y_root))
+
+    def _show_history_tooltip(self, idx, x_root, y_root):
+        """Shows the tooltip for history row `idx` near the pointer position (x_root, y_root)."""
+        self._hist_motion_after = None
+        try:
+            if idx >= len(self.engine.context_history):
                 return
-            
             role, content_or_parts, _ = self.engine.context_history[idx]
-            tooltip_text = ""
-            if isinstance(content_or_parts, str):
-                tooltip_text = content_or_parts
-            elif isinstance(content_or_parts, list): 
-                text_parts = [p["text"] for p in content_or_parts if p.get("type") == "text" and p.get("text")]
-                tooltip_text = "\n".join(text_parts)
-                if any(p.get("type") == "image_url" for p in content_or_parts): 
-                    tooltip_text = "[Image Data Sent]\n" + tooltip_text
+            text_parts, has_image_part = self._history_text_parts(content_or_parts)
+            tooltip_text = "\n".join(text_parts)
+            if has_image_part: 
+                tooltip_text = "[Image Data Sent]\n" + tooltip_text
             
             if role == "user": 
                 action_desc = tooltip_text.split("Extrahierter Text:")[0].split("Der folgende Inhalt")[0].strip()
@@ -127,23 +178,25 @@ class LMBuddyOverlay(tk.Tk):
             
             if len(tooltip_text) > 400: tooltip_text = tooltip_text[:400] + "..."
             
-            x_pos, y_pos = event.x_root + 15, event.y_root + 10
-            self.history_tooltip_active = Toplevel(self.hist_lb)
-            self.history_tooltip_active.wm_overrideredirect(True)
-            self.history_tooltip_active.attributes("-topmost", True)
-            Label(self.history_tooltip_active, text=tooltip_text, justify='left', 
-                  bg="#ffffe0", relief='solid', bd=1, wraplength=400, 
-                  font=("tahoma", "8", "normal")).pack(ipadx=2, ipady=2)
-            self.history_tooltip_active.update_idletasks()
-            self.history_tooltip_active.wm_geometry(f"+{x_pos}+{y_pos}")
+            x_pos, y_pos = x_root + 15, y_root + 10
+            if self._hist_tooltip_window is None: # One window for all rows; withdrawn while hidden
+                self._hist_tooltip_window = Toplevel(self.hist_lb)
+                self._hist_tooltip_window.wm_overrideredirect(True)
+                self._hist_tooltip_window.attributes("-topmost", True)
+                self._hist_tooltip_label = Label(self._hist_tooltip_window, justify='left', 
+                                                 bg="#ffffe0", relief='solid', bd=1, wraplength=400, 
+                                                 font=("tahoma", "8", "normal"))
+                self._hist_tooltip_label.pack(ipadx=2, ipady=2)
+            self._hist_tooltip_label.config(text=tooltip_text)
+            self._hist_tooltip_window.wm_geometry(f"+{x_pos}+{y_pos}")
+            self._hist_tooltip_window.deiconify()
+            self.history_tooltip_active = self._hist_tooltip_window
         except tk.TclError: pass 
         except Exception as e: logging.error(f"GUI: History tooltip error: {e}", exc_info=True)
 
     def on_history_leave(self,event):
         """Hides the history tooltip when the mouse leaves an item."""
-        if self.history_tooltip_active:
-            self.history_tooltip_active.destroy()
-            self.history_tooltip_active = None
+        self._cancel_history_tooltip()
 
     def on_history_select(self,event):
         """Handles selection of an item in the history listbox."""
@@ -151,77 +204,155 @@ class LMBuddyOverlay(tk.Tk):
         if selection:
             index = selection[0]
             role, content_or_parts, img_obj = self.engine.context_history[index]
-            display_text = ""
-            if isinstance(content_or_parts, str): display_text = content_or_parts
-            elif isinstance(content_or_parts, list):
-                text_parts = [p["text"] for p in content_or_parts if p.get("type") == "text" and p.get("text")]
-                display_text = "\n\n".join(text_parts)
+            display_text = "\n\n".join(self._history_text_parts(content_or_parts)[0])
             
             self.display_message_in_gui(display_text, 
                                         is_raw_text=(role=="assistant" and display_text.startswith("[")), 
                                         update_history=False)
             if img_obj and role == "user":
-                self.show_image_from_history(img_obj)
+                self.show_image_from_history(resolve_image(img_obj))
 
     def update_context_status_display(self): # KORRIGIERT: Definition ist jetzt auf Klassenebene
-        """Updates the status bar with context length and token counts."""
+        """Schedules a status bar update; all calls until the Tk loop is next idle result in one update."""
+        if not self._status_dirty:
+            self._status_dirty = True
+            self.after_idle(self._flush_context_status_display)
+
+    def _flush_context_status_display(self):
+        self._status_dirty = False
+        self._do_update_context_status_display()
+
+    def _flash_status(self, text: str, ms: int = STATUS_FLASH_MS):
+        """Shows a short confirmation in the status bar for `ms` milliseconds instead of a modal dialog."""
+        if self._status_flash_after is not None:
+            self.after_cancel(self._status_flash_after)
+        self._status_flash_text = text
+        self._status_flash_after = self.after(ms, self._end_status_flash)
+        self.update_context_status_display()
+
+    def _end_status_flash(self):
+        self._status_flash_after = None
+        self._status_flash_text = None
+        self.update_context_status_display()
+
+    def _do_update_context_status_display(self):
+        """Updates the status bar with context length and token counts (or a flashed message, see `_flash_status`)."""
+        if self._status_flash_text is not None:
+            self.stat_lbl.config(text=self._status_flash_text, fg="black")
+            return
         num_total_messages = len(self.engine.context_history)
         dialog_turns = num_total_messages // 2
         
         total_calc_tokens = self.current_prompt_tokens + self.current_completion_tokens
         token_info_str = f"P: {self.current_prompt_tokens}, C: {self.current_completion_tokens} = Total: {total_calc_tokens}"
         
-        if not self.engine.get_config_value("tokenizer_model_name"):
+        cfg = self._cfg
+        if not cfg["tokenizer_model_name"]:
             token_info_str = "Tokens: N/A (Tokenizer not configured)"
         
-        image_in_history = any(role == 'user' and img is not None for role, _, img in self.engine.context_history)
-        if image_in_history: token_info_str += " (+Img in hist.)"
+        if self._hist_has_image: token_info_str += " (+Img in hist.)"
         
         status_text = f"Context: {dialog_turns} Turns ({num_total_messages} Msgs) / {token_info_str}"
         
-        warn_msg_thresh = int(self.engine.get_config_value("max_context_messages", 30))
-        warn_token_thresh = int(self.engine.get_config_value("max_context_tokens_warning", 6000))
+        warn_msg_thresh = cfg["max_context_messages"]
+        warn_token_thresh = cfg["max_context_tokens_warning"]
         
         is_warning = (num_total_messages > warn_msg_thresh) or \
-                     (self.engine.get_config_value("tokenizer_model_name") and total_calc_tokens > warn_token_thresh)
+                     (cfg["tokenizer_model_name"] and total_calc_tokens > warn_token_thresh)
         
         self.stat_lbl.config(text=f"{status_text}{' - LONG!' if is_warning else ''}", 
                              fg="red" if is_warning else "black")
 
+    @staticmethod
+    def _extract_text_parts(content_or_parts: typing.Union[str, list]) -> typing.Tuple[typing.Tuple[str, ...], bool]:
+        """Returns the text parts of a history entry's content and whether it contains an image part."""
+        if isinstance(content_or_parts, str):
+            return (content_or_parts,), False
+        if isinstance(content_or_parts, list):
+            text_parts = tuple(p["text"] for p in content_or_parts if p.get("type") == "text" and p.get("text"))
+            return text_parts, any(p.get("type") == "image_url" for p in content_or_parts)
+        return (), False
+
+    def _history_text_parts(self, content_or_parts: typing.Union[str, list]) -> typing.Tuple[typing.Tuple[str, ...], bool]:
+        """Like `_extract_text_parts`, but reuses the result stored with the entry's listbox row."""
+        cached_row = self._hist_row_cache.get(id(content_or_parts))
+        if cached_row is not None and cached_row[0] is content_or_parts:
+            return cached_row[3], cached_row[4]
+        return self._extract_text_parts(content_or_parts)
+
+    def _format_history_row(self, entry: tuple, text_parts: typing.Tuple[str, ...],
+                            has_image_part: bool) -> typing.Tuple[str, str]:
+        """Returns the listbox text and text color for a (role, content, image) history entry."""
+        role, _, img_obj = entry
+        prefix = self._user_prefix if role == "user" else self._assistant_prefix
+        display_text = " ".join(text_parts)
+        if has_image_part or (img_obj and role == "user"):
+            prefix += "[🖼️] "
+        
+        shortened_text = display_text[:80].replace('\n', ' ') + ("..." if len(display_text) > 80 else "")
+        return f"{prefix}{shortened_text}", HISTORY_USER_FG if role == "user" else HISTORY_ASSISTANT_FG
+
     def update_history_display(self): # KORRIGIERT: Definition ist jetzt auf Klassenebene
-        """Updates the history listbox with content from the engine's context_history."""
-        self.hist_lb.delete(0, END)
-        avatar_name = self.engine.get_config_value('avatar_name', 'Sherlox')
-        for i, (role, content_or_parts, img_obj) in enumerate(self.engine.context_history):
-            prefix = "👤 User: " if role == "user" else f"🦊 {avatar_name}: "
-            display_text = ""
-            if isinstance(content_or_parts, str):
-                display_text = content_or_parts
-            elif isinstance(content_or_parts, list):
-                text_parts = [p["text"] for p in content_or_parts if p.get("type") == "text" and p.get("text")]
-                display_text = " ".join(text_parts)
-                # KORRIGIERTE EINRÜCKUNG für das if any(...)
-                if any(p.get("type") == "image_url" for p in content_or_parts):
-                    prefix += "[🖼️] "
-            if img_obj and role == "user" and "[🖼️]" not in prefix:
-                prefix += "[🖼️] "
-            
-            shortened_text = display_text[:80].replace('\n', ' ') + ("..." if len(display_text) > 80 else "")
-            self.hist_lb.insert(END, f"{prefix}{shortened_text}")
-            self.hist_lb.itemconfig(i, {'fg': 'blue' if role == "user" else '#006400'})
+        """
+        Updates the history listbox with content from the engine's context_history.
+        Only rows appended since the last update are inserted; the list is rebuilt when
+        the history was cleared or rewritten (compared by content identity) or the avatar name changed.
+        """
+        history = self.engine.context_history # Local reference: the engine swaps in new lists
+        rendered = self._hist_rendered_sources
+        n_rendered = len(rendered)
+        avatar_name = self._cfg["avatar_name"]
+        row_cache = self._hist_row_cache
+        if (len(history) < n_rendered or avatar_name != self._hist_rendered_avatar
+                or any(history[i][1] is not rendered[i] for i in range(n_rendered))):
+            self.hist_lb.delete(0, END)
+            rendered.clear()
+            n_rendered = 0
+            self._hist_has_image = False
+            if avatar_name != self._hist_rendered_avatar:
+                row_cache.clear() # Assistant rows contain the avatar name
+            else: # Keep the rows of entries that survived the rewrite (e.g. the tail after compaction)
+                live_ids = {id(entry[1]) for entry in history}
+                for key in [key for key in row_cache if key not in live_ids]:
+                    del row_cache[key]
+            self._hist_rendered_avatar = avatar_name
+        new_rows: typing.List[str] = []
+        recolored_rows: typing.List[typing.Tuple[int, str]] = [] # Rows not in the listbox's default (assistant) color
+        for i in range(n_rendered, len(history)):
+            entry = history[i]
+            content_or_parts = entry[1]
+            if entry[0] == 'user' and entry[2] is not None:
+                self._hist_has_image = True
+            cached_row = row_cache.get(id(content_or_parts))
+            if cached_row is None or cached_row[0] is not content_or_parts:
+                # The content is kept in the cache, so its id cannot be reused while cached
+                text_parts, has_image_part = self._extract_text_parts(content_or_parts)
+                cached_row = (content_or_parts, *self._format_history_row(entry, text_parts, has_image_part),
+                              text_parts, has_image_part)
+                row_cache[id(content_or_parts)] = cached_row
+            row_text, row_color = cached_row[1], cached_row[2]
+            new_rows.append(row_text)
+            if row_color != HISTORY_ASSISTANT_FG:
+                recolored_rows.append((i, row_color))
+            rendered.append(content_or_parts)
+        if new_rows:
+            self.hist_lb.insert(END, *new_rows) # One Tcl call for all new rows
+            for i, row_color in recolored_rows:
+                self.hist_lb.itemconfig(i, fg=row_color)
         
-        if self.hist_lb.size() > 0:
+        if len(history) > n_rendered: # Scroll to new rows only; otherwise keep the user's scroll position
             self.hist_lb.yview(END)
         self.update_context_status_display()
 
     def set_thinking_status(self,is_thinking): # KORRIGIERT: Definition ist jetzt auf Klassenebene
         self.llm_is_thinking=is_thinking
-        avatar=self.engine.get_config_value('avatar_name','Sherlox')
+        avatar=self._cfg["avatar_name"]
         if is_thinking:
             self.current_prompt_tokens=0
             self.current_completion_tokens=0
             # KORREKTER AUFRUF VON display_message_in_gui
-            self.after(0,lambda: self.display_message_in_gui(f"🦊 {avatar} is thinking...",is_raw_text=True,update_history=False))
+            # Skipped if the response already started streaming (the chunk branch clears llm_is_thinking)
+            self.after(0,lambda: self.llm_is_thinking and self.display_message_in_gui(f"🦊 {avatar} is thinking...",is_raw_text=True,update_history=False))
         self.update_context_status_display()
 
     # --- Initialization and UI Setup ---
@@ -229,16 +360,34 @@ class LMBuddyOverlay(tk.Tk):
         super().__init__()
         # print(f"DEBUG: LMBuddyOverlay instance __init__, id(self): {id(self)}") # Debug-Ausgabe kann bleiben oder weg
         
-        self.gui_update_queue = queue.Queue()
+        threading.Thread(target=_prewarm_markdown, name="MarkdownWarmup", daemon=True).start()
+        self.gui_update_queue = GuiChannel()
         self.engine = LMBuddyCoreEngine(gui_queue=self.gui_update_queue, app_stop_event=APP_STOP_EVENT)
+        self._cfg: typing.Dict[str, typing.Any] = {} # Config values read on every update (see _reload_cfg)
+        self._cfg_revision: int = -1
+        self._reload_cfg()
 
         app_version_str = self.engine.get_config_value("app_version", "v0.0.0")
         base_window_title = self.engine.get_config_value("classic_ui_title", "LM Buddy")
         self.title(f"{base_window_title} {app_version_str}")
         
         self.current_raw_response_text: str = ""
+        self._stream_escaped_source: str = "" # Raw text that _stream_escaped_text was escaped from
+        self._stream_escaped_text: str = ""   # HTML-escaped streamed text, extended per render
         self.llm_is_thinking: bool = False
         self.history_tooltip_active: typing.Optional[tk.Toplevel] = None
+        self._hist_tooltip_window: typing.Optional[tk.Toplevel] = None # Reused history tooltip (see _show_history_tooltip)
+        self._hist_tooltip_label: typing.Optional[tk.Label] = None
+        self._hist_motion_after: typing.Optional[str] = None # .after() id of the scheduled history tooltip
+        self._hist_motion_last_idx: int = -1 # History row the tooltip is shown or scheduled for
+        self._hist_rendered_sources: typing.List[typing.Any] = [] # Content of each history row shown in hist_lb
+        self._hist_rendered_avatar: typing.Optional[str] = None   # Avatar name the rows were rendered with
+        self._hist_row_cache: typing.Dict[int, tuple] = {} # id(content) -> (content, row text, color, text parts, has image part)
+        self._hist_has_image: bool = False # A user turn in hist_lb has an image (maintained by update_history_display)
+        self._status_dirty: bool = False   # A status bar update is scheduled for the next idle tick
+        self._status_flash_text: typing.Optional[str] = None # Transient status bar message (see _flash_status)
+        self._status_flash_after: typing.Optional[str] = None
+        self._ocr_langs_cache: typing.Optional[typing.List[str]] = None # Installed Tesseract languages, once queried
         self.current_prompt_tokens: int = 0
         self.current_completion_tokens: int = 0
         
@@ -250,10 +399,28 @@ class LMBuddyOverlay(tk.Tk):
 
         self.setup_menu()
         self.setup_gui_layout() 
+        self._create_main_buttons()
+        self._create_ocr_action_buttons()
         self._display_main_buttons()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.update_context_status_display() 
-        self.after(50, functools.partial(self._process_gui_update_queue)) # KORRIGIERT: functools.partial
+        # Engine messages wake the GUI through a virtual event; the slow poll is only a safety net.
+        self.bind("<<EngineMsg>>", self._on_engine_message_event)
+        self.gui_update_queue.on_wakeup = self._signal_engine_message
+        self.after(GUI_QUEUE_WATCHDOG_MS, functools.partial(self._process_gui_update_queue)) # KORRIGIERT: functools.partial
+
+    def _reload_cfg(self):
+        """Snapshots the config values used by the frequent display updates into `self._cfg`."""
+        self._cfg_revision = config_manager.get_revision()
+        self._cfg = {
+            "avatar_name": self.engine.get_config_value("avatar_name", "Sherlox"),
+            "tokenizer_model_name": self.engine.get_config_value("tokenizer_model_name"),
+            "max_context_messages": int(self.engine.get_config_value("max_context_messages", 30)),
+            "max_context_tokens_warning": int(self.engine.get_config_value("max_context_tokens_warning", 6000)),
+        }
+        # History row prefixes, built once per avatar name instead of per row
+        self._user_prefix = "👤 User: "
+        self._assistant_prefix = f"🦊 {self._cfg['avatar_name']}: "
 
     def setup_menu(self):
         """Sets up the main application menu."""
@@ -276,7 +443,7 @@ class LMBuddyOverlay(tk.Tk):
         hist_f = tk.Frame(self.main_pane, bg='lightgrey')
         self.main_pane.add(hist_f, stretch="first", height=150, minsize=50)
         tk.Label(hist_f, text="Conversation History:", font=("Arial", 10, "italic"), bg='lightgrey').pack(pady=(5, 0), padx=5, anchor='w')
-        self.hist_lb = Listbox(hist_f, font=("Arial", 9), bg="white", selectbackground="#a6a6a6", activestyle="none")
+        self.hist_lb = Listbox(hist_f, font=("Arial", 9), bg="white", fg=HISTORY_ASSISTANT_FG, selectbackground="#a6a6a6", activestyle="none")
         self.hist_lb.pack(expand=True, fill="both", padx=5, pady=(0, 5))
         self.hist_lb.bind("<<ListboxSelect>>", self.on_history_select)
         
@@ -319,11 +486,29 @@ class LMBuddyOverlay(tk.Tk):
         self.dyn_btn_f = tk.Frame(self.btn_cont, bg='white')
         self.dyn_btn_f.pack(fill="x", expand=True)
 
+    def _signal_engine_message(self):
+        """GuiChannel wakeup hook (runs on engine threads): queues a <<EngineMsg>> event for the Tk loop."""
+        self.event_generate("<<EngineMsg>>", when="tail")
+
+    def _on_engine_message_event(self, event=None):
+        """Handles <<EngineMsg>>: drains the engine message channel on the Tk thread."""
+        self._drain_gui_update_queue()
+
     def _process_gui_update_queue(self):
-        # print(f"DEBUG: _process_gui_update_queue called. Type of self: {type(self)}, id(self): {id(self)}")
+        """Watchdog poll: drains messages whose wakeup event was missed (e.g. posted before the mainloop ran)."""
+        try:
+            self._drain_gui_update_queue()
+        finally:
+            self.after(GUI_QUEUE_WATCHDOG_MS, functools.partial(self._process_gui_update_queue)) # KORRIGIERT: functools.partial
+
+    def _drain_gui_update_queue(self):
+        # print(f"DEBUG: _drain_gui_update_queue called. Type of self: {type(self)}, id(self): {id(self)}")
+        if config_manager.get_revision() != self._cfg_revision:
+            self._reload_cfg()
+        stream_render_pending = False # Streamed text not yet shown; rendered once per drain
         try:
-            while True:
-                message = self.gui_update_queue.get_nowait()
+            # Drain everything pending in one go; consecutive stream chunks arrive pre-merged.
+            for message in self.gui_update_queue.drain():
                 # --- DEBUG-PRINTS VOR DEM FEHLERHAFTEN AUFRUF (kann später entfernt werden) ---
                 # if message is None or (message and message.get("type") == mt.MSG_TYPE_OCR_RESULT_FOR_ACTIONS):
                 #     print(f"DEBUG: In _process_gui_update_queue, BEFORE calling set_thinking_status:")
@@ -334,20 +519,24 @@ class LMBuddyOverlay(tk.Tk):
                 #         print(f"  DEBUG: type(self.set_thinking_status) is {type(self.set_thinking_status)}")
                 # --- ENDE DEBUG-PRINTS ---
                 
+                msg_type = message.get("type") if message is not None else None
+                if stream_render_pending and msg_type != mt.MSG_TYPE_LLM_CHUNK:
+                    # Show the streamed text before anything that may replace it
+                    self._render_stream_buffer(); stream_render_pending = False
+
                 if message is None: 
                     self.set_thinking_status(False) # Sollte jetzt funktionieren
                     if self.current_raw_response_text:
                         self.html_out.set_html(markdown_to_html_custom(self.current_raw_response_text))
                         self.engine.speak(self.current_raw_response_text)
                     self.update_history_display()
-                    self.gui_update_queue.task_done(); continue
+                    continue
                 
-                msg_type = message.get("type")
                 if msg_type == mt.MSG_TYPE_LLM_CHUNK:
-                    if self.llm_is_thinking: self.current_raw_response_text = ""; self.html_out.set_html("<i>Streaming...</i>"); self.llm_is_thinking = False
+                    if self.llm_is_thinking: self.current_raw_response_text = ""; self._stream_escaped_source = self._stream_escaped_text = ""; self.llm_is_thinking = False
                     self.current_raw_response_text += message.get("content", "")
-                    self.html_out.set_html(f"<pre style='white-space:pre-wrap;word-wrap:break-word;'>{html.escape(self.current_raw_response_text)}</pre>")
-                    if "completion_tokens_live" in message: self.current_completion_tokens = message["completion_tokens_live"]; self.update_context_status_display()
+                    if "completion_tokens_live" in message: self.current_completion_tokens = message["completion_tokens_live"]
+                    stream_render_pending = True
                 elif msg_type == mt.MSG_TYPE_LLM_PROMPT_TOKENS_UPDATE:
                     self.current_prompt_tokens = message.get("count",0); self.current_completion_tokens=0; self.update_context_status_display()
                 elif msg_type == mt.MSG_TYPE_LLM_FINAL_TOKEN_COUNTS:
@@ -359,17 +548,37 @@ class LMBuddyOverlay(tk.Tk):
                     self.set_thinking_status(False); self.hide_ocr_action_buttons_and_show_main()
                 elif msg_type == mt.MSG_TYPE_INFO:
                     self.display_message_in_gui(message.get("content",""),is_raw_text=True)
-                    if message.get("content","").startswith("Context and buffers cleared"):
-                        self.update_history_display(); self.update_context_status_display()
+                elif msg_type == mt.MSG_TYPE_CONTEXT_CLEARED:
+                    self.current_prompt_tokens = message.get("prompt_tokens",0); self.current_completion_tokens = message.get("completion_tokens",0)
+                    self.display_message_in_gui(message.get("info",""),is_raw_text=True,update_history=False)
+                    self.after_idle(self._refresh_after_context_clear)
                 elif msg_type == mt.MSG_TYPE_OCR_RESULT_FOR_ACTIONS:
                     self.set_thinking_status(False)
                     self.show_ocr_action_buttons(message.get("ocr_text",""), message.get("image_pil"))
                 elif msg_type == mt.MSG_TYPE_OCR_ACTIONS_HIDE:
                     self.hide_ocr_action_buttons_and_show_main()
-                self.gui_update_queue.task_done()
-        except queue.Empty: pass
+                elif msg_type == mt.MSG_TYPE_CLIPBOARD_COPIED:
+                    self._on_clipboard_copied(message.get("error"))
         finally:
-            self.after(50, functools.partial(self._process_gui_update_queue)) # KORRIGIERT: functools.partial
+            if stream_render_pending:
+                self._render_stream_buffer()
+
+    def _render_stream_buffer(self):
+        """Shows the response streamed so far and the live token count (once per queue drain)."""
+        raw_text = self.current_raw_response_text
+        escaped_source = self._stream_escaped_source
+        # html.escape works per character, so only the text appended since the last render is escaped
+        if raw_text.startswith(escaped_source):
+            self._stream_escaped_text += html.escape(raw_text[len(escaped_source):])
+        else: # New response (or the buffer was replaced)
+            self._stream_escaped_text = html.escape(raw_text)
+        self._stream_escaped_source = raw_text
+        self.html_out.set_html(f"<pre style='white-space:pre-wrap;word-wrap:break-word;'>{self._stream_escaped_text}</pre>")
+        self.update_context_status_display()
+
+    def _refresh_after_context_clear(self):
+        """Redraws history and status bar once after a MSG_TYPE_CONTEXT_CLEARED message."""
+        self.update_history_display(); self.update_context_status_display()
 
     def change_hotkey(self):
         curr = self.engine.get_config_value("hotkey","ctrl+shift+f")
@@ -397,8 +606,10 @@ class LMBuddyOverlay(tk.Tk):
         if new_t is not None:self.engine.set_config_value("temperature",round(new_t,2));messagebox.showinfo("Temperature Changed",f"Temp set to {self.engine.get_config_value('temperature')}.",parent=self)
 
     def change_ocr_language(self):
-        try: import pytesseract as tp;langs=sorted([l for l in tp.get_languages(config='') if l!='osd'])
-        except Exception as e:logging.error(f"OCR langs err:{e}");langs=["deu","eng"];messagebox.showwarning("OCR Languages","Could not get Tesseract langs.",parent=self)
+        langs=self._ocr_langs_cache # get_languages runs the tesseract binary; ask it once per session
+        if langs is None:
+            try: import pytesseract as tp;langs=self._ocr_langs_cache=sorted([l for l in tp.get_languages(config='') if l!='osd'])
+            except Exception as e:logging.error(f"OCR langs err:{e}");langs=["deu","eng"];messagebox.showwarning("OCR Languages","Could not get Tesseract langs.",parent=self)
         curr=self.engine.get_config_value("ocr_language","deu");opts=", ".join(langs)
         new_l=simpledialog.askstring("Change OCR Language",f"Current:{curr}\nAvailable:{opts[:100]}...\nEnter code:",initialvalue=curr,parent=self)
         if new_l:
@@ -406,13 +617,38 @@ class LMBuddyOverlay(tk.Tk):
             if new_l in langs or (len(new_l)==3 and new_l.isalpha()):self.engine.set_config_value("ocr_language",new_l);messagebox.showinfo("OCR Language Changed",f"OCR lang set to '{new_l}'.",parent=self)
             else:messagebox.showerror("Invalid OCR Language",f"'{new_l}' not recognized.",parent=self)
 
-    def _clear_dynamic_buttons(self):[w.destroy() for w in self.dyn_btn_f.winfo_children()]
+    # OCR action buttons in display order: (action key, button text, tooltip)
+    OCR_ACTIONS: typing.Tuple[typing.Tuple[str, str, str], ...] = (
+        ("summarize","Summarize📝","Sum"),("analyze_image","AnalyzeImg🖼️","AnalyzeImg"),("improve_text","ImproveTxt✨","ImproveTxt"),
+        ("bullet_points","Bullets📋","Bullets"),("translate","Translate🌐","Translate"),("help","Help💡","Help"),
+        ("set_context_for_question","Ask🤔","SetContext"),("cancel","Cancel❌","Cancel"))
+
+    def _create_ocr_action_buttons(self):
+        """Creates the OCR action buttons once; show_ocr_action_buttons only packs the ones that apply."""
+        conf={"relief":tk.RAISED,"font":("Arial",9,"bold"),"pady":3}
+        self._ocr_action_args: typing.Optional[tuple] = None # (ocr_txt, img_pil) of the capture the buttons act on
+        self._ocr_btn_pool: typing.Dict[str, tk.Button] = {}
+        for k,t,tip in self.OCR_ACTIONS:
+            b=tk.Button(self.dyn_btn_f,text=t,command=functools.partial(self._on_ocr_action_button,k),**conf,bg="#E8F8F5",fg="#117A65")
+            ToolTip(b,tip);self._ocr_btn_pool[k]=b
+
+    def _on_ocr_action_button(self,key):
+        if self._ocr_action_args is not None:self.handle_ocr_action(key,*self._ocr_action_args)
+
+    def _create_main_buttons(self):
+        """Creates the main buttons once; _display_main_buttons only packs them."""
+        conf={"relief":tk.GROOVE,"borderwidth":1,"font":("Arial",10),"padx":5,"pady":2}
+        btn_r=tk.Button(self.dyn_btn_f,text="🔄 Read Aloud",command=self.read_aloud_again,**conf);ToolTip(btn_r,"Read last response.")
+        btn_s=tk.Button(self.dyn_btn_f,text="🤫 Stop Speech",command=self.stop_current_speech,**conf);ToolTip(btn_s,"Stop speech.")
+        btn_c=tk.Button(self.dyn_btn_f,text="📋 Copy",command=self.copy_response,**conf);ToolTip(btn_c,"Copy response.")
+        btn_cl=tk.Button(self.dyn_btn_f,text="🧹 Clear Context",command=self.clear_llm_context_user_initiated,**conf);ToolTip(btn_cl,"Clear history.")
+        self._main_btns: typing.Tuple[tk.Button, ...] = (btn_r,btn_s,btn_c,btn_cl)
+
+    def _clear_dynamic_buttons(self):
+        for w in self.dyn_btn_f.winfo_children():w.pack_forget() # All buttons are pooled; hide, don't destroy
     def _display_main_buttons(self):
-        self._clear_dynamic_buttons(); conf={"relief":tk.GROOVE,"borderwidth":1,"font":("Arial",10),"padx":5,"pady":2}
-        btn_r=tk.Button(self.dyn_btn_f,text="🔄 Read Aloud",command=self.read_aloud_again,**conf);btn_r.pack(side="left",expand=True,fill="x",padx=3);ToolTip(btn_r,"Read last response.")
-        btn_s=tk.Button(self.dyn_btn_f,text="🤫 Stop Speech",command=self.stop_current_speech,**conf);btn_s.pack(side="left",expand=True,fill="x",padx=3);ToolTip(btn_s,"Stop speech.")
-        btn_c=tk.Button(self.dyn_btn_f,text="📋 Copy",command=self.copy_response,**conf);btn_c.pack(side="left",expand=True,fill="x",padx=3);ToolTip(btn_c,"Copy response.")
-        btn_cl=tk.Button(self.dyn_btn_f,text="🧹 Clear Context",command=self.clear_llm_context_user_initiated,**conf);btn_cl.pack(side="left",expand=True,fill="x",padx=3);ToolTip(btn_cl,"Clear history.")
+        self._clear_dynamic_buttons()
+        for b in self._main_btns:b.pack(side="left",expand=True,fill="x",padx=3)
         self.dyn_btn_f.update_idletasks()
 
     def on_closing(self):
@@ -423,14 +659,18 @@ class LMBuddyOverlay(tk.Tk):
         if not pil_img:return
         try:
             win=Toplevel(self);win.title("Image from History");win.attributes("-topmost",True)
-            copy=pil_img.copy();copy.thumbnail((600,500),Image.Resampling.LANCZOS);tk_img=ImageTk.PhotoImage(copy)
+            # Scale to fit 600x500 into a new image (no copy of the full-size original); reducing_gap
+            # lets Pillow shrink large screenshots with a cheap box filter before the LANCZOS pass.
+            scale=min(600/pil_img.width,500/pil_img.height)
+            copy=pil_img if scale>=1 else pil_img.resize((max(1,round(pil_img.width*scale)),max(1,round(pil_img.height*scale))),Image.Resampling.LANCZOS,reducing_gap=2.0)
+            tk_img=ImageTk.PhotoImage(copy)
             Label(win,image=tk_img).pack(padx=10,pady=10);win.image=tk_img # Keep reference
             self.update_idletasks();px,py,pw,ph=self.winfo_x(),self.winfo_y(),self.winfo_width(),self.winfo_height()
             ww,wh=copy.width+20,copy.height+20;x,y=px+(pw-ww)//2,py+(ph-wh)//2;win.geometry(f"{ww}x{wh}+{x}+{y}")
         except Exception as e:logging.error(f"Show img err:{e}");messagebox.showerror("Image Error","Could not display image.",parent=self)
 
     def display_message_in_gui(self,txt,is_raw_text=False,is_error=False,update_history=True):
-        avatar=self.engine.get_config_value('avatar_name','Sherlox')
+        avatar=self._cfg["avatar_name"]
         if self.llm_is_thinking and not txt.startswith(f"🦊 {avatar} is thinking..."):self.llm_is_thinking=False
         self.current_raw_response_text=txt
         html_c=f"<i>{html.escape(txt)}</i>" if is_raw_text else markdown_to_html_custom(txt)
@@ -446,19 +686,15 @@ class LMBuddyOverlay(tk.Tk):
         hdr="<b>Image Captured. Action?</b>" if img_pil else "<b>Content Captured. Action?</b>"
         if ocr_txt:hdr+=f"<br><div style='font-size:0.8em;max-height:60px;overflow-y:auto;border:1px solid #ccc;padding:3px;margin-top:3px;'><i>OCR:{ocr_disp}</i></div>"
         self.display_message_in_gui(hdr,is_raw_text=False,update_history=False)
-        conf={"relief":tk.RAISED,"font":("Arial",9,"bold"),"pady":3};acts=[("Summarize📝","summarize","Sum")]
-        if self.engine.get_config_value("enable_vision_if_available",False) and img_pil:acts.append(("AnalyzeImg🖼️","analyze_image","AnalyzeImg"))
-        acts.extend([("Bullets📋","bullet_points","Bullets"),("Translate🌐","translate","Translate")])
-        if ocr_txt and ocr_txt.strip():
-            pos=1 if not any(a[1]=="analyze_image" for a in acts) else [i for i,a in enumerate(acts) if a[1]=="analyze_image"][0]+1
-            acts.insert(pos,("ImproveTxt✨","improve_text","ImproveTxt"))
-        acts.extend([("Help💡","help","Help"),("Ask🤔","set_context_for_question","SetContext"),("Cancel❌","cancel","Cancel")])
-        for t,k,tip in acts:
-            b=tk.Button(self.dyn_btn_f,text=t,command=lambda ky=k,ot=ocr_txt,im=img_pil:self.handle_ocr_action(ky,ot,im),**conf,bg="#E8F8F5",fg="#117A65")
-            b.pack(side="top",fill="x",padx=20,pady=1);ToolTip(b,tip)
+        hidden=set()
+        if not (self.engine.get_config_value("enable_vision_if_available",False) and img_pil):hidden.add("analyze_image")
+        if not (ocr_txt and ocr_txt.strip()):hidden.add("improve_text")
+        self._ocr_action_args=(ocr_txt,img_pil)
+        for k,_,_ in self.OCR_ACTIONS:
+            if k not in hidden:self._ocr_btn_pool[k].pack(side="top",fill="x",padx=20,pady=1)
         self.dyn_btn_f.update_idletasks()
 
-    def hide_ocr_action_buttons_and_show_main(self):self._display_main_buttons()
+    def hide_ocr_action_buttons_and_show_main(self):self._ocr_action_args=None;self._display_main_buttons() # Releases the capture
 
     def handle_ocr_action(self,key,ocr,img=None):
         lang=None
@@ -471,7 +707,7 @@ class LMBuddyOverlay(tk.Tk):
 
     def clear_llm_context_user_initiated(self):
         self.engine.clear_all_context_and_buffers();self.hide_ocr_action_buttons_and_show_main()
-        messagebox.showinfo("LM Buddy","Context cleared.",parent=self)
+        self._flash_status("Context cleared.")
 
     def read_aloud_again(self):
         if self.current_raw_response_text and not self.current_raw_response_text.startswith("Error:"):self.engine.speak(self.current_raw_response_text)
@@ -481,11 +717,22 @@ class LMBuddyOverlay(tk.Tk):
 
     def copy_response(self):
         if self.current_raw_response_text:
-            try:pyperclip.copy(self.current_raw_response_text)
-            except pyperclip.PyperclipException as e:messagebox.showerror("LM Buddy",f"Copy error:\n{e}",parent=self);return
-            messagebox.showinfo("LM Buddy","Copied to clipboard.",parent=self)
+            # pyperclip may run xclip/xsel or wait for the clipboard; keep that off the Tk thread
+            threading.Thread(target=self._copy_to_clipboard,args=(self.current_raw_response_text,),name="ClipboardCopy",daemon=True).start()
         else:messagebox.showwarning("LM Buddy","Nothing to copy.",parent=self)
 
+    def _copy_to_clipboard(self,text):
+        """Runs on a helper thread; the result is reported through the GUI channel (MSG_TYPE_CLIPBOARD_COPIED)."""
+        error=None
+        try:pyperclip.copy(text)
+        except pyperclip.PyperclipException as e:error=str(e)
+        except Exception as e:logging.error(f"GUI: Clipboard copy failed: {e}",exc_info=True);error=str(e)
+        self.gui_update_queue.post({"type":mt.MSG_TYPE_CLIPBOARD_COPIED,"error":error})
+
+    def _on_clipboard_copied(self,error):
+        if error:messagebox.showerror("LM Buddy",f"Copy error:\n{error}",parent=self)
+        else:self._flash_status("Copied to clipboard.")
+
     def send_direct_question_event(self,event):self.send_direct_question()
     def send_direct_question(self):
         q=self.in_var.get().strip()